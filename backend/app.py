@@ -1,11 +1,30 @@
 import os
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from flasgger import Swagger, swag_from
+from flask_jwt_extended import JWTManager, create_access_token, decode_token, jwt_required, get_jwt_identity
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+import numpy as np
 from config import Config
-from database import get_db_connection
+from database import get_db_connection, get_dataset_version, bump_dataset_version
+from availability import ROLLUPS, CurrentAvailability, choose_granularity, get_history
+from cache import ResponseCache, make_etag, quantize
+from payload import JSON_MIMETYPE, UnsupportedPayload, available_encodings, available_formats, compress, serialize
+from spatial import STATION_FIELDS, StationIndex
+from changes import ChangeLog, coalesce
+from clustering import ClusterIndex
+from search import match_expression, search_stations
+from writer import WriteQueue
+from zones import ZoneIndex, parse_polygons, station_totals, stations_in_polygons
+from snapshot import SnapshotPublisher, ensure_snapshot, snapshot_path
+from metrics import SamplingProfiler, begin_request, end_request, phase, profiles, registry
+from datetime import datetime, timedelta, timezone
+import csv
+import io
 import math
+import sqlite3
+import threading
+import time
 import uuid
 
 app = Flask(__name__)
@@ -30,6 +49,13 @@ CORS(app,
 # Initialise JWT pour l'authentification
 jwt = JWTManager(app)
 
+# Portée des jetons d'ouverture du flux de changements : refusés par toutes les autres routes
+STREAM_TOKEN_SCOPE = 'changes_stream'
+
+@jwt.token_verification_loader
+def reject_stream_tokens(jwt_header, jwt_data):
+    return jwt_data.get('scope') != STREAM_TOKEN_SCOPE
+
 # Configuration Swagger
 swagger_config = {
     "headers": [],
@@ -68,21 +94,364 @@ swagger_template = {
     "security": [{"Bearer": []}]
 }
 
-swagger = Swagger(app, config=swagger_config, template=swagger_template)
+class LazySwagger:
+    """
+    Documentation Swagger construite à la première visite : flasgger n'est importé et la
+    spécification n'est générée qu'à ce moment, sur une application dédiée qui reprend les
+    routes (et leurs docstrings) de l'API. Les workers démarrent ainsi sans flasgger.
+    """
+
+    def __init__(self, api, wsgi_app, prefixes):
+        self.api = api
+        self.wsgi_app = wsgi_app
+        self.prefixes = prefixes
+        self._docs = None
+        self._lock = threading.Lock()
+
+    def _docs_app(self):
+        with self._lock:
+            if self._docs is None:
+                from flasgger import Swagger
+
+                docs = Flask(__name__)
+                docs.config.from_object(Config)
+                for rule in self.api.url_map.iter_rules():
+                    if rule.endpoint != 'static':
+                        docs.add_url_rule(rule.rule, rule.endpoint, self.api.view_functions[rule.endpoint],
+                                          methods=rule.methods)
+                Swagger(docs, config=swagger_config, template=swagger_template)
+                self._docs = docs
+            return self._docs
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO', '').startswith(self.prefixes):
+            return self._docs_app()(environ, start_response)
+        return self.wsgi_app(environ, start_response)
+
+app.wsgi_app = LazySwagger(app, app.wsgi_app, (
+    swagger_config['specs_route'], swagger_config['static_url_path'], swagger_config['specs'][0]['route']
+))
+
+# ============== INDEX SPATIAL DES STATIONS ==============
+
+# Nombre maximum de paramètres par clause IN (limite historique de SQLite : 999)
+SQL_IN_CHUNK = 500
+
+def chunked(items, size):
+    """Découpe une liste en tranches de `size` éléments"""
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+# Grille en mémoire : une recherche par rayon ne parcourt que les cellules voisines
+station_index = StationIndex(cell_size=Config.SPATIAL_CELL_SIZE)
+_index_rebuild_lock = threading.Lock()
+
+# Republication de l'instantané après les écritures de ce worker, regroupées et hors de l'écrivain ;
+# l'index adopte l'instantané publié s'il n'a pas changé entre-temps
+snapshot_publisher = SnapshotPublisher(
+    Config.SPATIAL_CELL_SIZE, delay=Config.STATION_SNAPSHOT_PUBLISH_DELAY, on_publish=station_index.adopt_snapshot
+)
+
+def get_station_index(version=None):
+    """
+    Retourne l'index spatial, (re)construit depuis la base au premier appel ou si
+    le jeu de données est passé à une version plus récente (écriture d'un autre worker, import)
+    """
+    def stale():
+        return not station_index.loaded or (version is not None and version > station_index.version)
+    
+    if stale():
+        # Une seule reconstruction à la fois ; les autres fils servent l'index précédent ou attendent
+        with _index_rebuild_lock:
+            if stale():
+                conn = get_db_connection()
+                try:
+                    with phase('index_rebuild'):
+                        if Config.STATION_SNAPSHOT_ENABLED:
+                            # Instantané partagé : publié par un seul processus, projeté par tous
+                            station_index.load_snapshot(ensure_snapshot(
+                                conn, snapshot_path(), Config.SPATIAL_CELL_SIZE, min_version=version
+                            ))
+                        else:
+                            # Lit la version et les stations dans un même instantané
+                            conn.execute('BEGIN')
+                            station_index.load(conn, get_dataset_version(conn))
+                            conn.commit()
+                finally:
+                    conn.close()
+    return station_index
+
+def refresh_station_index(conn, station_ids, version):
+    """
+    Répercute dans l'index l'état en base de stations créées, modifiées ou supprimées, à partir
+    des seules lignes modifiées et sur la connexion de l'écrivain (aucune autre connexion prise)
+    """
+    note_dataset_version(version)
+    if not station_index.loaded:
+        return
+    upserts = []
+    for chunk in chunked(station_ids, SQL_IN_CHUNK):
+        upserts.extend(conn.execute(
+            f'SELECT * FROM stations WHERE id IN ({",".join("?" * len(chunk))})', chunk
+        ).fetchall())
+    found = {station['id'] for station in upserts}
+    removals = [i for i in station_ids if i not in found]
+    station_index.apply(version, upserts=upserts, removals=removals)
+    if Config.STATION_SNAPSHOT_ENABLED:
+        # Les autres workers adopteront l'instantané de la nouvelle version sans relire SQLite
+        snapshot_publisher.request(version)
+    if cluster_index.loaded:
+        cluster_index.apply(version, upserts=upserts, removals=removals)
+    refresh_changes(conn)
+
+# Derniers changements de stations et de disponibilités, pour le flux de changements
+change_log = ChangeLog(maxlen=Config.CHANGE_LOG_SIZE)
+
+# Dernier relevé de disponibilité de chaque station, suivi à partir du même journal
+current_availability = CurrentAvailability()
+
+def refresh_changes(conn=None):
+    """
+    Ajoute au journal en mémoire les changements enregistrés en base depuis le dernier appel,
+    et en reporte les relevés dans la disponibilité courante (rechargée si le journal a repris à zéro)
+    """
+    own = conn is None
+    if own:
+        conn = get_db_connection()
+    try:
+        previous = change_log.last_seq
+        change_log.tail(conn)
+        changes = change_log.since(previous)
+        if changes is None or not current_availability.loaded:
+            current_availability.load(conn)
+        else:
+            current_availability.apply(changes)
+    except sqlite3.Error as e:
+        app.logger.warning('Suivi du journal des modifications : %s', e)
+    finally:
+        if own:
+            conn.close()
+
+def publish_station_writes(conn, station_ids, version):
+    """Après validation d'un groupe d'écritures : index, regroupements et flux de changements"""
+    if station_ids:
+        refresh_station_index(conn, station_ids, version)
+
+# Écritures de stations des routes de l'API : un seul écrivain par worker, qui regroupe les
+# écritures concurrentes en une transaction (une version du jeu de données par transaction)
+write_queue = WriteQueue(
+    window=Config.WRITE_QUEUE_WINDOW,
+    max_batch=Config.WRITE_QUEUE_MAX_BATCH,
+    enabled=Config.WRITE_QUEUE_ENABLED,
+    before_commit=lambda conn, station_ids: bump_dataset_version(conn) if station_ids else None,
+    after_commit=publish_station_writes,
+)
 
-# Fonction utilitaire pour calculer la distance entre deux points GPS
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calcule la distance en km entre deux coordonnées GPS (formule de Haversine)"""
-    R = 6371  # Rayon de la Terre en km
+# Regroupements de stations par niveau de zoom, construits une fois par version du jeu de données
+cluster_index = ClusterIndex(max_zoom=Config.CLUSTER_MAX_ZOOM, cells_per_tile=Config.CLUSTER_CELLS_PER_TILE)
+
+def get_cluster_index(version):
+    """Retourne l'index de regroupement, reconstruit depuis l'index spatial si la version a changé"""
+    index = get_station_index(version)
+    if not cluster_index.loaded or cluster_index.version != index.version:
+        with _index_rebuild_lock:
+            if not cluster_index.loaded or cluster_index.version != index.version:
+                cluster_index.build(index.all(), version=index.version)
+    return cluster_index
+
+# Construit l'index au démarrage (la base peut ne pas encore exister)
+try:
+    get_station_index()
+except sqlite3.Error as e:
+    print(f"Index spatial non construit au démarrage : {e}")
+
+# ============== VERSION DES DONNÉES ET CACHE HTTP ==============
+
+# Réponses GET /api/stations déjà sérialisées, valables pour une version du jeu de données
+response_cache = ResponseCache(maxsize=Config.RESPONSE_CACHE_SIZE)
+
+# Version du jeu de données connue du worker. Avec DATASET_VERSION_POLL_INTERVAL > 0, un fil de
+# fond la relit périodiquement et reconstruit les index : les lectures ne touchent plus SQLite.
+_known_version = None
+_version_lock = threading.Lock()
+_watcher_pid = None
+
+def read_dataset_version():
+    """Lit la version courante du jeu de données (incrémentée par chaque écriture et chaque import)"""
+    conn = get_db_connection()
+    try:
+        return get_dataset_version(conn)
+    finally:
+        conn.close()
+
+def note_dataset_version(version):
+    """Mémorise une version observée (lue en base ou produite par une écriture de ce worker)"""
+    global _known_version
+    with _version_lock:
+        if version is not None and (_known_version is None or version > _known_version):
+            _known_version = version
+
+def watch_dataset_version(interval):
+    """Boucle du fil de fond : suit la version en base et prépare les index avant les requêtes"""
+    while True:
+        time.sleep(interval)
+        try:
+            note_dataset_version(read_dataset_version())
+            get_station_index(_known_version)
+            if cluster_index.loaded:
+                get_cluster_index(_known_version)
+            refresh_changes()
+        except sqlite3.Error as e:
+            app.logger.warning('Suivi de version du jeu de données : %s', e)
+
+def start_version_watcher():
+    """Démarre le fil de suivi de version (une fois par processus : les fils ne survivent pas au fork)"""
+    global _watcher_pid
+    with _version_lock:
+        if _watcher_pid == os.getpid():
+            return
+        _watcher_pid = os.getpid()
+    threading.Thread(
+        target=watch_dataset_version, args=(Config.DATASET_VERSION_POLL_INTERVAL,),
+        name='dataset-version-watcher', daemon=True
+    ).start()
+
+def current_dataset_version():
+    """
+    Version courante du jeu de données : celle tenue à jour par le fil de fond, ou
+    lue en base à chaque appel si le suivi est désactivé (DATASET_VERSION_POLL_INTERVAL = 0)
+    """
+    if Config.DATASET_VERSION_POLL_INTERVAL <= 0:
+        return read_dataset_version()
+    if _watcher_pid != os.getpid():
+        note_dataset_version(read_dataset_version())
+        start_version_watcher()
+    return _known_version
+
+def not_modified(etag):
+    """Réponse 304 : le client a déjà la bonne version"""
+    response = app.response_class(status=304)
+    response.set_etag(etag)
+    return response
+
+def json_response(body, etag):
+    """Réponse JSON déjà sérialisée, revalidable via son ETag"""
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def negotiate_payload():
+    """Format (type MIME) et compression de la réponse, selon les en-têtes Accept et Accept-Encoding"""
+    mimetype = request.accept_mimetypes.best_match(available_formats(), default=JSON_MIMETYPE)
+    encoding = request.accept_encodings.best_match(available_encodings())
+    return mimetype, encoding
+
+def cached_stations(key, version, build):
+    """
+    Sert une liste de stations calculée par `build()` via le cache de réponses : 304 si
+    le client a déjà cette version, corps en cache sinon, calcul et mise en cache en dernier
+    recours. Le corps est sérialisé (JSON, colonnaire ou MessagePack) puis compressé
+    (brotli ou gzip) selon ce qu'accepte le client ; chaque variante a son ETag.
+    """
+    mimetype, encoding = negotiate_payload()
+    etag = make_etag(version, *key, mimetype, encoding)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
     
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
+    cache_key = key + (mimetype, encoding)
+    entry = response_cache.get(cache_key, version)
+    if entry is None:
+        with phase('compute'):
+            stations = build()
+        with phase('serialize'):
+            try:
+                body = serialize(stations, mimetype, app.json.dumps)
+            except UnsupportedPayload as e:
+                return jsonify({'error': f'{e} : format {mimetype} indisponible, utiliser {JSON_MIMETYPE}'}), 406
+            if encoding is None or len(body) < Config.COMPRESSION_MIN_SIZE:
+                encoding = None
+            entry = (compress(body, encoding), encoding)
+        response_cache.put(cache_key, version, entry)
     
-    a = math.sin(dlat/2) * math.sin(dlat/2) + math.cos(math.radians(lat1)) \
-        * math.cos(math.radians(lat2)) * math.sin(dlon/2) * math.sin(dlon/2)
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    body, encoding = entry
+    response = app.response_class(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+def negotiate_stream_format():
+    """
+    Format de réponse en flux demandé par le client : 'ndjson' (Accept: application/x-ndjson),
+    'json' (tableau JSON envoyé par morceaux, ?stream=1) ou None (réponse JSON classique)
+    """
+    best = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+    if best == 'application/x-ndjson':
+        return 'ndjson'
+    if request.args.get('stream') in ('1', 'true'):
+        return 'json'
+    return None
+
+def stream_response(rows, stream_format, etag=None):
+    """
+    Réponse envoyée au fil de l'eau (chunked) : chaque ligne est sérialisée quand elle
+    est produite par le générateur `rows`, la mémoire par requête reste constante
+    """
+    def generate():
+        if stream_format == 'ndjson':
+            for row in rows:
+                yield app.json.dumps(row) + '\n'
+            return
+        yield '['
+        separator = ''
+        for row in rows:
+            yield separator + app.json.dumps(row)
+            separator = ','
+        yield ']'
     
-    return R * c
+    mimetype = 'application/x-ndjson' if stream_format == 'ndjson' else 'application/json'
+    response = Response(generate(), mimetype=mimetype)
+    if etag is not None:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def all_finite(*values):
+    """Indique si les paramètres numériques fournis (None ignorés) sont finis : nan et inf sont refusés"""
+    return all(value is None or math.isfinite(value) for value in values)
+
+def quantize_query(lat, lon, radius=None):
+    """
+    Centre (à ~10 m près) et rayon quantifiés, clé du cache de réponses et de l'ETag. Les routes
+    calculent leurs résultats (distances comprises) à partir de ces valeurs : la réponse mise en
+    cache est exacte pour toutes les requêtes de la même cellule. Sans cache, valeurs inchangées.
+    """
+    if Config.RESPONSE_CACHE_SIZE <= 0:
+        return lat, lon, radius
+    return (
+        quantize(lat, Config.CACHE_COORD_DECIMALS),
+        quantize(lon, Config.CACHE_COORD_DECIMALS),
+        quantize(radius, 2) if radius is not None else None
+    )
+
+# Filtres de disponibilité de GET /api/stations/nearest (seuils du dernier relevé)
+AVAILABILITY_FILTERS = ('min_bikes', 'min_mechanical', 'min_electric', 'min_docks')
+
+def station_with_distance(station, distance):
+    """Représentation JSON d'une station accompagnée de sa distance (km, arrondie à 10 m)"""
+    return {
+        'id': station['id'],
+        'station_id': station['station_id'],
+        'name': station['name'],
+        'latitude': station['latitude'],
+        'longitude': station['longitude'],
+        'capacity': station['capacity'],
+        'address': station['address'],
+        'distance': float(np.round(distance, 2))  # Même arrondi que le tri de StationIndex.iter_radius
+    }
 
 # ============== ROUTES D'AUTHENTIFICATION ==============
 
@@ -135,11 +504,13 @@ def login():
     
     # Vérifie les identifiants
     conn = get_db_connection()
-    user = conn.execute(
-        'SELECT * FROM users WHERE username = ? AND password = ?',
-        (username, password)
-    ).fetchone()
-    conn.close()
+    try:
+        user = conn.execute(
+            'SELECT * FROM users WHERE username = ? AND password = ?',
+            (username, password)
+        ).fetchone()
+    finally:
+        conn.close()
     
     if user:
         # Crée un token JWT
@@ -179,9 +550,27 @@ def get_stations():
         required: false
         default: 2.0
         description: Rayon de recherche en km
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Nombre maximum de stations (les plus proches)
+      - name: stream
+        in: query
+        type: integer
+        required: false
+        description: 1 pour recevoir le tableau JSON en flux (chunked). Avec l'en-tête
+          Accept application/x-ndjson, une station JSON par ligne.
+    produces:
+      - application/json
+      - application/x-ndjson
+      - application/vnd.velib.stations+binary
+      - application/msgpack
     responses:
       200:
-        description: Liste des stations à proximité
+        description: Liste des stations à proximité (en-tête ETag lié à la version des données).
+          Format colonnaire compact avec Accept application/vnd.velib.stations+binary
+          (coordonnées int32 au millionième de degré, table de chaînes) ou application/msgpack.
         schema:
           type: array
           items:
@@ -203,6 +592,8 @@ def get_stations():
                 type: string
               distance:
                 type: number
+      304:
+        description: Non modifié depuis l'ETag fourni dans If-None-Match
       400:
         description: Paramètres manquants
       401:
@@ -212,230 +603,1131 @@ def get_stations():
     lat = request.args.get('lat', type=float)
     lon = request.args.get('lon', type=float)
     radius = request.args.get('radius', default=2.0, type=float)  # Rayon en km
+    limit = request.args.get('limit', type=int)  # Nombre maximum de stations
     
     if lat is None or lon is None:
         return jsonify({'error': 'Paramètres lat et lon requis'}), 400
+    if not all_finite(lat, lon, radius):
+        return jsonify({'error': 'lat, lon et radius doivent être des nombres finis'}), 400
+    if limit is not None and limit < 0:
+        return jsonify({'error': 'Le paramètre limit doit être positif'}), 400
     
-    conn = get_db_connection()
-    stations = conn.execute('SELECT * FROM stations').fetchall()
-    conn.close()
-    
-    # Filtre les stations dans le rayon spécifié
-    nearby_stations = []
-    for station in stations:
-        distance = calculate_distance(lat, lon, station['latitude'], station['longitude'])
-        if distance <= radius:
-            nearby_stations.append({
-                'id': station['id'],
-                'station_id': station['station_id'],
-                'name': station['name'],
-                'latitude': station['latitude'],
-                'longitude': station['longitude'],
-                'capacity': station['capacity'],
-                'address': station['address'],
-                'distance': round(distance, 2)
-            })
-    
-    # Trie par distance
-    nearby_stations.sort(key=lambda x: x['distance'])
-    
-    return jsonify(nearby_stations), 200
+    lat, lon, radius = key = quantize_query(lat, lon, radius)
+    version = current_dataset_version()
+    
+    # Mode flux : les stations sont sérialisées une à une, sans passer par le cache
+    stream_format = negotiate_stream_format()
+    if stream_format is not None:
+        etag = make_etag(version, 'stations', *key, limit, stream_format)
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+        rows = (
+            station_with_distance(station, distance)
+            for distance, station in get_station_index(version).iter_radius(lat, lon, radius, limit=limit)
+        )
+        return stream_response(rows, stream_format, etag)
+    
+    def build():
+        # Filtre et trie les stations dans le rayon spécifié (distances calculées en une passe NumPy
+        # sur les seules cellules proches)
+        return [
+            station_with_distance(station, distance)
+            for distance, station in get_station_index(version).query_radius(lat, lon, radius, limit=limit)
+        ]
+    
+    return cached_stations(('stations', *key, limit), version, build)
 
-@app.route('/api/stations/<int:station_id>', methods=['GET'])
+@app.route('/api/stations/nearest', methods=['GET'])
 @jwt_required()
-def get_station(station_id):
+def get_nearest_stations():
     """
-    Récupère une station spécifique
+    Récupère les k stations les plus proches d'une position
     ---
     tags:
       - Stations
     security:
       - Bearer: []
     parameters:
-      - name: station_id
-        in: path
-        type: integer
+      - name: lat
+        in: query
+        type: number
         required: true
-        description: ID de la station
+        example: 48.8566
+      - name: lon
+        in: query
+        type: number
+        required: true
+        example: 2.3522
+      - name: k
+        in: query
+        type: integer
+        required: false
+        default: 5
+        description: Nombre de stations à retourner
+      - name: max_distance
+        in: query
+        type: number
+        required: false
+        description: Distance maximale en km
+      - name: min_bikes
+        in: query
+        type: integer
+        required: false
+        description: Nombre minimal de vélos disponibles (mécaniques et électriques) au dernier relevé
+      - name: min_mechanical
+        in: query
+        type: integer
+        required: false
+        description: Nombre minimal de vélos mécaniques disponibles
+      - name: min_electric
+        in: query
+        type: integer
+        required: false
+        description: Nombre minimal de vélos électriques disponibles
+      - name: min_docks
+        in: query
+        type: integer
+        required: false
+        description: Nombre minimal de bornes libres
     responses:
       200:
-        description: Détails de la station
-      404:
-        description: Station non trouvée
+        description: >
+          Les k stations les plus proches, triées par distance (en-tête ETag) ; avec un filtre
+          de disponibilité, seules les stations qui le respectent, avec leur dernier relevé
+      304:
+        description: Non modifié depuis l'ETag fourni dans If-None-Match
+      400:
+        description: Paramètres manquants ou invalides
+      406:
+        description: Filtre de disponibilité avec un format binaire (réponse en JSON uniquement)
       401:
         description: Non authentifié
     """
-    conn = get_db_connection()
-    station = conn.execute('SELECT * FROM stations WHERE id = ?', (station_id,)).fetchone()
-    conn.close()
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    k = request.args.get('k', default=5, type=int)
+    max_distance = request.args.get('max_distance', type=float)
     
-    if station is None:
-        return jsonify({'error': 'Station non trouvée'}), 404
+    if lat is None or lon is None:
+        return jsonify({'error': 'Paramètres lat et lon requis'}), 400
+    if not all_finite(lat, lon, max_distance):
+        return jsonify({'error': 'lat, lon et max_distance doivent être des nombres finis'}), 400
+    if not 1 <= k <= Config.NEAREST_MAX_K:
+        return jsonify({'error': f'k doit être compris entre 1 et {Config.NEAREST_MAX_K}'}), 400
     
-    return jsonify({
-        'id': station['id'],
-        'station_id': station['station_id'],
-        'name': station['name'],
-        'latitude': station['latitude'],
-        'longitude': station['longitude'],
-        'capacity': station['capacity'],
-        'address': station['address']
-    }), 200
+    thresholds = {name: request.args.get(name, type=int) for name in AVAILABILITY_FILTERS}
+    thresholds = {name: value for name, value in thresholds.items() if value is not None}
+    if any(value < 0 for value in thresholds.values()):
+        return jsonify({'error': 'Les seuils de disponibilité doivent être positifs'}), 400
+    
+    lat, lon, max_distance = key = quantize_query(lat, lon, max_distance)
+    version = current_dataset_version()
+    
+    if not thresholds:
+        def build():
+            # Recherche par anneaux de cellules autour du point, avec un tas borné à k
+            return [
+                station_with_distance(station, distance)
+                for distance, station in get_station_index(version).nearest(lat, lon, k, max_distance=max_distance)
+            ]
+        
+        return cached_stations(('nearest', *key, k), version, build)
+    
+    # Filtre appliqué pendant le parcours des anneaux : les stations vides sont écartées
+    # avant le tas, la recherche s'arrête dès que k stations conformes sont trouvées
+    ensure_change_log()
+    revision = current_availability.revision
+    filters = tuple(sorted(thresholds.items()))
+    
+    def build_available():
+        found = get_station_index(version).nearest(
+            lat, lon, k, max_distance=max_distance,
+            accept=lambda ids: current_availability.matching(ids, **thresholds)
+        )
+        return [
+            {**station_with_distance(station, distance), 'availability': current_availability.get(station['id'])}
+            for distance, station in found
+        ]
+    
+    return cached_stations(('nearest', *key, k, filters, revision), version, build_available)
 
-@app.route('/api/stations', methods=['POST'])
+@app.route('/api/stations/search', methods=['GET'])
 @jwt_required()
-def create_station():
+def search_station_names():
     """
-    Crée une nouvelle station
+    Recherche de stations par nom ou adresse (autocomplétion)
     ---
     tags:
       - Stations
     security:
       - Bearer: []
     parameters:
-      - name: body
-        in: body
+      - name: q
+        in: query
+        type: string
         required: true
-        schema:
-          type: object
-          required:
-            - name
-            - latitude
-            - longitude
-          properties:
-            station_id:
-              type: string
-            name:
-              type: string
-              example: Nouvelle station Vélib
-            latitude:
-              type: number
-              example: 48.8566
-            longitude:
-              type: number
-              example: 2.3522
-            capacity:
-              type: integer
-              example: 20
-            address:
-              type: string
-              example: 1 rue de Rivoli, Paris
+        description: Début des mots cherchés, sans tenir compte des accents ni de la casse
+        example: saint andr
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        default: 10
+      - name: lat
+        in: query
+        type: number
+        required: false
+        description: Avec lon, favorise les stations proches de cette position
+      - name: lon
+        in: query
+        type: number
+        required: false
     responses:
-      201:
-        description: Station créée avec succès
+      200:
+        description: Stations trouvées, les plus pertinentes d'abord (avec distance si lat/lon, en-tête ETag)
+      304:
+        description: Non modifié depuis l'ETag fourni dans If-None-Match
       400:
-        description: Champs requis manquants
+        description: Paramètres manquants ou invalides
       401:
         description: Non authentifié
-      500:
-        description: Erreur serveur
     """
-    data = request.get_json()
+    text = request.args.get('q')
+    expression = match_expression(text)  # Saisies équivalentes : même réponse en cache
+    limit = request.args.get('limit', default=10, type=int)
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
     
-    required_fields = ['name', 'latitude', 'longitude']
-    if not all(field in data for field in required_fields):
-        return jsonify({'error': 'Champs requis : name, latitude, longitude'}), 400
+    if expression is None:
+        return jsonify({'error': 'Paramètre q requis'}), 400
+    if not 1 <= limit <= Config.SEARCH_MAX_LIMIT:
+        return jsonify({'error': f'limit doit être compris entre 1 et {Config.SEARCH_MAX_LIMIT}'}), 400
+    if (lat is None) != (lon is None):
+        return jsonify({'error': 'Paramètres lat et lon à fournir ensemble'}), 400
+    if not all_finite(lat, lon):
+        return jsonify({'error': 'lat et lon doivent être des nombres finis'}), 400
     
-    try:
+    if lat is not None:
+        lat, lon, _ = quantize_query(lat, lon)
+    key = (lat, lon)
+    version = current_dataset_version()
+    
+    def build():
         conn = get_db_connection()
-        
-        # Génère un station_id unique si non fourni
-        station_id = data.get('station_id')
-        if not station_id:
-            station_id = f"STATION-{str(uuid.uuid4())[:8].upper()}"
-        
-        cursor = conn.execute('''
-            INSERT INTO stations (station_id, name, latitude, longitude, capacity, address)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            station_id,
-            data['name'],
-            float(data['latitude']),
-            float(data['longitude']),
-            data.get('capacity', 0),
-            data.get('address', '')
-        ))
-        conn.commit()
-        new_id = cursor.lastrowid
-        
-        return jsonify({'message': 'Station créée', 'id': new_id, 'station_id': station_id}), 201
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-    finally:
-        if 'conn' in locals():
+        try:
+            with phase('query'):
+                results = search_stations(conn, text, limit, lat, lon,
+                                          Config.SEARCH_CANDIDATES, Config.SEARCH_DISTANCE_WEIGHT)
+        finally:
             conn.close()
+        return [
+            {field: station[field] for field in STATION_FIELDS} if distance is None
+            else station_with_distance(station, distance)
+            for station, distance in results
+        ]
+    
+    return cached_stations(('search', expression, limit, *key), version, build)
 
-@app.route('/api/stations/<int:station_id>', methods=['PUT'])
+def parse_bbox(value):
+    """Rectangle "minLon,minLat,maxLon,maxLat" (ordre GeoJSON) -> (min_lon, min_lat, max_lon, max_lat) ; ValueError si invalide"""
+    min_lon, min_lat, max_lon, max_lat = (float(part) for part in (value or '').split(','))
+    if not all_finite(min_lon, min_lat, max_lon, max_lat):
+        raise ValueError('Coordonnées du rectangle non finies')
+    if min_lat > max_lat or min_lon > max_lon:
+        raise ValueError('Rectangle invalide (min > max)')
+    return min_lon, min_lat, max_lon, max_lat
+
+@app.route('/api/stations/clusters', methods=['GET'])
 @jwt_required()
-def update_station(station_id):
+def get_station_clusters():
     """
-    Met à jour une station existante
+    Regroupements de stations pour une vue de carte et un niveau de zoom
     ---
     tags:
       - Stations
     security:
       - Bearer: []
     parameters:
-      - name: station_id
-        in: path
-        type: integer
+      - name: bbox
+        in: query
+        type: string
         required: true
-        description: ID de la station à modifier
-      - name: body
-        in: body
+        description: Rectangle visible minLon,minLat,maxLon,maxLat
+        example: 2.25,48.81,2.42,48.90
+      - name: zoom
+        in: query
+        type: integer
         required: true
-        schema:
-          type: object
-          properties:
-            name:
-              type: string
-            latitude:
-              type: number
-            longitude:
-              type: number
-            capacity:
-              type: integer
-            address:
-              type: string
+        description: Niveau de zoom de la carte (borné au zoom maximal de regroupement)
+        example: 12
     responses:
       200:
-        description: Station mise à jour
-      404:
-        description: Station non trouvée
+        description: Groupes (centroïde, nombre de stations, capacité totale ; id si station isolée)
+      304:
+        description: Non modifié depuis l'ETag fourni dans If-None-Match
+      400:
+        description: Paramètres manquants ou invalides
       401:
         description: Non authentifié
-      500:
-        description: Erreur serveur
     """
-    data = request.get_json()
-    
+    zoom = request.args.get('zoom', type=int)
     try:
-        conn = get_db_connection()
-        conn.execute('''
-            UPDATE stations
-            SET name = ?, latitude = ?, longitude = ?, capacity = ?, address = ?
-            WHERE id = ?
-        ''', (
-            data.get('name'),
-            float(data.get('latitude')),
-            float(data.get('longitude')),
-            data.get('capacity', 0),
-            data.get('address', ''),
-            station_id
-        ))
-        conn.commit()
-        
-        if conn.total_changes == 0:
-            return jsonify({'error': 'Station non trouvée'}), 404
-        
-        return jsonify({'message': 'Station mise à jour'}), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
+        min_lon, min_lat, max_lon, max_lat = parse_bbox(request.args.get('bbox'))
+    except ValueError:
+        return jsonify({'error': 'Paramètre bbox requis : minLon,minLat,maxLon,maxLat (min <= max)'}), 400
+    if zoom is None:
+        return jsonify({'error': 'Paramètre zoom requis'}), 400
+    
+    version = current_dataset_version()
+    etag = make_etag(version, 'clusters', min_lon, min_lat, max_lon, max_lat, zoom)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    
+    zoom, clusters = get_cluster_index(version).query(min_lat, min_lon, max_lat, max_lon, zoom)
+    return json_response(app.json.dumps({'zoom': zoom, 'clusters': clusters}), etag), 200
 
-@app.route('/api/stations/<int:station_id>', methods=['DELETE'])
+@app.route('/api/stations/bbox', methods=['GET'])
+@jwt_required()
+def get_stations_in_bbox():
+    """
+    Récupère les stations contenues dans un rectangle (vue de la carte)
+    ---
+    tags:
+      - Stations
+    security:
+      - Bearer: []
+    parameters:
+      - name: minLat
+        in: query
+        type: number
+        required: true
+        example: 48.85
+      - name: minLon
+        in: query
+        type: number
+        required: true
+        example: 2.33
+      - name: maxLat
+        in: query
+        type: number
+        required: true
+        example: 48.87
+      - name: maxLon
+        in: query
+        type: number
+        required: true
+        example: 2.36
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Nombre maximum de stations
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Champs à retourner, séparés par des virgules (ex. id,latitude,longitude)
+    responses:
+      200:
+        description: Liste des stations dans le rectangle, triées par id
+      400:
+        description: Paramètres manquants ou invalides
+      401:
+        description: Non authentifié
+    """
+    bounds = [request.args.get(name, type=float) for name in ('minLat', 'minLon', 'maxLat', 'maxLon')]
+    limit = request.args.get('limit', default=-1, type=int)  # -1 : pas de limite pour SQLite
+    fields = request.args.get('fields', default=','.join(STATION_FIELDS))
+    
+    if any(bound is None for bound in bounds):
+        return jsonify({'error': 'Paramètres minLat, minLon, maxLat et maxLon requis'}), 400
+    if not all_finite(*bounds):
+        return jsonify({'error': 'minLat, minLon, maxLat et maxLon doivent être des nombres finis'}), 400
+    min_lat, min_lon, max_lat, max_lon = bounds
+    if min_lat > max_lat or min_lon > max_lon:
+        return jsonify({'error': 'Rectangle invalide (min > max)'}), 400
+    
+    # Projection : seuls les champs connus sont acceptés
+    columns = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in columns if field not in STATION_FIELDS]
+    if unknown or not columns:
+        return jsonify({'error': f"Champs inconnus : {', '.join(unknown) or fields}"}), 400
+    
+    # Le R*Tree (flottants 32 bits arrondis vers l'extérieur) présélectionne,
+    # les coordonnées exactes de la table tranchent
+    conn = get_db_connection()
+    try:
+        with phase('query'):
+            stations = conn.execute(f'''
+                SELECT {', '.join('s.' + column for column in columns)}
+                FROM stations_rtree AS r JOIN stations AS s ON s.id = r.id
+                WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?
+                  AND s.latitude BETWEEN ? AND ? AND s.longitude BETWEEN ? AND ?
+                ORDER BY s.id
+                LIMIT ?
+            ''', (min_lat, max_lat, min_lon, max_lon, min_lat, max_lat, min_lon, max_lon, limit)).fetchall()
+    finally:
+        conn.close()
+    
+    with phase('serialize'):
+        return jsonify([dict(zip(columns, station)) for station in stations]), 200
+
+@app.route('/api/stations/<int:station_id>', methods=['GET'])
+@jwt_required()
+def get_station(station_id):
+    """
+    Récupère une station spécifique
+    ---
+    tags:
+      - Stations
+    security:
+      - Bearer: []
+    parameters:
+      - name: station_id
+        in: path
+        type: integer
+        required: true
+        description: ID de la station
+    responses:
+      200:
+        description: Détails de la station (en-tête ETag lié à la version des données)
+      304:
+        description: Non modifié depuis l'ETag fourni dans If-None-Match
+      404:
+        description: Station non trouvée
+      401:
+        description: Non authentifié
+    """
+    version = current_dataset_version()
+    etag = make_etag(version, 'station', station_id)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    
+    # Lue dans l'index en mémoire, sans requête SQLite
+    station = get_station_index(version).get(station_id)
+    if station is None:
+        return jsonify({'error': 'Station non trouvée'}), 404
+    
+    return json_response(app.json.dumps({field: station[field] for field in STATION_FIELDS}), etag), 200
+
+# Dates acceptées par l'historique (secondes epoch) : de 1970 à la fin de l'an 9999
+MAX_TIMESTAMP = 253402300799
+
+def parse_timestamp(value):
+    """
+    Convertit un paramètre de date (secondes epoch ou ISO 8601, UTC par défaut) en secondes epoch ;
+    lève ValueError si la date est invalide, non finie ou hors limites
+    """
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            moment = datetime.fromisoformat(value)
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=timezone.utc)
+            seconds = moment.timestamp()
+        except (OverflowError, OSError) as e:
+            raise ValueError(str(e))
+    if not math.isfinite(seconds) or not 0 <= seconds <= MAX_TIMESTAMP:
+        raise ValueError(f'Date hors limites : {value}')
+    return int(seconds)
+
+def availability_entry(change):
+    """Relevé de disponibilité d'un événement du flux"""
+    return {
+        'id': change.station_key,
+        'ts': change.ts,
+        'mechanical': change.mechanical,
+        'electric': change.electric,
+        'free_docks': change.free_docks,
+    }
+
+def parse_cursor(value):
+    """Curseur du flux de changements (entier positif), ou None s'il est absent ou invalide"""
+    try:
+        cursor = int(value)
+    except (TypeError, ValueError):
+        return None
+    return cursor if cursor >= 0 else None
+
+def ensure_change_log():
+    """Met le journal à jour (sans fil de suivi) ou démarre le fil qui le tient à jour"""
+    if Config.DATASET_VERSION_POLL_INTERVAL <= 0 or change_log.last_seq is None:
+        refresh_changes()
+    current_dataset_version()
+
+def changes_since(cursor):
+    """
+    Changements postérieurs au curseur d'un client, ou None s'il doit tout recharger. Un curseur
+    en avance sur ce worker (reçu d'un autre worker) fait d'abord rattraper le journal ; un curseur
+    plus ancien que le journal en mémoire est relu en base tant qu'il n'a pas été purgé.
+    """
+    if cursor is None:
+        return None
+    if change_log.last_seq is None or cursor > change_log.last_seq:
+        refresh_changes()
+    changes = change_log.since(cursor)
+    if changes is None and change_log.first_seq is not None and cursor < change_log.first_seq:
+        conn = get_db_connection()
+        try:
+            changes = change_log.read(conn, cursor)
+        finally:
+            conn.close()
+    if changes:
+        # L'index servi avec ces changements doit les refléter
+        note_dataset_version(changes[-1].version)
+    return changes
+
+@app.route('/api/stations/changes', methods=['GET'])
+@jwt_required()
+def get_station_changes():
+    """
+    Changements de stations et de disponibilités depuis un curseur
+    ---
+    tags:
+      - Stations
+    security:
+      - Bearer: []
+    parameters:
+      - name: since
+        in: query
+        type: integer
+        required: false
+        description: Curseur (champ version) renvoyé par l'appel précédent ; absent, demande une resynchronisation
+    responses:
+      200:
+        description: >
+          Delta (stations créées ou modifiées avec leur état courant, ids supprimés, derniers
+          relevés de disponibilité) et nouveau curseur ; resync vaut true si le curseur n'est
+          plus couvert par la base (purgé, ou postérieur au dernier changement) : le client
+          doit recharger la liste complète
+      401:
+        description: Non authentifié
+    """
+    since = parse_cursor(request.args.get('since'))
+    ensure_change_log()
+    
+    changes = changes_since(since)
+    if changes is None:
+        return jsonify({'since': since, 'version': change_log.last_seq, 'resync': True}), 200
+    
+    stations, availability = coalesce(changes)
+    index = get_station_index(current_dataset_version())
+    upserted, deleted = [], []
+    for station_id in sorted(stations):
+        # État courant de la station (l'index peut être plus récent que le dernier événement lu)
+        station = index.get(station_id)
+        if station is None:
+            deleted.append(station_id)
+        else:
+            upserted.append(station)
+    
+    return jsonify({
+        'since': since,
+        'version': changes[-1].seq if changes else since,
+        'resync': False,
+        'upserted': upserted,
+        'deleted': deleted,
+        'availability': [availability_entry(change) for _, change in sorted(availability.items())],
+    }), 200
+
+# Flux SSE ouverts par ce worker : chacun occupe un fil de gunicorn jusqu'à sa fermeture
+_open_streams = 0
+_streams_lock = threading.Lock()
+
+def acquire_stream_slot():
+    """Réserve une place de flux ; False si le worker en a déjà CHANGE_STREAM_MAX_CLIENTS ouverts"""
+    global _open_streams
+    with _streams_lock:
+        if _open_streams >= Config.CHANGE_STREAM_MAX_CLIENTS:
+            return False
+        _open_streams += 1
+        return True
+
+def release_stream_slot():
+    global _open_streams
+    with _streams_lock:
+        _open_streams -= 1
+
+def consume_stream_token(token):
+    """
+    Identité d'un jeton d'ouverture de flux valide et pas encore utilisé (None sinon) ; l'usage
+    est enregistré en base pour qu'un même jeton ne serve qu'une fois, quel que soit le worker
+    """
+    try:
+        claims = decode_token(token)
+    except (JWTExtendedException, PyJWTError):
+        return None
+    if claims.get('scope') != STREAM_TOKEN_SCOPE:
+        return None
+    
+    conn = get_db_connection()
+    try:
+        conn.execute('DELETE FROM stream_tokens WHERE expires < ?', (int(time.time()),))
+        conn.execute('INSERT INTO stream_tokens (jti, expires) VALUES (?, ?)', (claims['jti'], claims['exp']))
+        conn.commit()
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
+    return claims['sub']
+
+@app.route('/api/stations/changes/token', methods=['POST'])
+@jwt_required()
+def create_stream_token():
+    """
+    Jeton d'ouverture du flux de changements (EventSource ne permet pas d'envoyer l'en-tête Authorization)
+    ---
+    tags:
+      - Stations
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: >
+          Jeton à passer en paramètre token de /api/stations/changes/stream, valable
+          CHANGE_STREAM_TOKEN_TTL secondes pour une seule ouverture
+      401:
+        description: Non authentifié
+    """
+    token = create_access_token(
+        identity=get_jwt_identity(),
+        expires_delta=timedelta(seconds=Config.CHANGE_STREAM_TOKEN_TTL),
+        additional_claims={'scope': STREAM_TOKEN_SCOPE}
+    )
+    return jsonify({'token': token, 'expires_in': Config.CHANGE_STREAM_TOKEN_TTL}), 200
+
+@app.route('/api/stations/changes/stream', methods=['GET'])
+def stream_station_changes():
+    """
+    Flux Server-Sent Events des changements de stations et de disponibilités
+    ---
+    tags:
+      - Stations
+    parameters:
+      - name: token
+        in: query
+        type: string
+        required: true
+        description: Jeton à usage unique obtenu par POST /api/stations/changes/token
+      - name: since
+        in: query
+        type: integer
+        required: false
+        description: Curseur de départ (sinon en-tête Last-Event-ID, sinon seuls les nouveaux changements)
+    responses:
+      200:
+        description: >
+          Événements text/event-stream "upsert" (station), "delete" (id), "availability"
+          (relevé) et "resync" (recharger la liste complète) ; l'id de chaque événement est
+          son curseur. La connexion est fermée après CHANGE_STREAM_MAX_SECONDS ; le client
+          demande un nouveau jeton pour se reconnecter.
+      401:
+        description: Jeton absent, invalide, expiré ou déjà utilisé
+      503:
+        description: Trop de flux ouverts sur ce worker (réessayer après Retry-After)
+    """
+    if not acquire_stream_slot():
+        registry.inc('velib_change_streams_rejected_total')
+        response = jsonify({'error': 'Trop de flux de changements ouverts, réessayer plus tard'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    try:
+        if consume_stream_token(request.args.get('token', '')) is None:
+            release_stream_slot()
+            return jsonify({'error': 'Jeton de flux invalide, expiré ou déjà utilisé'}), 401
+        ensure_change_log()
+    except Exception:
+        release_stream_slot()
+        raise
+    
+    cursor = parse_cursor(request.args.get('since'))
+    if cursor is None:
+        cursor = parse_cursor(request.headers.get('Last-Event-ID'))
+    if cursor is None:
+        cursor = change_log.last_seq
+    
+    def event(name, data, event_id=None):
+        header = f'id: {event_id}\n' if event_id is not None else ''
+        return f'{header}event: {name}\ndata: {app.json.dumps(data)}\n\n'
+    
+    def generate(cursor):
+        deadline = time.monotonic() + Config.CHANGE_STREAM_MAX_SECONDS
+        yield 'retry: 3000\n\n'
+        while time.monotonic() < deadline:
+            changes = changes_since(cursor)
+            if changes is None:
+                cursor = change_log.last_seq
+                yield event('resync', {'version': cursor}, cursor)
+                continue
+            for change in changes:
+                if change.op == 'availability':
+                    if change.mechanical is not None:
+                        yield event('availability', availability_entry(change), change.seq)
+                else:
+                    station = get_station_index(change.version).get(change.station_key)
+                    if station is None:
+                        yield event('delete', {'id': change.station_key, 'version': change.version}, change.seq)
+                    else:
+                        yield event('upsert', {'station': station, 'version': change.version}, change.seq)
+                cursor = change.seq
+            
+            timeout = min(Config.CHANGE_STREAM_HEARTBEAT, max(deadline - time.monotonic(), 0))
+            if Config.DATASET_VERSION_POLL_INTERVAL <= 0:
+                # Sans fil de suivi, le flux relit lui-même le journal
+                time.sleep(min(timeout, 1))
+                refresh_changes()
+            elif not change_log.wait(cursor, timeout):
+                yield ': keepalive\n\n'
+    
+    response = Response(generate(cursor), mimetype='text/event-stream')
+    response.call_on_close(release_stream_slot)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Pas de mise en tampon par un proxy nginx
+    return response
+
+def view_ids(index, prefix=''):
+    """
+    Ids des stations d'une vue décrite par les paramètres {prefix}bbox, ou {prefix}lat,
+    {prefix}lon et {prefix}radius ; None si la vue est absente, ValueError si elle est invalide
+    """
+    if request.args.get(f'{prefix}bbox'):
+        min_lon, min_lat, max_lon, max_lat = parse_bbox(request.args.get(f'{prefix}bbox'))
+        return index.ids_in_bbox(min_lat, min_lon, max_lat, max_lon)
+    lat = request.args.get(f'{prefix}lat', type=float)
+    lon = request.args.get(f'{prefix}lon', type=float)
+    radius = request.args.get(f'{prefix}radius', default=2.0, type=float)
+    if lat is None and lon is None:
+        return None
+    if lat is None or lon is None or radius < 0 or not all_finite(lat, lon, radius):
+        raise ValueError(f'Paramètres {prefix}lat, {prefix}lon et {prefix}radius invalides')
+    return index.ids_in_radius(lat, lon, radius)
+
+@app.route('/api/stations/viewport', methods=['GET'])
+@jwt_required()
+def get_viewport_delta():
+    """
+    Stations entrées dans la vue ou sorties de la vue depuis la vue précédente
+    ---
+    tags:
+      - Stations
+    security:
+      - Bearer: []
+    parameters:
+      - name: bbox
+        in: query
+        type: string
+        required: false
+        description: Nouvelle vue minLon,minLat,maxLon,maxLat (ou lat, lon et radius)
+      - name: lat
+        in: query
+        type: number
+        required: false
+      - name: lon
+        in: query
+        type: number
+        required: false
+      - name: radius
+        in: query
+        type: number
+        required: false
+        default: 2.0
+      - name: prev_bbox
+        in: query
+        type: string
+        required: false
+        description: Vue précédente (ou prev_lat, prev_lon et prev_radius) ; absente, toute la vue est renvoyée
+      - name: since
+        in: query
+        type: integer
+        required: false
+        description: Curseur du flux de changements (champ version) au moment de la vue précédente
+    responses:
+      200:
+        description: >
+          entered (stations entrées dans la vue), left (ids à retirer : sorties de la vue,
+          supprimées ou déplacées hors de la vue), updated (stations de la vue modifiées depuis
+          le curseur) et nouveau curseur ; avec resync, entered contient toute la vue et le
+          client remplace son état
+      400:
+        description: Paramètres manquants ou invalides
+      401:
+        description: Non authentifié
+    """
+    ensure_change_log()
+    since = parse_cursor(request.args.get('since'))
+    changes = changes_since(since)
+    cursor = change_log.last_seq
+    index = get_station_index(current_dataset_version())
+    try:
+        new_ids = view_ids(index)
+        prev_ids = view_ids(index, 'prev_')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if new_ids is None:
+        return jsonify({'error': 'Vue requise : bbox, ou lat et lon (et radius)'}), 400
+    
+    if prev_ids is None or changes is None:
+        return jsonify({
+            'version': cursor,
+            'resync': True,
+            'entered': [index.get(station_id) for station_id in new_ids.tolist()],
+            'left': [],
+            'updated': [],
+        }), 200
+    
+    # Ensembles calculés sur les positions courantes ; les stations modifiées depuis le curseur
+    # sont renvoyées si elles sont dans la vue, retirées sinon (elles ont pu en sortir)
+    changed, _ = coalesce(changes)
+    changed = np.fromiter(changed, dtype=np.int64, count=len(changed))
+    entered = np.setdiff1d(new_ids, prev_ids, assume_unique=True)
+    left = np.union1d(np.setdiff1d(prev_ids, new_ids, assume_unique=True), np.setdiff1d(changed, new_ids))
+    updated = np.setdiff1d(np.intersect1d(changed, new_ids), entered, assume_unique=True)
+    
+    return jsonify({
+        'version': changes[-1].seq if changes else since,
+        'resync': False,
+        'entered': [index.get(station_id) for station_id in entered.tolist()],
+        'left': left.tolist(),
+        'updated': [index.get(station_id) for station_id in updated.tolist()],
+    }), 200
+
+@app.route('/api/stations/export', methods=['GET'])
+@jwt_required()
+def export_stations():
+    """
+    Export complet des stations, envoyé en flux directement depuis la base
+    ---
+    tags:
+      - Stations
+    security:
+      - Bearer: []
+    parameters:
+      - name: format
+        in: query
+        type: string
+        enum: [ndjson, csv]
+        default: ndjson
+    responses:
+      200:
+        description: Toutes les stations, triées par id (NDJSON ou CSV)
+      304:
+        description: Non modifié depuis l'ETag fourni dans If-None-Match
+      400:
+        description: Format inconnu
+      401:
+        description: Non authentifié
+    """
+    export_format = request.args.get('format', default='ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format doit valoir ndjson ou csv'}), 400
+    
+    conn = get_db_connection()
+    try:
+        # Version et curseur dans un même instantané de lecture
+        conn.execute('BEGIN')
+        version = get_dataset_version(conn)
+        etag = make_etag(version, 'export', export_format)
+        if request.if_none_match.contains(etag):
+            conn.close()
+            return not_modified(etag)
+        cursor = conn.execute(f'SELECT {", ".join(STATION_FIELDS)} FROM stations ORDER BY id')
+    except Exception:
+        conn.close()
+        raise
+    
+    def generate():
+        try:
+            if export_format == 'csv':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer, delimiter=';')
+                writer.writerow(STATION_FIELDS)
+            while True:
+                rows = cursor.fetchmany(Config.EXPORT_FETCH_SIZE)
+                if not rows:
+                    break
+                if export_format == 'csv':
+                    writer.writerows(rows)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                else:
+                    yield ''.join(app.json.dumps(dict(zip(STATION_FIELDS, row))) + '\n' for row in rows)
+            if export_format == 'csv' and buffer.tell():
+                yield buffer.getvalue()
+        finally:
+            conn.close()
+    
+    if export_format == 'csv':
+        response = Response(generate(), mimetype='text/csv')
+        response.headers['Content-Disposition'] = f'attachment; filename=stations-v{version}.csv'
+    else:
+        response = Response(generate(), mimetype='application/x-ndjson')
+    response.set_etag(etag)
+    return response
+
+@app.route('/api/stations/<int:station_id>/history', methods=['GET'])
+@jwt_required()
+def get_station_history(station_id):
+    """
+    Historique de disponibilité d'une station (vélos et bornes libres)
+    ---
+    tags:
+      - Disponibilités
+    security:
+      - Bearer: []
+    parameters:
+      - name: station_id
+        in: path
+        type: integer
+        required: true
+        description: ID de la station
+      - name: from
+        in: query
+        type: string
+        required: false
+        description: Début de la période (secondes epoch ou ISO 8601), 24 h avant `to` par défaut
+      - name: to
+        in: query
+        type: string
+        required: false
+        description: Fin de la période (secondes epoch ou ISO 8601), maintenant par défaut
+      - name: granularity
+        in: query
+        type: string
+        enum: [auto, raw, hour, day]
+        default: auto
+        description: Relevés bruts (sur au plus HISTORY_RAW_MAX_SPAN secondes, 2 jours par défaut) ou agrégats horaires / journaliers (auto selon la période)
+    responses:
+      200:
+        description: Points de l'historique, triés par date
+      400:
+        description: Paramètres invalides
+      401:
+        description: Non authentifié
+      404:
+        description: Station non trouvée
+    """
+    granularity = request.args.get('granularity', default='auto')
+    try:
+        end = parse_timestamp(request.args.get('to'))
+        start = parse_timestamp(request.args.get('from'))
+    except ValueError:
+        return jsonify({'error': 'Dates from/to invalides (secondes epoch ou ISO 8601)'}), 400
+    if end is None:
+        end = int(time.time())
+    if start is None:
+        start = end - 86400
+    
+    if start >= end:
+        return jsonify({'error': 'from doit précéder to'}), 400
+    if granularity == 'auto':
+        granularity = choose_granularity(start, end)
+    if granularity != 'raw' and granularity not in ROLLUPS:
+        return jsonify({'error': 'granularity doit valoir auto, raw, hour ou day'}), 400
+    if granularity == 'raw' and end - start > Config.HISTORY_RAW_MAX_SPAN:
+        return jsonify({'error': f'Relevés bruts limités à {Config.HISTORY_RAW_MAX_SPAN} s : '
+                                 'réduire la période ou choisir hour ou day'}), 400
+    
+    conn = get_db_connection()
+    try:
+        if conn.execute('SELECT 1 FROM stations WHERE id = ?', (station_id,)).fetchone() is None:
+            return jsonify({'error': 'Station non trouvée'}), 404
+        points = get_history(conn, station_id, start, end, granularity)
+    finally:
+        conn.close()
+    
+    return jsonify({
+        'id': station_id,
+        'from': start,
+        'to': end,
+        'granularity': granularity,
+        'points': points
+    }), 200
+
+def parse_station_data(data):
+    """Valide les champs d'une station (création ou mise à jour) et retourne les valeurs à écrire"""
+    if not isinstance(data, dict):
+        raise ValueError('Objet station attendu')
+    if not all(field in data for field in ('name', 'latitude', 'longitude')):
+        raise ValueError('Champs requis : name, latitude, longitude')
+    if not isinstance(data['name'], str) or not data['name'].strip():
+        raise ValueError('name doit être une chaîne non vide')
+    capacity = data.get('capacity') or 0
+    if isinstance(capacity, bool) or (isinstance(capacity, float) and not capacity.is_integer()):
+        raise ValueError('capacity doit être un entier')
+    try:
+        latitude = float(data['latitude'])
+        longitude = float(data['longitude'])
+        capacity = int(capacity)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError('latitude, longitude et capacity doivent être numériques')
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError('Coordonnées hors limites')
+    if capacity < 0:
+        raise ValueError('capacity doit être positive')
+    address = data.get('address')
+    if address is not None and not isinstance(address, str):
+        raise ValueError('address doit être une chaîne')
+    return data['name'], latitude, longitude, capacity, '' if address is None else address
+
+def parse_station_code(value):
+    """
+    station_id fourni (texte, ou entier converti en texte) ; un identifiant unique est
+    généré s'il est absent. Lève ValueError pour tout autre type (booléen, nombre décimal...)
+    """
+    if value is None or value == '':
+        return f"STATION-{str(uuid.uuid4())[:8].upper()}"
+    if isinstance(value, int) and not isinstance(value, bool):
+        return str(value)
+    if not isinstance(value, str):
+        raise ValueError('station_id doit être une chaîne')
+    return value
+
+@app.route('/api/stations', methods=['POST'])
+@jwt_required()
+def create_station():
+    """
+    Crée une nouvelle station
+    ---
+    tags:
+      - Stations
+    security:
+      - Bearer: []
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - name
+            - latitude
+            - longitude
+          properties:
+            station_id:
+              type: string
+            name:
+              type: string
+              example: Nouvelle station Vélib
+            latitude:
+              type: number
+              example: 48.8566
+            longitude:
+              type: number
+              example: 2.3522
+            capacity:
+              type: integer
+              example: 20
+            address:
+              type: string
+              example: 1 rue de Rivoli, Paris
+    responses:
+      201:
+        description: Station créée avec succès
+      400:
+        description: Champs requis manquants ou invalides
+      401:
+        description: Non authentifié
+      409:
+        description: station_id déjà utilisé
+      500:
+        description: Erreur serveur
+    """
+    data = request.get_json(silent=True)
+    try:
+        values = parse_station_data(data)
+        station_id = parse_station_code(data.get('station_id'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def insert(conn):
+        cursor = conn.execute('''
+            INSERT INTO stations (station_id, name, latitude, longitude, capacity, address)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (station_id, *values))
+        return cursor.lastrowid, [cursor.lastrowid]
+    
+    try:
+        new_id = write_queue.execute(insert)
+        return jsonify({'message': 'Station créée', 'id': new_id, 'station_id': station_id}), 201
+    except sqlite3.IntegrityError:
+        return jsonify({'error': f'Une station avec le station_id {station_id} existe déjà'}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/stations/<int:station_id>', methods=['PUT'])
+@jwt_required()
+def update_station(station_id):
+    """
+    Met à jour une station existante
+    ---
+    tags:
+      - Stations
+    security:
+      - Bearer: []
+    parameters:
+      - name: station_id
+        in: path
+        type: integer
+        required: true
+        description: ID de la station à modifier
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - name
+            - latitude
+            - longitude
+          properties:
+            name:
+              type: string
+            latitude:
+              type: number
+            longitude:
+              type: number
+            capacity:
+              type: integer
+            address:
+              type: string
+    responses:
+      200:
+        description: Station mise à jour
+      400:
+        description: Champs requis manquants ou invalides
+      404:
+        description: Station non trouvée
+      401:
+        description: Non authentifié
+      500:
+        description: Erreur serveur
+    """
+    try:
+        values = parse_station_data(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def update(conn):
+        cursor = conn.execute('''
+            UPDATE stations
+            SET name = ?, latitude = ?, longitude = ?, capacity = ?, address = ?
+            WHERE id = ?
+        ''', (*values, station_id))
+        return cursor.rowcount, [station_id] if cursor.rowcount else []
+    
+    try:
+        if write_queue.execute(update) == 0:
+            return jsonify({'error': 'Station non trouvée'}), 404
+        return jsonify({'message': 'Station mise à jour'}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/stations/<int:station_id>', methods=['DELETE'])
 @jwt_required()
 def delete_station(station_id):
     """
@@ -461,20 +1753,401 @@ def delete_station(station_id):
       500:
         description: Erreur serveur
     """
+    def delete(conn):
+        cursor = conn.execute('DELETE FROM stations WHERE id = ?', (station_id,))
+        return cursor.rowcount, [station_id] if cursor.rowcount else []
+    
     try:
-        conn = get_db_connection()
-        conn.execute('DELETE FROM stations WHERE id = ?', (station_id,))
-        conn.commit()
-        
-        if conn.total_changes == 0:
+        if write_queue.execute(delete) == 0:
             return jsonify({'error': 'Station non trouvée'}), 404
-        
         return jsonify({'message': 'Station supprimée'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
+
+# ============== ÉCRITURES PAR LOT ==============
+
+BATCH_OPERATIONS = ('create', 'update', 'delete')
+
+def fetch_existing(conn, column, values):
+    """Retourne l'ensemble des valeurs de `column` présentes dans la table stations"""
+    existing = set()
+    for chunk in chunked(values, SQL_IN_CHUNK):
+        existing.update(row[0] for row in conn.execute(
+            f'SELECT {column} FROM stations WHERE {column} IN ({",".join("?" * len(chunk))})', chunk
+        ))
+    return existing
+
+@app.route('/api/stations/batch', methods=['POST'])
+@jwt_required()
+def batch_stations():
+    """
+    Crée, modifie et supprime des stations par lot, en une seule transaction
+    ---
+    tags:
+      - Stations
+    security:
+      - Bearer: []
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - operations
+          properties:
+            mode:
+              type: string
+              enum: [atomic, best_effort]
+              default: atomic
+              description: atomic = tout ou rien, best_effort = applique les opérations valides
+            operations:
+              type: array
+              items:
+                type: object
+                properties:
+                  op:
+                    type: string
+                    enum: [create, update, delete]
+                  id:
+                    type: integer
+                    description: ID de la station (update, delete)
+                  data:
+                    type: object
+                    description: Champs de la station (create, update)
+    responses:
+      200:
+        description: Lot appliqué, résultat par opération
+      400:
+        description: Requête invalide, ou lot atomique rejeté (résultat par opération)
+      401:
+        description: Non authentifié
+      500:
+        description: Erreur serveur
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Objet JSON attendu : {"operations": [...]}'}), 400
+    operations = payload.get('operations')
+    mode = payload.get('mode', 'atomic')
+    
+    if mode not in ('atomic', 'best_effort'):
+        return jsonify({'error': 'mode doit valoir atomic ou best_effort'}), 400
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'Liste operations requise'}), 400
+    if len(operations) > Config.BATCH_MAX_OPERATIONS:
+        return jsonify({'error': f'Au plus {Config.BATCH_MAX_OPERATIONS} opérations par lot'}), 400
+    
+    results = []
+    creates, updates, deletes = [], [], []
+    seen_ids, seen_codes = set(), set()
+    
+    # 1. Validation de chaque opération, sans toucher à la base
+    for index, operation in enumerate(operations):
+        result = {'index': index, 'op': operation.get('op') if isinstance(operation, dict) else None}
+        results.append(result)
+        try:
+            op = result['op']
+            if op not in BATCH_OPERATIONS:
+                raise ValueError('op doit valoir create, update ou delete')
+            if op == 'create':
+                values = parse_station_data(operation.get('data'))
+                station_id = parse_station_code(operation['data'].get('station_id'))
+                if station_id in seen_codes:
+                    raise ValueError(f'station_id {station_id} en double dans le lot')
+                seen_codes.add(station_id)
+                result['station_id'] = station_id
+                creates.append((result, (station_id,) + values))
+            else:
+                station_id = operation.get('id')
+                if not isinstance(station_id, int) or isinstance(station_id, bool):
+                    raise ValueError('id entier requis')
+                if station_id in seen_ids:
+                    raise ValueError(f'Plusieurs opérations sur la station {station_id}')
+                seen_ids.add(station_id)
+                result['id'] = station_id
+                if op == 'update':
+                    updates.append((result, parse_station_data(operation.get('data')) + (station_id,)))
+                else:
+                    deletes.append((result, (station_id,)))
+        except ValueError as e:
+            result['status'] = 'error'
+            result['error'] = str(e)
+    
+    def apply(conn):
+        nonlocal creates, updates, deletes
+        
+        # 2. Vérifications en base : stations existantes et station_id déjà pris
+        existing_ids = fetch_existing(conn, 'id', [r['id'] for r, _ in updates + deletes])
+        taken_codes = fetch_existing(conn, 'station_id', [params[0] for _, params in creates])
+        for result, params in updates + deletes:
+            if result['id'] not in existing_ids:
+                result['status'], result['error'] = 'error', 'Station non trouvée'
+        for result, params in creates:
+            if params[0] in taken_codes:
+                result['status'], result['error'] = 'error', f'Une station avec le station_id {params[0]} existe déjà'
+        
+        failed = sum(1 for result in results if result.get('status') == 'error')
+        if failed and mode == 'atomic':
+            return (False, failed), []
+        
+        creates = [(r, p) for r, p in creates if 'status' not in r]
+        updates = [(r, p) for r, p in updates if 'status' not in r]
+        deletes = [(r, p) for r, p in deletes if 'status' not in r]
+        
+        # 3. Application groupée : un executemany par type d'opération, dans la transaction de l'écrivain
+        conn.executemany('''
+            INSERT INTO stations (station_id, name, latitude, longitude, capacity, address)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [params for _, params in creates])
+        conn.executemany('''
+            UPDATE stations
+            SET name = ?, latitude = ?, longitude = ?, capacity = ?, address = ?
+            WHERE id = ?
+        ''', [params for _, params in updates])
+        conn.executemany('DELETE FROM stations WHERE id = ?', [params for _, params in deletes])
+        
+        new_ids = {}
+        for chunk in chunked([params[0] for _, params in creates], SQL_IN_CHUNK):
+            new_ids.update(conn.execute(
+                f'SELECT station_id, id FROM stations WHERE station_id IN ({",".join("?" * len(chunk))})', chunk
+            ).fetchall())
+        for result, params in creates:
+            result['id'] = new_ids[params[0]]
+        
+        return (True, failed), [r['id'] for r, _ in creates + updates + deletes]
+    
+    try:
+        applied, failed = write_queue.execute(apply)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if not applied:
+        return jsonify({'applied': False, 'mode': mode, 'failed': failed, 'results': results}), 400
+    
+    for result, _ in creates + updates + deletes:
+        result['status'] = 'ok'
+    return jsonify({'applied': True, 'mode': mode, 'failed': failed, 'results': results}), 200
+
+# ============== ZONES ==============
+
+# Zones nommées (arrondissements...) chargées depuis un fichier GeoJSON local, si configuré
+zone_index = ZoneIndex(name_property=Config.ZONES_NAME_PROPERTY)
+if Config.ZONES_PATH:
+    try:
+        zone_index.load(Config.ZONES_PATH)
+    except (OSError, ValueError) as e:
+        print(f"Zones non chargées ({Config.ZONES_PATH}) : {e}")
+
+def zone_summary(ids, totals):
+    """Agrégats d'une zone : nombre de stations, capacité et somme des derniers relevés"""
+    return {**totals, **current_availability.totals(ids)}
+
+def zone_stations(index, ids):
+    """Stations membres d'une zone, sauf si la requête demande ?stations=0"""
+    if request.args.get('stations') in ('0', 'false'):
+        return None
+    return [index.get(station_id) for station_id in ids.tolist()]
+
+@app.route('/api/zones', methods=['GET'])
+@jwt_required()
+def get_zones():
+    """
+    Agrégats de toutes les zones nommées
+    ---
+    tags:
+      - Zones
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: >
+          Pour chaque zone : nombre de stations, capacité totale, vélos (mécaniques, électriques)
+          et bornes libres au dernier relevé, nombre de stations relevées (en-tête ETag)
+      304:
+        description: Non modifié depuis l'ETag fourni dans If-None-Match
+      401:
+        description: Non authentifié
+    """
+    ensure_change_log()
+    version = current_dataset_version()
+    etag = make_etag(version, 'zones', current_availability.revision)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    
+    with phase('compute'):
+        members, totals = zone_index.assignment(get_station_index(version))
+        zones = [{'name': name, **zone_summary(ids, totals[name])} for name, ids in members.items()]
+    return json_response(app.json.dumps({'zones': zones}), etag), 200
+
+@app.route('/api/zones/<name>', methods=['GET'])
+@jwt_required()
+def get_zone(name):
+    """
+    Agrégats et stations d'une zone nommée
+    ---
+    tags:
+      - Zones
+    security:
+      - Bearer: []
+    parameters:
+      - name: name
+        in: path
+        type: string
+        required: true
+      - name: stations
+        in: query
+        type: integer
+        required: false
+        default: 1
+        description: 0 pour ne renvoyer que les agrégats
+    responses:
+      200:
+        description: Agrégats de la zone et stations membres
+      404:
+        description: Zone inconnue
+      401:
+        description: Non authentifié
+    """
+    ensure_change_log()
+    index = get_station_index(current_dataset_version())
+    members, totals = zone_index.assignment(index)
+    if name not in members:
+        return jsonify({'error': 'Zone non trouvée'}), 404
+    
+    ids = members[name]
+    return jsonify({'name': name, **zone_summary(ids, totals[name]), 'stations': zone_stations(index, ids)}), 200
+
+@app.route('/api/zones/query', methods=['POST'])
+@jwt_required()
+def query_zone():
+    """
+    Agrégats et stations d'un polygone quelconque
+    ---
+    tags:
+      - Zones
+    security:
+      - Bearer: []
+    parameters:
+      - name: body
+        in: body
+        required: true
+        description: Géométrie GeoJSON (Polygon, MultiPolygon ou Feature), coordonnées [longitude, latitude]
+        schema:
+          type: object
+          example: {"type": "Polygon", "coordinates": [[[2.33, 48.85], [2.35, 48.85], [2.35, 48.87], [2.33, 48.87], [2.33, 48.85]]]}
+      - name: stations
+        in: query
+        type: integer
+        required: false
+        default: 1
+        description: 0 pour ne renvoyer que les agrégats
+    responses:
+      200:
+        description: Agrégats du polygone et stations contenues
+      400:
+        description: Géométrie manquante ou invalide
+      401:
+        description: Non authentifié
+    """
+    try:
+        polygons = parse_polygons(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if sum(len(ring) for rings in polygons for ring in rings) > Config.ZONE_MAX_VERTICES:
+        return jsonify({'error': f'Polygone trop détaillé (maximum {Config.ZONE_MAX_VERTICES} sommets)'}), 400
+    
+    ensure_change_log()
+    index = get_station_index(current_dataset_version())
+    with phase('compute'):
+        ids = stations_in_polygons(index, polygons)
+    return jsonify({**zone_summary(ids, station_totals(index, ids)), 'stations': zone_stations(index, ids)}), 200
+
+# ============== MÉTRIQUES ==============
+
+@app.before_request
+def start_request_metrics():
+    """Démarre le chronométrage de la requête (et le profileur si demandé par l'en-tête X-Profile)"""
+    g.request_start = time.perf_counter()
+    g.route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    begin_request(g.route)
+    g.profiler = None
+    if Config.PROFILER_ENABLED and request.headers.get('X-Profile') == '1':
+        g.profiler = SamplingProfiler(threading.get_ident(), interval=Config.PROFILER_INTERVAL).start()
+
+@app.after_request
+def record_request_metrics(response):
+    """Enregistre la latence de la requête par route ; attache l'identifiant du profil éventuel"""
+    if 'request_start' not in g:
+        return response
+    duration = time.perf_counter() - g.request_start
+    registry.observe('velib_http_request_duration_seconds', duration, route=g.route, method=request.method)
+    registry.inc('velib_http_requests_total', route=g.route, method=request.method, status=response.status_code)
+    if g.profiler is not None:
+        profile_id = profiles.add(g.route, duration, g.profiler.stop())
+        response.headers['X-Profile-Id'] = profile_id
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    if g.get('profiler') is not None and g.profiler._thread.is_alive():
+        g.profiler.stop()
+    end_request()
+
+@registry.collector
+def collect_state():
+    """Valeurs lues au moment de l'export : caches, version du jeu de données, index, file d'écriture"""
+    yield 'velib_cache_hits_total', {'cache': 'responses'}, response_cache.hits
+    yield 'velib_cache_misses_total', {'cache': 'responses'}, response_cache.misses
+    yield 'velib_cache_entries', {'cache': 'responses'}, len(response_cache)
+    if _known_version is not None:
+        yield 'velib_dataset_version', {}, _known_version
+    if station_index.loaded:
+        yield 'velib_station_index_size', {}, len(station_index)
+    yield 'velib_write_queue_depth', {}, write_queue.depth()
+    yield 'velib_change_streams', {}, _open_streams
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Métriques au format Prometheus (latences par route, phases, pool et verrous SQLite, caches)
+    ---
+    tags:
+      - Supervision
+    responses:
+      200:
+        description: Métriques du worker qui répond (étiquette pid)
+    """
+    return Response(registry.render(pid=os.getpid()), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/profiles/<profile_id>', methods=['GET'])
+@jwt_required()
+def get_profile(profile_id):
+    """
+    Profil d'une requête envoyée avec l'en-tête X-Profile: 1 (PROFILER_ENABLED=1)
+    ---
+    tags:
+      - Supervision
+    security:
+      - Bearer: []
+    parameters:
+      - name: profile_id
+        in: path
+        type: string
+        required: true
+        description: Valeur de l'en-tête X-Profile-Id de la réponse profilée
+    responses:
+      200:
+        description: Piles d'appels repliées (flamegraph.pl, speedscope), une par ligne avec son nombre d'échantillons
+      404:
+        description: Profil inconnu ou expiré
+    """
+    profile = profiles.get(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profil non trouvé'}), 404
+    response = Response(profile['collapsed'], mimetype='text/plain')
+    response.headers['X-Profile-Route'] = profile['route']
+    response.headers['X-Profile-Samples'] = str(profile['samples'])
+    return response
 
 # ============== ROUTE DE TEST ==============
 
@@ -0,0 +1,397 @@
+import threading
+import time
+import numpy as np
+from config import Config
+from database import get_db_connection, read_csv_chunks, csv_column, CSV_COLUMNS
+
+# Colonnes de disponibilité du fichier open data Vélib
+AVAILABILITY_COLUMNS = {
+    'mechanical': 'Nombre de vélo mécanique',
+    'electric': 'Nombre vélo électrique',
+    'free_docks': 'Nombre de bornes disponibles',
+    'duedate': 'duedate',
+}
+
+# Paliers de compaction : au-delà de `age` secondes, un relevé par station et par `bucket` secondes
+COMPACTION_TIERS = (
+    (7 * 86400, 15 * 60),     # Après 7 jours : un relevé par quart d'heure
+    (90 * 86400, 3600),       # Après 90 jours : un relevé par heure
+)
+
+# Niveaux d'agrégation : table et durée d'un intervalle en secondes
+ROLLUPS = {
+    'hour': ('availability_hourly', 3600),
+    'day': ('availability_daily', 86400),
+}
+
+# Fusionne les agrégats d'un lot de nouveaux relevés avec ceux déjà calculés
+ROLLUP_SQL = '''
+    INSERT INTO {table} AS r
+    SELECT station_key, ts - ts % {bucket}, COUNT(*),
+           MIN(mechanical + electric), MAX(mechanical + electric), SUM(mechanical + electric),
+           MIN(free_docks), MAX(free_docks), SUM(free_docks),
+           SUM(mechanical + electric = 0), SUM(free_docks = 0)
+    FROM {source}
+    WHERE true
+    GROUP BY station_key, ts - ts % {bucket}
+    ON CONFLICT (station_key, bucket_ts) DO UPDATE SET
+        samples = r.samples + excluded.samples,
+        bikes_min = MIN(r.bikes_min, excluded.bikes_min),
+        bikes_max = MAX(r.bikes_max, excluded.bikes_max),
+        bikes_sum = r.bikes_sum + excluded.bikes_sum,
+        docks_min = MIN(r.docks_min, excluded.docks_min),
+        docks_max = MAX(r.docks_max, excluded.docks_max),
+        docks_sum = r.docks_sum + excluded.docks_sum,
+        empty_samples = r.empty_samples + excluded.empty_samples,
+        full_samples = r.full_samples + excluded.full_samples
+'''
+
+
+def _write_batch(conn, batch):
+    """
+    Écrit un lot de relevés dans une transaction : les relevés déjà connus (même station,
+    même date) sont ignorés, les autres sont ajoutés et intégrés aux agrégats.
+    Retourne le nombre de relevés ajoutés.
+    """
+    conn.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS availability_batch (
+            station_key INTEGER, ts INTEGER, mechanical INTEGER, electric INTEGER, free_docks INTEGER,
+            PRIMARY KEY (station_key, ts)
+        )
+    ''')
+    conn.execute('BEGIN IMMEDIATE')
+    conn.execute('DELETE FROM availability_batch')
+    conn.executemany('INSERT OR IGNORE INTO availability_batch VALUES (?, ?, ?, ?, ?)', batch)
+    conn.execute('''
+        DELETE FROM availability_batch
+        WHERE EXISTS (
+            SELECT 1 FROM availability AS a
+            WHERE a.station_key = availability_batch.station_key AND a.ts = availability_batch.ts
+        )
+    ''')
+    added = conn.execute('INSERT INTO availability SELECT * FROM availability_batch').rowcount
+    # Journalisés pour le flux de changements (sans changer la version du jeu de données)
+    conn.execute('''
+        INSERT INTO station_changes (version, station_key, op, ts)
+        SELECT (SELECT value FROM meta WHERE key = 'dataset_version'), station_key, 'availability', ts
+        FROM availability_batch
+    ''')
+    for table, bucket in ROLLUPS.values():
+        conn.execute(ROLLUP_SQL.format(table=table, bucket=bucket, source='availability_batch'))
+    conn.commit()
+    return added
+
+
+def ingest_snapshots(rows, batch_size=None):
+    """
+    Enregistre des relevés (station_key, ts, mechanical, electric, free_docks) et met à
+    jour les agrégats horaires et journaliers. Les relevés sont immuables : un relevé
+    déjà enregistré pour la même station et la même date est ignoré.
+    Écrit par lots de `batch_size` lignes, une courte transaction par lot, pour ne
+    jamais bloquer longtemps les autres écrivains (les lecteurs ne le sont pas en WAL).
+    Retourne le nombre de relevés écrits.
+    """
+    batch_size = batch_size or Config.AVAILABILITY_BATCH_SIZE
+    written = 0
+    batch = []
+    conn = get_db_connection()
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                written += _write_batch(conn, batch)
+                batch = []
+        if batch:
+            written += _write_batch(conn, batch)
+    finally:
+        conn.close()
+    return written
+
+
+def _count(chunk, column):
+    """Compteur de vélos ou de bornes : valeur manquante ou invalide -> 0, borné à [0, 65535]"""
+    import pandas as pd
+
+    values = pd.to_numeric(csv_column(chunk, column), errors='coerce')
+    return values.fillna(0).clip(0, 65535).astype('int64')
+
+
+def parse_availability_chunk(chunk, station_keys, timestamp):
+    """
+    Transforme un bloc du CSV en relevés, de manière vectorisée.
+    `station_keys` associe le code de la station à son id ; `timestamp` vaut une
+    date epoch commune à tout le relevé, ou 'duedate' pour prendre celle de chaque ligne.
+    """
+    import pandas as pd
+
+    keys = csv_column(chunk, CSV_COLUMNS['code']).map(station_keys)
+
+    if timestamp == 'duedate':
+        dates = pd.to_datetime(csv_column(chunk, AVAILABILITY_COLUMNS['duedate']), errors='coerce', utc=True)
+        ts = (dates - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)
+    else:
+        ts = pd.Series(int(timestamp), index=chunk.index)
+
+    snapshots = pd.DataFrame({
+        'station_key': keys,
+        'ts': ts,
+        'mechanical': _count(chunk, AVAILABILITY_COLUMNS['mechanical']),
+        'electric': _count(chunk, AVAILABILITY_COLUMNS['electric']),
+        'free_docks': _count(chunk, AVAILABILITY_COLUMNS['free_docks']),
+    })
+    valid = snapshots['station_key'].notna() & snapshots['ts'].notna()
+    return snapshots[valid].astype('int64'), int((~valid).sum())
+
+
+def import_availability_csv(csv_file_path, timestamp=None, chunksize=None):
+    """
+    Importe les colonnes de disponibilité du CSV comme un relevé horodaté.
+    Par défaut le relevé est daté de la minute courante (flux réimporté chaque minute) ;
+    timestamp='duedate' utilise la colonne duedate de chaque ligne.
+    Retourne les statistiques de l'import.
+    """
+    chunksize = chunksize or Config.IMPORT_CHUNK_SIZE
+    if timestamp is None:
+        timestamp = int(time.time()) // 60 * 60
+    started = time.perf_counter()
+
+    conn = get_db_connection()
+    try:
+        station_keys = dict(conn.execute('SELECT station_id, id FROM stations WHERE station_id IS NOT NULL').fetchall())
+    finally:
+        conn.close()
+
+    written = 0
+    skipped = 0
+    columns = [CSV_COLUMNS['code']] + list(AVAILABILITY_COLUMNS.values())
+    for chunk in read_csv_chunks(csv_file_path, columns, chunksize):
+        snapshots, chunk_skipped = parse_availability_chunk(chunk, station_keys, timestamp)
+        skipped += chunk_skipped
+        written += ingest_snapshots(snapshots.itertuples(index=False, name=None))
+
+    elapsed = time.perf_counter() - started
+    print(f"Disponibilités : {written} relevés enregistrés, {skipped} lignes ignorées "
+          f"(station inconnue ou date invalide) en {elapsed:.2f} s")
+    return {'written': written, 'skipped': skipped, 'seconds': round(elapsed, 3)}
+
+
+def compact_availability(now=None, window=86400):
+    """
+    Politique de rétention : sous-échantillonne les relevés anciens selon COMPACTION_TIERS
+    (moyenne arrondie par station et par intervalle, datée du début de l'intervalle) et
+    supprime ceux qui dépassent AVAILABILITY_RETENTION_DAYS. Traite les données par
+    fenêtres de `window` secondes, une transaction par fenêtre, pour rester non bloquant.
+    Retourne le nombre de relevés supprimés.
+    """
+    now = int(now if now is not None else time.time())
+    removed = 0
+    conn = get_db_connection()
+    try:
+        # Rétention maximale
+        expired_before = now - Config.AVAILABILITY_RETENTION_DAYS * 86400
+        removed += conn.execute('DELETE FROM availability WHERE ts < ?', (expired_before,)).rowcount
+        conn.commit()
+
+        conn.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS availability_compacted (
+                station_key INTEGER, ts INTEGER, mechanical INTEGER, electric INTEGER, free_docks INTEGER
+            )
+        ''')
+        for age, bucket in COMPACTION_TIERS:
+            # Reprend là où la compaction précédente de ce palier s'était arrêtée
+            watermark_key = f'availability_compacted_{bucket}'
+            row = conn.execute('SELECT value FROM meta WHERE key = ?', (watermark_key,)).fetchone()
+            oldest = conn.execute('SELECT MIN(ts) FROM availability').fetchone()[0]
+            if oldest is None:
+                break
+            start = max(row[0] if row else 0, oldest - oldest % bucket)
+            limit = (now - age) - (now - age) % bucket
+            step = max(bucket, window - window % bucket)
+
+            while start < limit:
+                end = min(start + step, limit)
+                conn.execute('BEGIN IMMEDIATE')
+                before = conn.execute('SELECT COUNT(*) FROM availability WHERE ts >= ? AND ts < ?',
+                                      (start, end)).fetchone()[0]
+                conn.execute('DELETE FROM availability_compacted')
+                conn.execute('''
+                    INSERT INTO availability_compacted
+                    SELECT station_key, ts - ts % :bucket,
+                           CAST(ROUND(AVG(mechanical)) AS INTEGER),
+                           CAST(ROUND(AVG(electric)) AS INTEGER),
+                           CAST(ROUND(AVG(free_docks)) AS INTEGER)
+                    FROM availability
+                    WHERE ts >= :start AND ts < :end
+                    GROUP BY station_key, ts - ts % :bucket
+                ''', {'bucket': bucket, 'start': start, 'end': end})
+                after = conn.execute('SELECT COUNT(*) FROM availability_compacted').fetchone()[0]
+                if after < before:
+                    conn.execute('DELETE FROM availability WHERE ts >= ? AND ts < ?', (start, end))
+                    conn.execute('INSERT INTO availability SELECT * FROM availability_compacted')
+                conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (watermark_key, end))
+                conn.commit()
+                removed += before - after
+                start = end
+    finally:
+        conn.close()
+
+    print(f"Compaction des disponibilités : {removed} relevés supprimés")
+    return removed
+
+
+def rebuild_rollups():
+    """Recalcule entièrement les agrégats à partir des relevés (base existante, reprise)"""
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        for table, bucket in ROLLUPS.values():
+            conn.execute(f'DELETE FROM {table}')
+            conn.execute(ROLLUP_SQL.format(table=table, bucket=bucket, source='availability'))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def choose_granularity(start, end):
+    """Niveau de détail adapté à la période demandée"""
+    span = end - start
+    if span <= Config.HISTORY_RAW_MAX_SPAN:
+        return 'raw'
+    if span <= Config.HISTORY_HOURLY_MAX_SPAN:
+        return 'hour'
+    return 'day'
+
+
+def get_history(conn, station_key, start, end, granularity):
+    """
+    Retourne l'historique de disponibilité d'une station entre `start` (inclus) et `end`
+    (exclu), en secondes epoch : relevés bruts, ou agrégats horaires / journaliers
+    (min, max, moyenne des vélos et bornes libres, part du temps vide / pleine).
+    """
+    if granularity == 'raw':
+        rows = conn.execute('''
+            SELECT ts, mechanical, electric, free_docks FROM availability
+            WHERE station_key = ? AND ts >= ? AND ts < ?
+            ORDER BY ts
+        ''', (station_key, start, end)).fetchall()
+        return [{
+            'ts': row['ts'],
+            'mechanical': row['mechanical'],
+            'electric': row['electric'],
+            'bikes': row['mechanical'] + row['electric'],
+            'free_docks': row['free_docks'],
+        } for row in rows]
+
+    table, bucket = ROLLUPS[granularity]
+    rows = conn.execute(f'''
+        SELECT * FROM {table}
+        WHERE station_key = ? AND bucket_ts >= ? AND bucket_ts < ?
+        ORDER BY bucket_ts
+    ''', (station_key, start - start % bucket, end)).fetchall()
+    return [{
+        'ts': row['bucket_ts'],
+        'samples': row['samples'],
+        'bikes_min': row['bikes_min'],
+        'bikes_max': row['bikes_max'],
+        'bikes_mean': round(row['bikes_sum'] / row['samples'], 2),
+        'docks_min': row['docks_min'],
+        'docks_max': row['docks_max'],
+        'docks_mean': round(row['docks_sum'] / row['samples'], 2),
+        'empty_ratio': round(row['empty_samples'] / row['samples'], 4),
+        'full_ratio': round(row['full_samples'] / row['samples'], 4),
+    } for row in rows]
+
+
+# ============== DISPONIBILITÉ COURANTE EN MÉMOIRE ==============
+
+# Dernier relevé de chaque station : CROSS JOIN impose de parcourir les stations et de faire
+# une recherche par clé primaire pour chacune (plutôt qu'un parcours de tous les relevés)
+LATEST_SQL = '''
+    SELECT a.station_key, a.ts, a.mechanical, a.electric, a.free_docks
+    FROM stations AS s
+    CROSS JOIN availability AS a ON a.station_key = s.id
+     AND a.ts = (SELECT MAX(ts) FROM availability WHERE station_key = s.id)
+'''
+
+
+class CurrentAvailability:
+    """
+    Dernier relevé connu de chaque station, chargé depuis la base puis tenu à jour par les
+    événements 'availability' du flux de changements. `revision` change à chaque mise à jour
+    (clé des réponses en cache, qui ne dépendent pas que de la version du jeu de données).
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.revision = 0
+        self._latest = {}  # station_key -> (ts, mechanical, electric, free_docks)
+        self._keys = np.empty(0, dtype=np.int64)
+        self._counts = np.empty((0, 3), dtype=np.int64)  # mechanical, electric, free_docks
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def load(self, conn):
+        latest = {row[0]: tuple(row[1:]) for row in conn.execute(LATEST_SQL)}
+        with self._lock:
+            self._latest = latest
+            self._dirty = True
+            self.revision += 1
+            self.loaded = True
+
+    def apply(self, changes):
+        """Intègre les relevés d'une suite d'événements du flux (les plus récents l'emportent)"""
+        with self._lock:
+            updated = False
+            for change in changes:
+                if change.op != 'availability' or change.mechanical is None:
+                    continue
+                current = self._latest.get(change.station_key)
+                if current is None or change.ts >= current[0]:
+                    self._latest[change.station_key] = (change.ts, change.mechanical, change.electric, change.free_docks)
+                    updated = True
+            if updated:
+                self._dirty = True
+                self.revision += 1
+
+    def get(self, station_key):
+        """Dernier relevé de la station (dict), ou None"""
+        with self._lock:
+            latest = self._latest.get(station_key)
+        if latest is None:
+            return None
+        ts, mechanical, electric, free_docks = latest
+        return {'ts': ts, 'mechanical': mechanical, 'electric': electric, 'free_docks': free_docks}
+
+    def lookup(self, ids):
+        """
+        Compteurs du dernier relevé des stations (tableau d'ids) : masque des stations qui en
+        ont un, et tableau (n, 3) mechanical, electric, free_docks (zéros pour les autres)
+        """
+        with self._lock:
+            if self._dirty:
+                keys = np.fromiter(self._latest, dtype=np.int64, count=len(self._latest))
+                order = np.argsort(keys)
+                counts = np.array([self._latest[key][1:] for key in keys.tolist()], dtype=np.int64).reshape(-1, 3)
+                self._keys, self._counts = keys[order], counts[order]
+                self._dirty = False
+            keys, counts = self._keys, self._counts
+
+        if len(keys) == 0:
+            return np.zeros(len(ids), dtype=bool), np.zeros((len(ids), 3), dtype=np.int64)
+        positions = np.minimum(np.searchsorted(keys, ids), len(keys) - 1)
+        found = keys[positions] == ids
+        return found, np.where(found[:, None], counts[positions], 0)
+
+    def matching(self, ids, min_mechanical=0, min_electric=0, min_bikes=0, min_docks=0):
+        """Masque des stations (tableau d'ids) dont le dernier relevé atteint tous les seuils"""
+        found, counts = self.lookup(ids)
+        mechanical, electric, free_docks = counts[:, 0], counts[:, 1], counts[:, 2]
+        return (found & (mechanical >= min_mechanical) & (electric >= min_electric)
+                & (mechanical + electric >= min_bikes) & (free_docks >= min_docks))
+
+    def totals(self, ids):
+        """Sommes des derniers relevés des stations (tableau d'ids), et nombre de stations relevées"""
+        found, counts = self.lookup(ids)
+        mechanical, electric, free_docks = (int(total) for total in counts.sum(axis=0))
+        return {'mechanical': mechanical, 'electric': electric, 'bikes': mechanical + electric,
+                'free_docks': free_docks, 'reporting': int(found.sum())}
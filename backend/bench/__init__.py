@@ -0,0 +1,4 @@
+"""
+Outils de mesure de performance du backend : générateurs de stations synthétiques,
+micro-benchmarks (python -m bench.micro) et banc de charge HTTP (python -m bench.load).
+"""
@@ -0,0 +1,152 @@
+import argparse
+import http.client
+import json
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+import numpy as np
+from bench.report import summarize, write_report
+from bench.synthetic import random_points, station_payload
+
+# Scénarios : proportion de chaque type de requête
+SCENARIOS = {
+    'login': {'login': 1},
+    'stations': {'stations': 1},
+    'crud': {'create': 1, 'read': 2, 'update': 1, 'delete': 1},
+    'mixed': {'stations': 16, 'read': 2, 'login': 1, 'create': 1, 'update': 1, 'delete': 1},
+}
+
+
+class Client:
+    """Connexion HTTP keep-alive d'un utilisateur virtuel"""
+
+    def __init__(self, url, token=None):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        self.token = token
+
+    def request(self, method, path, body=None):
+        """Envoie une requête et retourne (statut, corps JSON ou None)"""
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        payload = json.dumps(body) if body is not None else None
+        try:
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+        except (OSError, http.client.HTTPException):
+            # Connexion fermée par le serveur : on la rouvre une fois
+            self.connection.close()
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+        data = response.read()
+        try:
+            return response.status, json.loads(data) if data else None
+        except ValueError:
+            return response.status, None
+
+    def login(self, username, password):
+        status, body = self.request('POST', '/api/login', {'username': username, 'password': password})
+        if status != 200:
+            raise RuntimeError(f'Connexion refusée ({status})')
+        self.token = body['access_token']
+
+
+def worker(url, credentials, scenario, radius, seed, deadline, max_requests, record):
+    """Boucle d'un utilisateur virtuel : tire une opération selon le scénario jusqu'à l'échéance"""
+    rng = np.random.default_rng(seed)
+    client = Client(url)
+    client.login(*credentials)
+    operations, weights = zip(*SCENARIOS[scenario].items())
+    probabilities = np.array(weights, dtype=float) / sum(weights)
+    points = random_points(1_000, seed=seed)
+    created = []  # Stations créées par ce worker, réutilisées par read/update/delete
+    count = 0
+
+    while time.perf_counter() < deadline and (max_requests is None or count < max_requests):
+        operation = operations[rng.choice(len(operations), p=probabilities)]
+        if operation in ('read', 'update', 'delete') and not created:
+            operation = 'create'
+        lat, lon = points[count % len(points)]
+        count += 1
+
+        start = time.perf_counter()
+        if operation == 'login':
+            status, _ = client.request('POST', '/api/login',
+                                       {'username': credentials[0], 'password': credentials[1]})
+        elif operation == 'stations':
+            status, _ = client.request('GET', '/api/stations?' + urlencode({'lat': lat, 'lon': lon, 'radius': radius}))
+        elif operation == 'create':
+            status, body = client.request('POST', '/api/stations', station_payload(rng, f'{seed}-{count}'))
+            if status == 201:
+                created.append(body['id'])
+        elif operation == 'read':
+            status, _ = client.request('GET', f'/api/stations/{created[-1]}')
+        elif operation == 'update':
+            status, _ = client.request('PUT', f'/api/stations/{created[-1]}', station_payload(rng, f'{seed}-{count}'))
+        else:
+            status, _ = client.request('DELETE', f'/api/stations/{created.pop()}')
+        record(operation, status, time.perf_counter() - start)
+
+    # Nettoyage : supprime les stations encore présentes (hors mesures)
+    for station_id in created:
+        client.request('DELETE', f'/api/stations/{station_id}')
+
+
+def run(url, scenario, concurrency, duration, max_requests, radius, credentials, seed):
+    """Lance `concurrency` utilisateurs virtuels et agrège latences et erreurs par opération"""
+    latencies = defaultdict(list)
+    errors = defaultdict(lambda: defaultdict(int))
+    lock = threading.Lock()
+
+    def record(operation, status, seconds):
+        with lock:
+            latencies[operation].append(seconds)
+            if status >= 400:
+                errors[operation][status] += 1
+
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=worker, args=(url, credentials, scenario, radius, seed + i, deadline, max_requests, record))
+        for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    results = {'total': summarize([s for values in latencies.values() for s in values], elapsed),
+               'elapsed_s': round(elapsed, 3)}
+    for operation, values in sorted(latencies.items()):
+        results[operation] = summarize(values, elapsed)
+        results[operation]['errors'] = dict(errors[operation])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Banc de charge HTTP contre un serveur local')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='URL du serveur')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed', help='Mélange de requêtes')
+    parser.add_argument('--concurrency', type=int, default=16, help='Utilisateurs virtuels simultanés')
+    parser.add_argument('--duration', type=float, default=30, help='Durée du test (s)')
+    parser.add_argument('--requests', type=int, help='Nombre maximum de requêtes par utilisateur virtuel')
+    parser.add_argument('--radius', type=float, default=1.0, help='Rayon des recherches (km)')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123')
+    parser.add_argument('--seed', type=int, default=0, help='Graine des générateurs')
+    parser.add_argument('--output', help='Fichier JSON du rapport (sortie standard par défaut)')
+    args = parser.parse_args()
+
+    results = run(args.url, args.scenario, args.concurrency, args.duration, args.requests,
+                  args.radius, (args.username, args.password), args.seed)
+    parameters = {key: value for key, value in vars(args).items() if key != 'password'}
+    write_report('load', parameters, results, args.output)
+
+
+if __name__ == '__main__':
+    main()
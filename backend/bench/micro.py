@@ -0,0 +1,138 @@
+import argparse
+import os
+import tempfile
+import time
+from bench.report import summarize, write_report
+from bench.synthetic import SIZES, random_points, write_csv
+from config import Config
+
+
+def measure(function, repeat, warmup=1):
+    """Durées (secondes) de `repeat` appels de `function`, après `warmup` appels d'échauffement"""
+    for _ in range(warmup):
+        function()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def bench_distance(points, repeat):
+    """calculate_distance (un appel) et haversine_vectorized (un appel pour toutes les stations)"""
+    from spatial import calculate_distance, haversine_vectorized
+    import numpy as np
+
+    (lat1, lon1), (lat2, lon2) = points[0], points[1]
+    lats = np.array([p[0] for p in points])
+    lons = np.array([p[1] for p in points])
+    calls = 10_000
+    per_call = [d / calls for d in measure(
+        lambda: [calculate_distance(lat1, lon1, lat2, lon2) for _ in range(calls)], repeat
+    )]
+    return {
+        'calculate_distance': summarize(per_call),
+        'haversine_vectorized': summarize(measure(lambda: haversine_vectorized(lat1, lon1, lats, lons), repeat)),
+    }
+
+
+def bench_get_stations(client, headers, rows, queries, radius, legacy_max_rows):
+    """Chemin filtre/tri de GET /api/stations : balayage historique, index en mémoire, requête HTTP complète"""
+    from app import get_station_index
+    from database import get_db_connection, get_dataset_version
+    from spatial import calculate_distance
+
+    results = {}
+    if rows <= legacy_max_rows:
+        # Implémentation d'origine : distance calculée pour chaque station, puis tri
+        conn = get_db_connection()
+        stations = [dict(row) for row in conn.execute('SELECT * FROM stations').fetchall()]
+        conn.close()
+
+        def legacy(lat, lon):
+            found = []
+            for station in stations:
+                distance = calculate_distance(lat, lon, station['latitude'], station['longitude'])
+                if distance <= radius:
+                    found.append({**station, 'distance': round(distance, 2)})
+            return sorted(found, key=lambda s: s['distance'])
+
+        results['legacy_scan'] = summarize(timed_queries(legacy, queries))
+
+    conn = get_db_connection()
+    index = get_station_index(get_dataset_version(conn))
+    conn.close()
+    results['index_query_radius'] = summarize(timed_queries(lambda lat, lon: index.query_radius(lat, lon, radius), queries))
+
+    def http(lat, lon):
+        response = client.get('/api/stations', query_string={'lat': lat, 'lon': lon, 'radius': radius}, headers=headers)
+        assert response.status_code == 200, response.status_code
+
+    results['http_get_stations'] = summarize(timed_queries(http, queries))
+    return results
+
+
+def timed_queries(function, queries):
+    """Durée de chaque appel function(lat, lon), une par position de requête"""
+    durations = []
+    for lat, lon in queries:
+        start = time.perf_counter()
+        function(lat, lon)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks du backend (distances, recherche de stations, import CSV)')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in SIZES[:3]),
+                        help='Nombres de stations, séparés par des virgules (jusqu\'à 1000000)')
+    parser.add_argument('--repeat', type=int, default=20, help='Répétitions par mesure')
+    parser.add_argument('--queries', type=int, default=200, help='Positions de requête par taille')
+    parser.add_argument('--radius', type=float, default=1.0, help='Rayon de recherche (km)')
+    parser.add_argument('--legacy-max-rows', type=int, default=100_000,
+                        help='Taille maximale pour le balayage historique (lent)')
+    parser.add_argument('--seed', type=int, default=0, help='Graine des générateurs')
+    parser.add_argument('--workdir', help='Dossier des fichiers temporaires (base, CSV)')
+    parser.add_argument('--output', help='Fichier JSON du rapport (sortie standard par défaut)')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='velib-bench-')
+    # Base dédiée : à fixer avant la première connexion (pool et index de l'application)
+    Config.DATABASE_PATH = os.path.join(workdir, 'bench.db')
+    Config.RESPONSE_CACHE_SIZE = 0
+    Config.DATASET_VERSION_POLL_INTERVAL = 0
+    if os.path.exists(Config.DATABASE_PATH):
+        os.remove(Config.DATABASE_PATH)
+
+    import database
+    database.init_db()
+    from app import app
+
+    client = app.test_client()
+    token = client.post('/api/login', json={'username': 'admin', 'password': 'admin123'}).get_json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    queries = random_points(args.queries, seed=args.seed + 1)
+
+    results = {'distance': bench_distance(random_points(1_000, seed=args.seed), args.repeat)}
+    for rows in sizes:
+        csv_path = write_csv(os.path.join(workdir, f'stations-{rows}.csv'), rows, seed=args.seed)
+        conn = database.get_db_connection()
+        conn.execute('DELETE FROM stations')
+        database.bump_dataset_version(conn)
+        conn.commit()
+        conn.close()
+
+        stats = database.import_csv(csv_path)
+        results[str(rows)] = {
+            'import_csv': {'seconds': stats['seconds'], 'rows_per_s': stats['rows_per_sec'], 'imported': stats['imported']},
+            'get_stations': bench_get_stations(client, headers, rows, queries, args.radius, args.legacy_max_rows),
+        }
+        print(f'{rows} stations : terminé', flush=True)
+
+    write_report('micro', vars(args) | {'sizes': sizes, 'workdir': workdir}, results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+
+
+def summarize(latencies, elapsed=None):
+    """Statistiques d'une série de durées (secondes) : percentiles en millisecondes et débit"""
+    values = np.asarray(latencies, dtype=np.float64) * 1000
+    if not len(values):
+        return {'count': 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    summary = {
+        'count': int(len(values)),
+        'mean_ms': round(float(values.mean()), 4),
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'max_ms': round(float(values.max()), 4),
+    }
+    if elapsed:
+        summary['throughput_per_s'] = round(len(values) / elapsed, 2)
+    return summary
+
+
+def git_revision():
+    """Révision git du code mesuré (None hors d'un dépôt)"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_report(kind, parameters, results, output=None):
+    """
+    Rapport JSON comparable d'une version à l'autre : contexte (révision, machine,
+    paramètres) et résultats. Écrit dans `output`, ou sur la sortie standard.
+    """
+    report = {
+        'kind': kind,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'parameters': parameters,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f'Rapport écrit dans {output}', file=sys.stderr)
+    else:
+        print(text)
+    return report
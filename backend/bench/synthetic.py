@@ -0,0 +1,64 @@
+import argparse
+import numpy as np
+import pandas as pd
+from database import CSV_COLUMNS
+
+# Tailles de jeux de données utilisées par défaut par les benchmarks
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+
+# Emprise des stations générées : Paris et sa petite couronne
+CENTER = (48.8566, 2.3522)
+SPREAD = (0.15, 0.22)  # Demi-étendue en degrés (latitude, longitude)
+
+
+def generate_stations(count, seed=0):
+    """
+    Génère `count` stations reproductibles (même graine, mêmes stations), réparties
+    uniformément autour de Paris, avec les colonnes du CSV open data
+    """
+    rng = np.random.default_rng(seed)
+    lats = CENTER[0] + rng.uniform(-SPREAD[0], SPREAD[0], count)
+    lons = CENTER[1] + rng.uniform(-SPREAD[1], SPREAD[1], count)
+    codes = np.arange(1, count + 1)
+    return pd.DataFrame({
+        CSV_COLUMNS['code']: codes.astype(str),
+        CSV_COLUMNS['name']: [f'Station synthétique {code}' for code in codes],
+        CSV_COLUMNS['geo']: [f'{lat:.6f},{lon:.6f}' for lat, lon in zip(lats, lons)],
+        CSV_COLUMNS['capacity']: rng.integers(10, 70, count).astype(str),
+    })
+
+
+def write_csv(path, count, seed=0):
+    """Écrit un CSV synthétique au format open data (séparateur point-virgule)"""
+    generate_stations(count, seed).to_csv(path, sep=';', index=False, encoding='utf-8')
+    return path
+
+
+def random_points(count, seed=1):
+    """Positions de requête reproductibles dans l'emprise des stations générées"""
+    rng = np.random.default_rng(seed)
+    lats = CENTER[0] + rng.uniform(-SPREAD[0], SPREAD[0], count)
+    lons = CENTER[1] + rng.uniform(-SPREAD[1], SPREAD[1], count)
+    return list(zip(lats.tolist(), lons.tolist()))
+
+
+def station_payload(rng, code):
+    """Corps JSON d'une station pour POST/PUT /api/stations"""
+    return {
+        'station_id': f'BENCH-{code}',
+        'name': f'Station de test {code}',
+        'latitude': CENTER[0] + rng.uniform(-SPREAD[0], SPREAD[0]),
+        'longitude': CENTER[1] + rng.uniform(-SPREAD[1], SPREAD[1]),
+        'capacity': int(rng.integers(10, 70)),
+        'address': 'Adresse de test',
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Génère un CSV de stations synthétiques')
+    parser.add_argument('path', help='Fichier CSV à écrire')
+    parser.add_argument('--rows', type=int, default=SIZES[0], help='Nombre de stations')
+    parser.add_argument('--seed', type=int, default=0, help='Graine du générateur')
+    args = parser.parse_args()
+    write_csv(args.path, args.rows, args.seed)
+    print(f'{args.rows} stations écrites dans {args.path}')
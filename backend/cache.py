@@ -0,0 +1,66 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def make_etag(version, *parts):
+    """Construit un ETag à partir de la version du jeu de données et des paramètres de la requête"""
+    digest = hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=8).hexdigest()
+    return f'v{version}-{digest}'
+
+
+def quantize(value, decimals):
+    """Arrondit une coordonnée ou un rayon pour regrouper les requêtes quasi identiques"""
+    return round(value, decimals)
+
+
+class ResponseCache:
+    """
+    Cache LRU de réponses sérialisées, valable pour une version du jeu de données :
+    dès qu'une requête arrive avec une version plus récente, tout le cache est vidé.
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sync_version(self, version):
+        """Vide le cache si `version` est plus récente ; retourne False si elle est dépassée"""
+        if self.version is None or version > self.version:
+            self._entries.clear()
+            self.version = version
+        return version == self.version
+
+    def get(self, key, version):
+        """Retourne la valeur en cache pour cette clé et cette version, ou None"""
+        with self._lock:
+            value = self._entries.get(key) if self._sync_version(version) else None
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, version, value):
+        """Mémorise une valeur (ignorée si la version est déjà dépassée)"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if not self._sync_version(version):
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,105 @@
+import threading
+from collections import deque, namedtuple
+
+# Événement du flux : curseur (seq), version du jeu de données, type ('upsert', 'delete' ou
+# 'availability'), id de la station et, pour un relevé, sa date et ses compteurs
+Change = namedtuple('Change', 'seq version op station_key ts mechanical electric free_docks')
+
+TAIL_SQL = '''
+    SELECT c.seq, c.version, c.op, c.station_key, c.ts, a.mechanical, a.electric, a.free_docks
+    FROM station_changes AS c
+    LEFT JOIN availability AS a ON c.op = 'availability' AND a.station_key = c.station_key AND a.ts = c.ts
+    WHERE c.seq > ? AND c.version IS NOT NULL
+    ORDER BY c.seq
+    LIMIT ?
+'''
+
+
+class ChangeLog:
+    """
+    Journal borné des derniers changements, alimenté en suivant la table station_changes.
+    Un client demande les changements postérieurs à son curseur ; un curseur plus ancien que
+    le journal est relu en base (read), et s'il n'y est plus couvert (purgé, ou base recréée),
+    le client doit tout recharger.
+    """
+
+    def __init__(self, maxlen=10000):
+        self.maxlen = maxlen
+        self.first_seq = None  # Curseur le plus ancien encore servi (événements > first_seq)
+        self.last_seq = None   # Curseur du dernier événement lu
+        self._events = deque(maxlen=maxlen)
+        self._condition = threading.Condition()
+        self._tail_lock = threading.Lock()
+
+    def tail(self, conn):
+        """Lit les nouvelles lignes de station_changes et réveille les abonnés ; retourne leur nombre"""
+        with self._tail_lock:
+            max_seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM station_changes').fetchone()[0]
+            cursor = self.last_seq
+            if cursor is None or max_seq < cursor or max_seq - cursor > self.maxlen:
+                # Premier appel, base recréée ou retard trop grand : on ne garde que la fin du journal
+                cursor = max(max_seq - self.maxlen, 0)
+                with self._condition:
+                    self._events.clear()
+                    self.first_seq = self.last_seq = cursor
+
+            added = 0
+            while True:
+                rows = [Change(*row) for row in conn.execute(TAIL_SQL, (cursor, self.maxlen)).fetchall()]
+                if not rows:
+                    break
+                cursor = rows[-1].seq
+                added += len(rows)
+                with self._condition:
+                    for change in rows:
+                        if len(self._events) == self.maxlen:
+                            self.first_seq = self._events[0].seq
+                        self._events.append(change)
+                    self.last_seq = cursor
+                    self._condition.notify_all()
+                if len(rows) < self.maxlen:
+                    break
+            return added
+
+    def since(self, seq):
+        """Événements postérieurs au curseur `seq`, ou None s'il faut tout recharger"""
+        with self._condition:
+            if seq is None or self.last_seq is None or seq < self.first_seq or seq > self.last_seq:
+                return None
+            return [change for change in self._events if change.seq > seq]
+
+    def read(self, conn, seq):
+        """
+        Événements postérieurs au curseur `seq` relus dans station_changes, jusqu'au dernier
+        événement du journal ; None si des événements postérieurs au curseur ont été purgés
+        """
+        with self._condition:
+            last_seq = self.last_seq
+        if seq is None or last_seq is None or seq > last_seq:
+            return None
+        low = conn.execute('SELECT MIN(seq) FROM station_changes').fetchone()[0]
+        if low is None or seq < low - 1:
+            return None
+        rows = conn.execute(TAIL_SQL, (seq, last_seq - seq)).fetchall()
+        return [change for change in map(Change._make, rows) if change.seq <= last_seq]
+
+    def wait(self, seq, timeout):
+        """Attend un événement postérieur à `seq` ; retourne False à l'expiration du délai"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.last_seq is not None and self.last_seq > seq, timeout)
+
+
+def coalesce(changes):
+    """
+    Réduit une suite d'événements à l'état final par station : ids modifiés ou supprimés
+    (dernier événement de chaque station), et dernier relevé de disponibilité par station
+    """
+    stations = {}
+    availability = {}
+    for change in changes:
+        if change.op == 'availability':
+            if change.mechanical is not None:
+                availability[change.station_key] = change
+        else:
+            stations[change.station_key] = change.op
+    return stations, availability
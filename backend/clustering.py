@@ -0,0 +1,132 @@
+import math
+import threading
+import numpy as np
+
+
+class ClusterIndex:
+    """
+    Index hiérarchique de regroupement des stations par niveau de zoom.
+    À chaque zoom z correspond une grille dont les cellules mesurent 360 / (2^z * cells_per_tile)
+    degrés ; chaque cellule occupée garde le nombre de stations, la somme de leurs
+    coordonnées (pour le centroïde) et la capacité totale. Construit une fois par version
+    du jeu de données, puis mis à jour incrémentalement à chaque écriture.
+    """
+
+    def __init__(self, max_zoom=16, cells_per_tile=4):
+        self.max_zoom = max_zoom
+        self.cells_per_tile = cells_per_tile
+        self.loaded = False
+        self.version = None
+        self._members = {}   # id -> (latitude, longitude, capacité)
+        self._levels = [{} for _ in range(max_zoom + 1)]  # zoom -> {(ligne, colonne): [n, Σlat, Σlon, Σcapacité, id]}
+        self._lock = threading.RLock()
+
+    def cell_size(self, zoom):
+        """Taille (en degrés) d'une cellule au niveau de zoom donné"""
+        return 360.0 / (2 ** zoom * self.cells_per_tile)
+
+    def build(self, stations, version=None):
+        """Construit toutes les grilles, en une passe vectorisée par niveau de zoom"""
+        members = {s['id']: (s['latitude'], s['longitude'], s['capacity'] or 0) for s in stations}
+        ids = np.fromiter(members, dtype=np.int64, count=len(members))
+        values = np.array(list(members.values()), dtype=np.float64).reshape(-1, 3)
+        lats, lons, capacities = values[:, 0], values[:, 1], values[:, 2]
+
+        levels = []
+        for zoom in range(self.max_zoom + 1):
+            size = self.cell_size(zoom)
+            keys = np.stack((np.floor(lats / size), np.floor(lons / size)), axis=1).astype(np.int64)
+            cells = {}
+            if len(ids):
+                unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+                inverse = inverse.ravel()
+                counts = np.bincount(inverse)
+                sum_lat = np.bincount(inverse, weights=lats)
+                sum_lon = np.bincount(inverse, weights=lons)
+                sum_capacity = np.bincount(inverse, weights=capacities)
+                # Id de la station quand la cellule n'en contient qu'une
+                single = np.full(len(unique), -1, dtype=np.int64)
+                single[inverse] = ids
+                for i, (row, col) in enumerate(unique.tolist()):
+                    cells[(row, col)] = [int(counts[i]), float(sum_lat[i]), float(sum_lon[i]),
+                                         int(sum_capacity[i]), int(single[i]) if counts[i] == 1 else None]
+            levels.append(cells)
+
+        with self._lock:
+            self._members = members
+            self._levels = levels
+            self.version = version
+            self.loaded = True
+
+    def _add(self, station_id, lat, lon, capacity, sign):
+        for zoom, cells in enumerate(self._levels):
+            size = self.cell_size(zoom)
+            key = (math.floor(lat / size), math.floor(lon / size))
+            cell = cells.setdefault(key, [0, 0.0, 0.0, 0, None])
+            cell[0] += sign
+            cell[1] += sign * lat
+            cell[2] += sign * lon
+            cell[3] += sign * capacity
+            if cell[0] <= 0:
+                del cells[key]
+            elif cell[0] == 1 and sign > 0:
+                cell[4] = station_id
+            else:
+                cell[4] = None  # Recalculé à la demande pour les cellules redevenues unitaires
+
+    def apply(self, version=None, upserts=(), removals=()):
+        """Applique les stations ajoutées/modifiées et supprimées d'une nouvelle version"""
+        with self._lock:
+            if version is not None:
+                if self.version is None or version != self.version + 1:
+                    return  # En retard : sera reconstruit au prochain contrôle de version
+                self.version = version
+            for station_id in list(removals) + [s['id'] for s in upserts]:
+                old = self._members.pop(station_id, None)
+                if old is not None:
+                    self._add(station_id, *old, sign=-1)
+            for station in upserts:
+                member = (station['latitude'], station['longitude'], station['capacity'] or 0)
+                self._members[station['id']] = member
+                self._add(station['id'], *member, sign=1)
+
+    def _single_member(self, zoom, key):
+        """Retrouve l'id de l'unique station d'une cellule (après suppressions incrémentales)"""
+        size = self.cell_size(zoom)
+        for station_id, (lat, lon, _) in self._members.items():
+            if (math.floor(lat / size), math.floor(lon / size)) == key:
+                return station_id
+        return None
+
+    def query(self, min_lat, min_lon, max_lat, max_lon, zoom):
+        """
+        Retourne les groupes dont la cellule recoupe le rectangle, au zoom donné (borné
+        à max_zoom) : centroïde, nombre de stations, capacité totale, et l'id de la
+        station si le groupe n'en contient qu'une
+        """
+        zoom = max(0, min(int(zoom), self.max_zoom))
+        size = self.cell_size(zoom)
+        row_min, row_max = math.floor(min_lat / size), math.floor(max_lat / size)
+        col_min, col_max = math.floor(min_lon / size), math.floor(max_lon / size)
+
+        clusters = []
+        with self._lock:
+            cells = self._levels[zoom]
+            if (row_max - row_min + 1) * (col_max - col_min + 1) > len(cells):
+                keys = [key for key in cells if row_min <= key[0] <= row_max and col_min <= key[1] <= col_max]
+            else:
+                keys = [(row, col) for row in range(row_min, row_max + 1) for col in range(col_min, col_max + 1)
+                        if (row, col) in cells]
+
+            for key in sorted(keys):
+                count, sum_lat, sum_lon, capacity, station_id = cells[key]
+                if count == 1 and station_id is None:
+                    station_id = cells[key][4] = self._single_member(zoom, key)
+                clusters.append({
+                    'latitude': round(sum_lat / count, 6),
+                    'longitude': round(sum_lon / count, 6),
+                    'count': count,
+                    'capacity': capacity,
+                    'id': station_id if count == 1 else None,
+                })
+        return zoom, clusters
@@ -7,4 +7,94 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key')
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'dev-jwt-secret-key')
     DATABASE_PATH = os.getenv('DATABASE_PATH', 'velib.db')
-    JWT_ACCESS_TOKEN_EXPIRES = 3600  # 1 heure
\ No newline at end of file
+    JWT_ACCESS_TOKEN_EXPIRES = 3600  # 1 heure
+
+    # Taille (en degrés) des cellules de l'index spatial des stations (~1 km à Paris)
+    SPATIAL_CELL_SIZE = float(os.getenv('SPATIAL_CELL_SIZE', '0.01'))
+
+
+    # Pool de connexions SQLite (par worker) ; DB_POOL_SIZE=0 désactive le pool
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))  # Attente max d'une connexion (s)
+    DB_POOL_HEALTHCHECK_INTERVAL = float(os.getenv('DB_POOL_HEALTHCHECK_INTERVAL', '30'))  # s
+
+    # PRAGMA appliqués à chaque nouvelle connexion
+    SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '10'))  # s
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', '-16000'))  # Négatif = en Kio
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+    SQLITE_TEMP_STORE = os.getenv('SQLITE_TEMP_STORE', 'MEMORY')
+
+    # Import CSV : nombre de lignes lues et insérées par bloc
+    IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '50000'))
+
+    # Cache des réponses GET /api/stations (vidé à chaque nouvelle version des données)
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '512'))  # 0 désactive le cache
+    CACHE_COORD_DECIMALS = int(os.getenv('CACHE_COORD_DECIMALS', '4'))  # ~10 m sur lat/lon
+
+
+    # Nombre maximum d'opérations par appel à POST /api/stations/batch
+    BATCH_MAX_OPERATIONS = int(os.getenv('BATCH_MAX_OPERATIONS', '1000'))
+
+    # Valeur maximale de k pour GET /api/stations/nearest
+    NEAREST_MAX_K = int(os.getenv('NEAREST_MAX_K', '100'))
+
+    # Relevés de disponibilité : taille des lots d'insertion et durée de conservation
+    AVAILABILITY_BATCH_SIZE = int(os.getenv('AVAILABILITY_BATCH_SIZE', '5000'))
+    AVAILABILITY_RETENTION_DAYS = int(os.getenv('AVAILABILITY_RETENTION_DAYS', '400'))
+
+    # Historique : relevés bruts jusqu'à 2 jours, agrégats horaires jusqu'à 62 jours, journaliers au-delà
+    HISTORY_RAW_MAX_SPAN = int(os.getenv('HISTORY_RAW_MAX_SPAN', str(2 * 86400)))
+    HISTORY_HOURLY_MAX_SPAN = int(os.getenv('HISTORY_HOURLY_MAX_SPAN', str(62 * 86400)))
+
+    # Export en flux : nombre de lignes lues par fetchmany
+    EXPORT_FETCH_SIZE = int(os.getenv('EXPORT_FETCH_SIZE', '1000'))
+
+    # Compression (brotli ou gzip) des listes de stations à partir de cette taille, en octets
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+
+    # Regroupement des stations : zoom maximal et nombre de cellules par tuile de carte
+    CLUSTER_MAX_ZOOM = int(os.getenv('CLUSTER_MAX_ZOOM', '16'))
+    CLUSTER_CELLS_PER_TILE = int(os.getenv('CLUSTER_CELLS_PER_TILE', '4'))
+
+    # Recherche par nom : nombre maximal de résultats, candidats reclassés selon la distance,
+    # et poids de la distance (par unité de log(1 + km)) face au score BM25
+    SEARCH_MAX_LIMIT = int(os.getenv('SEARCH_MAX_LIMIT', '50'))
+    SEARCH_CANDIDATES = int(os.getenv('SEARCH_CANDIDATES', '500'))
+    SEARCH_DISTANCE_WEIGHT = float(os.getenv('SEARCH_DISTANCE_WEIGHT', '2.0'))
+
+    # Zones nommées : fichier GeoJSON (une entité par zone, vide : aucune) et propriété portant le nom
+    ZONES_PATH = os.getenv('ZONES_PATH', '')
+    ZONES_NAME_PROPERTY = os.getenv('ZONES_NAME_PROPERTY', 'name')
+    ZONE_MAX_VERTICES = int(os.getenv('ZONE_MAX_VERTICES', '20000'))  # Polygones envoyés à POST /api/zones/query
+
+    # File d'écriture des stations (un écrivain par worker) : fenêtre de regroupement des écritures
+    # en une transaction (secondes) et taille maximale d'un groupe ; 0 désactive la file
+    WRITE_QUEUE_ENABLED = os.getenv('WRITE_QUEUE_ENABLED', '1') == '1'
+    WRITE_QUEUE_WINDOW = float(os.getenv('WRITE_QUEUE_WINDOW', '0.002'))
+    WRITE_QUEUE_MAX_BATCH = int(os.getenv('WRITE_QUEUE_MAX_BATCH', '64'))
+
+    # Intervalle (secondes) de relecture en fond de la version du jeu de données ; 0 : relue à chaque requête
+    DATASET_VERSION_POLL_INTERVAL = float(os.getenv('DATASET_VERSION_POLL_INTERVAL', '1'))
+
+    # Profileur par échantillonnage, déclenché par l'en-tête X-Profile: 1 (désactivé par défaut)
+    PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', '0') == '1'
+    PROFILER_INTERVAL = float(os.getenv('PROFILER_INTERVAL', '0.001'))  # Période d'échantillonnage (s)
+
+    # Instantané des stations projeté en mémoire et partagé par les workers (0 : index propre à chaque worker)
+    STATION_SNAPSHOT_ENABLED = os.getenv('STATION_SNAPSHOT_ENABLED', '1') == '1'
+    STATION_SNAPSHOT_PATH = os.getenv('STATION_SNAPSHOT_PATH', '')  # Vide : <DATABASE_PATH>.stations
+    # Délai (secondes) de regroupement des écritures avant republication de l'instantané, en tâche de fond
+    STATION_SNAPSHOT_PUBLISH_DELAY = float(os.getenv('STATION_SNAPSHOT_PUBLISH_DELAY', '1.0'))
+
+    # Flux de changements : événements gardés en mémoire par worker, lignes gardées en base
+    CHANGE_LOG_SIZE = int(os.getenv('CHANGE_LOG_SIZE', '10000'))
+    CHANGE_LOG_RETENTION = int(os.getenv('CHANGE_LOG_RETENTION', '200000'))
+
+    # Flux SSE : durée maximale d'une connexion (le client se reconnecte) et battement de cœur, en secondes
+    CHANGE_STREAM_MAX_SECONDS = float(os.getenv('CHANGE_STREAM_MAX_SECONDS', '300'))
+    CHANGE_STREAM_HEARTBEAT = float(os.getenv('CHANGE_STREAM_HEARTBEAT', '15'))
+    # Flux ouverts simultanément par worker (chacun occupe un fil de gunicorn), au-delà : 503
+    CHANGE_STREAM_MAX_CLIENTS = int(os.getenv('CHANGE_STREAM_MAX_CLIENTS', '16'))
+    # Durée de validité (secondes) d'un jeton d'ouverture de flux, à usage unique
+    CHANGE_STREAM_TOKEN_TTL = int(os.getenv('CHANGE_STREAM_TOKEN_TTL', '30'))
@@ -1,14 +1,209 @@
+import os
+import queue
 import sqlite3
-import pandas as pd
+import threading
+import time
 from config import Config
+from metrics import is_busy_error, phase, registry
 
-def get_db_connection():
-    """Crée une connexion à la base de données SQLite"""
-    conn = sqlite3.connect(Config.DATABASE_PATH, timeout=10.0, check_same_thread=False)
-    conn.row_factory = sqlite3.Row  # Permet d'accéder aux colonnes par nom
+# pandas n'est importé que dans les fonctions d'import CSV : les workers web démarrent sans lui
+
+
+class PoolTimeout(Exception):
+    """Aucune connexion n'a pu être obtenue du pool dans le délai imparti"""
+
+
+class PooledConnection:
+    """
+    Connexion SQLite empruntée au pool. S'utilise comme une sqlite3.Connection ;
+    close() la rend au pool au lieu de la fermer.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError('Connexion déjà rendue au pool')
+        return getattr(self._conn, name)
+
+    def _call(self, operation, *args):
+        """Exécute une opération SQLite en comptant les erreurs de verrou et en chronométrant les attentes d'écriture"""
+        if self._conn is None:
+            raise sqlite3.ProgrammingError('Connexion déjà rendue au pool')
+        lock_wait = operation == 'commit' or (operation == 'execute' and args[0].lstrip()[:15].upper() == 'BEGIN IMMEDIATE')
+        start = time.perf_counter()
+        try:
+            return getattr(self._conn, operation)(*args)
+        except sqlite3.OperationalError as e:
+            if is_busy_error(e):
+                registry.inc('velib_sqlite_busy_errors_total', operation=operation)
+            raise
+        finally:
+            if lock_wait:
+                registry.observe('velib_sqlite_lock_wait_seconds', time.perf_counter() - start, operation=operation)
+
+    def execute(self, *args):
+        return self._call('execute', *args)
+
+    def executemany(self, *args):
+        return self._call('executemany', *args)
+
+    def executescript(self, *args):
+        return self._call('executescript', *args)
+
+    def commit(self):
+        return self._call('commit')
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def close(self):
+        """Rend la connexion au pool (sans effet si elle l'a déjà été)"""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+
+class ConnectionPool:
+    """
+    Pool borné de connexions SQLite partagé par les threads d'un worker.
+    Les PRAGMA sont appliqués une seule fois, à l'ouverture de chaque connexion.
+    """
+
+    def __init__(self, database, size=8, timeout=10.0, healthcheck_interval=30.0):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+        self._idle = queue.LifoQueue(maxsize=size)  # (connexion, date de dernière utilisation)
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=Config.SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # Permet d'accéder aux colonnes par nom
+        configure_connection(conn)
+        return conn
+
+    def _is_healthy(self, conn, last_used):
+        if time.monotonic() - last_used < self.healthcheck_interval:
+            return True
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        """Emprunte une connexion (réutilisée si possible, sinon ouverte) et la retourne"""
+        start = time.perf_counter()
+        try:
+            return self._acquire()
+        except PoolTimeout:
+            registry.inc('velib_db_pool_timeouts_total')
+            raise
+        finally:
+            registry.observe('velib_db_pool_wait_seconds', time.perf_counter() - start)
+
+    def _acquire(self):
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return PooledConnection(self, self._connect())
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                try:
+                    conn, last_used = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeout(f"Aucune connexion disponible après {self.timeout} s")
+
+            if self._is_healthy(conn, last_used):
+                return PooledConnection(self, conn)
+            self._discard(conn)
+
+    def release(self, conn):
+        """Remet une connexion dans le pool, après annulation d'une transaction laissée ouverte"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        self._idle.put((conn, time.monotonic()))
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def close_all(self):
+        """Ferme toutes les connexions inactives du pool"""
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+
+def configure_connection(conn):
+    """Applique les PRAGMA de performance à une nouvelle connexion"""
     # Active le mode Write-Ahead Logging pour améliorer la concurrence
     conn.execute('PRAGMA journal_mode=WAL')
-    return conn
+    conn.execute(f'PRAGMA synchronous={Config.SQLITE_SYNCHRONOUS}')
+    conn.execute(f'PRAGMA cache_size={int(Config.SQLITE_CACHE_SIZE)}')
+    conn.execute(f'PRAGMA mmap_size={int(Config.SQLITE_MMAP_SIZE)}')
+    conn.execute(f'PRAGMA temp_store={Config.SQLITE_TEMP_STORE}')
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Retourne le pool du processus courant (recréé après un fork de gunicorn)"""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ConnectionPool(
+                    Config.DATABASE_PATH,
+                    size=Config.DB_POOL_SIZE,
+                    timeout=Config.DB_POOL_TIMEOUT,
+                    healthcheck_interval=Config.DB_POOL_HEALTHCHECK_INTERVAL
+                )
+                _pool_pid = os.getpid()
+    return _pool
+
+def get_db_connection():
+    """
+    Fournit une connexion à la base de données SQLite, empruntée au pool du worker.
+    Appeler close() la rend au pool. Avec DB_POOL_SIZE=0, ouvre une connexion dédiée.
+    """
+    with phase('connection'):
+        if Config.DB_POOL_SIZE <= 0:
+            conn = sqlite3.connect(Config.DATABASE_PATH, timeout=Config.SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+            conn.row_factory = sqlite3.Row  # Permet d'accéder aux colonnes par nom
+            configure_connection(conn)
+            return conn
+        return get_pool().acquire()
 
 def init_db():
     """Initialise la base de données avec les tables nécessaires"""
@@ -33,10 +228,13 @@ def init_db():
             latitude REAL NOT NULL,
             longitude REAL NOT NULL,
             capacity INTEGER,
-            address TEXT
+            address TEXT,
+            content_hash INTEGER
         )
     ''')
     
+    migrate_db(conn)
+    
     # Crée un utilisateur de test (mot de passe : admin123)
     # Note : en production, il faut hasher le mot de passe !
     cursor.execute('''
@@ -48,71 +246,544 @@ def init_db():
     conn.close()
     print("Base de données initialisée avec succès !")
 
-def import_csv(csv_file_path):
-    """Importe les données du fichier CSV dans la base de données"""
+def _ensure_column(conn, table, column, definition):
+    """Ajoute une colonne à une table existante si elle n'y est pas encore"""
+    columns = [row['name'] for row in conn.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def migrate_db(conn):
+    """Met à niveau le schéma d'une base existante (idempotent)"""
+    # Empreinte du contenu importé depuis le flux (NULL pour les stations créées via l'API)
+    _ensure_column(conn, 'stations', 'content_hash', 'INTEGER')
+    
+    # station_id devient unique : on ne garde que la version la plus récente des doublons
+    conn.execute('''
+        DELETE FROM stations
+        WHERE station_id IS NOT NULL
+          AND id NOT IN (SELECT MAX(id) FROM stations WHERE station_id IS NOT NULL GROUP BY station_id)
+    ''')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_stations_station_id ON stations (station_id)')
+    
+    # Index R*Tree des coordonnées, tenu à jour par triggers (requêtes par rectangle)
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS stations_rtree
+        USING rtree(id, min_lat, max_lat, min_lon, max_lon)
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS stations_rtree_insert AFTER INSERT ON stations
+        BEGIN
+            INSERT INTO stations_rtree VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS stations_rtree_update AFTER UPDATE OF latitude, longitude ON stations
+        BEGIN
+            UPDATE stations_rtree
+            SET min_lat = new.latitude, max_lat = new.latitude, min_lon = new.longitude, max_lon = new.longitude
+            WHERE id = new.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS stations_rtree_delete AFTER DELETE ON stations
+        BEGIN
+            DELETE FROM stations_rtree WHERE id = old.id;
+        END
+    ''')
+    conn.execute('''
+        INSERT INTO stations_rtree
+        SELECT id, latitude, latitude, longitude, longitude FROM stations
+        WHERE id NOT IN (SELECT id FROM stations_rtree)
+    ''')
+    
+    # Index plein texte (FTS5) des noms et adresses, sans accents ni casse, avec index de
+    # préfixes de 2 et 3 caractères (autocomplétion) ; contenu lu dans stations, triggers de synchro
+    fts_exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stations_fts'"
+    ).fetchone() is not None
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS stations_fts
+        USING fts5(name, address, content='stations', content_rowid='id',
+                   tokenize='unicode61 remove_diacritics 2', prefix='2 3')
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS stations_fts_insert AFTER INSERT ON stations
+        BEGIN
+            INSERT INTO stations_fts (rowid, name, address) VALUES (new.id, new.name, new.address);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS stations_fts_update AFTER UPDATE OF name, address ON stations
+        BEGIN
+            INSERT INTO stations_fts (stations_fts, rowid, name, address) VALUES ('delete', old.id, old.name, old.address);
+            INSERT INTO stations_fts (rowid, name, address) VALUES (new.id, new.name, new.address);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS stations_fts_delete AFTER DELETE ON stations
+        BEGIN
+            INSERT INTO stations_fts (stations_fts, rowid, name, address) VALUES ('delete', old.id, old.name, old.address);
+        END
+    ''')
+    if not fts_exists:
+        conn.execute("INSERT INTO stations_fts (stations_fts) VALUES ('rebuild')")
+    
+    # Version globale du jeu de données, incrémentée à chaque modification des stations
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('dataset_version', 0)")
+    # Identifiant aléatoire de la base : distingue ses instantanés de ceux d'une base recréée
+    conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('dataset_id', abs(random()))")
+    
+    # Journal des modifications de stations (flux de changements) : rempli par triggers,
+    # la version est attribuée par bump_dataset_version dans la même transaction
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS station_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            version INTEGER,
+            station_key INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            ts INTEGER
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_station_changes_pending ON station_changes (seq) WHERE version IS NULL')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS stations_changes_insert AFTER INSERT ON stations
+        BEGIN
+            INSERT INTO station_changes (station_key, op) VALUES (new.id, 'upsert');
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS stations_changes_update AFTER UPDATE ON stations
+        BEGIN
+            INSERT INTO station_changes (station_key, op) VALUES (new.id, 'upsert');
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS stations_changes_delete AFTER DELETE ON stations
+        BEGIN
+            INSERT INTO station_changes (station_key, op) VALUES (old.id, 'delete');
+        END
+    ''')
+    
+    # Jetons d'ouverture de flux déjà utilisés (partagés par les workers), jusqu'à leur expiration
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stream_tokens (
+            jti TEXT PRIMARY KEY,
+            expires INTEGER NOT NULL
+        )
+    ''')
+    
+    # Relevés de disponibilité (append-only) : clé entière de station (stations.id),
+    # horodatage en secondes epoch, petits entiers ; sans rowid pour rester compact
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS availability (
+            station_key INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            mechanical INTEGER NOT NULL,
+            electric INTEGER NOT NULL,
+            free_docks INTEGER NOT NULL,
+            PRIMARY KEY (station_key, ts)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_availability_ts ON availability (ts)')
+    
+    # Agrégats horaires et journaliers (UTC) des relevés, tenus à jour à l'ingestion
+    for table in ('availability_hourly', 'availability_daily'):
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                station_key INTEGER NOT NULL,
+                bucket_ts INTEGER NOT NULL,
+                samples INTEGER NOT NULL,
+                bikes_min INTEGER NOT NULL,
+                bikes_max INTEGER NOT NULL,
+                bikes_sum INTEGER NOT NULL,
+                docks_min INTEGER NOT NULL,
+                docks_max INTEGER NOT NULL,
+                docks_sum INTEGER NOT NULL,
+                empty_samples INTEGER NOT NULL,
+                full_samples INTEGER NOT NULL,
+                PRIMARY KEY (station_key, bucket_ts)
+            ) WITHOUT ROWID
+        ''')
+    conn.commit()
+
+def get_dataset_version(conn):
+    """Retourne la version courante du jeu de données des stations"""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'dataset_version'").fetchone()
+    return row[0] if row else 0
+
+def get_dataset_id(conn):
+    """Retourne l'identifiant aléatoire de la base (0 si la base n'est pas encore migrée)"""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'dataset_id'").fetchone()
+    return row[0] if row else 0
+
+def bump_dataset_version(conn):
+    """
+    Incrémente la version du jeu de données (dans la transaction en cours) et la retourne ;
+    les modifications de stations de la transaction sont journalisées sous cette version
+    """
+    conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'dataset_version'")
+    version = get_dataset_version(conn)
+    conn.execute('UPDATE station_changes SET version = ? WHERE version IS NULL', (version,))
+    return version
+
+def optimize_search_index():
+    """Fusionne les segments de l'index plein texte (après de nombreuses écritures)"""
+    conn = get_db_connection()
     try:
-        # Lit le fichier CSV avec point-virgule comme séparateur
-        df = pd.read_csv(csv_file_path, sep=';', encoding='utf-8')
-        
-        print(f"Colonnes trouvées: {df.columns.tolist()}")
-        
-        conn = get_db_connection()
-        imported_count = 0
-        
-        # Nettoie les données et les insère
-        for _, row in df.iterrows():
-            try:
-                # Récupère le code de la station
-                station_code = str(row.get('Code de la station', ''))
-                
-                # Récupère le nom de la station
-                station_name = str(row.get('Nom de la station', 'Sans nom'))
-                
-                # Parse les coordonnées GPS depuis la colonne 'geo'
-                geo = str(row.get('geo', ''))
-                if ',' in geo:
-                    coords = geo.split(',')
-                    latitude = float(coords[0])
-                    longitude = float(coords[1])
-                else:
-                    print(f"Coordonnées invalides pour {station_name}")
-                    continue
-                
-                # Récupère la capacité
-                capacity = int(row.get('Nombres de bornes en station', 0)) if pd.notna(row.get('Nombres de bornes en station')) else 0
-                
-                # Adresse (on n'a pas cette info dans le CSV, on laisse vide)
-                address = ''
-                
-                conn.execute('''
-                    INSERT OR REPLACE INTO stations 
-                    (station_id, name, latitude, longitude, capacity, address)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    station_code,
-                    station_name,
-                    latitude,
-                    longitude,
-                    capacity,
-                    address
-                ))
-                imported_count += 1
-                
-            except Exception as e:
-                print(f"Erreur lors de l'insertion d'une ligne : {e}")
-                print(f"Données de la ligne : {row.to_dict()}")
-                continue
-        
+        conn.execute("INSERT INTO stations_fts (stations_fts) VALUES ('optimize')")
         conn.commit()
+    finally:
         conn.close()
-        print(f"Import réussi : {imported_count} stations importées !")
-        
+
+def prune_changes(keep=None):
+    """Ne garde que les `keep` dernières entrées du journal des modifications ; retourne le nombre supprimé"""
+    keep = Config.CHANGE_LOG_RETENTION if keep is None else keep
+    conn = get_db_connection()
+    try:
+        deleted = conn.execute(
+            'DELETE FROM station_changes WHERE seq <= (SELECT MAX(seq) FROM station_changes) - ?', (keep,)
+        ).rowcount
+        conn.commit()
+        return deleted
+    finally:
+        conn.close()
+
+# Colonnes du fichier open data Vélib utilisées par l'import
+CSV_COLUMNS = {
+    'code': 'Code de la station',
+    'name': 'Nom de la station',
+    'geo': 'geo',
+    'capacity': 'Nombres de bornes en station',
+}
+
+# Nombre d'exemples de lignes rejetées affichés en fin d'import
+REJECT_SAMPLES = 10
+
+
+def read_csv_chunks(csv_file_path, columns, chunksize):
+    """Lit le CSV (séparateur point-virgule) par blocs, en texte brut, limité aux colonnes utiles"""
+    import pandas as pd
+
+    return pd.read_csv(
+        csv_file_path,
+        sep=';',
+        encoding='utf-8',
+        usecols=lambda column: column in columns,
+        dtype=str,
+        keep_default_na=False,
+        chunksize=chunksize
+    )
+
+
+def csv_column(chunk, name, default=''):
+    """Retourne une colonne du bloc, ou une colonne de valeurs par défaut si elle est absente"""
+    import pandas as pd
+
+    if name in chunk.columns:
+        return chunk[name].str.strip()
+    return pd.Series(default, index=chunk.index, dtype=object)
+
+
+def parse_station_chunk(chunk):
+    """
+    Parse et valide un bloc du CSV de manière vectorisée.
+    Retourne (DataFrame des stations valides, DataFrame des rejets avec leur motif).
+    """
+    import pandas as pd
+
+    code = csv_column(chunk, CSV_COLUMNS['code'])
+    name = csv_column(chunk, CSV_COLUMNS['name']).replace('', 'Sans nom')
+
+    # Coordonnées GPS au format "latitude,longitude" dans la colonne 'geo'
+    coords = csv_column(chunk, CSV_COLUMNS['geo']).str.split(',', n=1, expand=True).reindex(columns=[0, 1])
+    latitude = pd.to_numeric(coords[0], errors='coerce')
+    longitude = pd.to_numeric(coords[1], errors='coerce')
+
+    # Capacité : vide -> 0, valeur non numérique ou négative -> rejet
+    raw_capacity = csv_column(chunk, CSV_COLUMNS['capacity'])
+    capacity = pd.to_numeric(raw_capacity, errors='coerce')
+    capacity = capacity.mask(raw_capacity == '', 0)
+
+    reason = pd.Series('', index=chunk.index, dtype=object)
+    reason = reason.mask(capacity.isna() | (capacity < 0), 'capacité invalide')
+    reason = reason.mask(~longitude.between(-180, 180), 'longitude invalide')
+    reason = reason.mask(~latitude.between(-90, 90), 'latitude invalide')
+    reason = reason.mask(latitude.isna() | longitude.isna(), 'coordonnées invalides')
+    valid = (reason == '').to_numpy()
+
+    stations = pd.DataFrame({
+        'station_id': code[valid],
+        'name': name[valid],
+        'latitude': latitude[valid].astype('float64'),
+        'longitude': longitude[valid].astype('float64'),
+        'capacity': capacity[valid].astype('int64'),
+        'address': '',  # Adresse (on n'a pas cette info dans le CSV, on laisse vide)
+    })
+    rejects = chunk[~valid].assign(ligne=chunk.index[~valid] + 2, motif=reason[~valid])
+    return stations, rejects
+
+
+# Colonnes prises en compte dans l'empreinte du contenu d'une station
+HASHED_COLUMNS = ['station_id', 'name', 'latitude', 'longitude', 'capacity', 'address']
+
+UPSERT_STATION_SQL = '''
+    INSERT INTO stations (station_id, name, latitude, longitude, capacity, address, content_hash)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (station_id) DO UPDATE SET
+        name = excluded.name,
+        latitude = excluded.latitude,
+        longitude = excluded.longitude,
+        capacity = excluded.capacity,
+        address = excluded.address,
+        content_hash = excluded.content_hash
+    WHERE stations.content_hash IS NOT excluded.content_hash
+'''
+
+
+def with_content_hash(stations):
+    """Ajoute la colonne content_hash (empreinte 64 bits calculée de manière vectorisée)"""
+    import pandas as pd
+
+    hashes = pd.util.hash_pandas_object(stations[HASHED_COLUMNS], index=False)
+    return stations.assign(content_hash=hashes.to_numpy().view('int64'))
+
+
+class RejectReport:
+    """Rapport des lignes rejetées à l'import : compteur, exemples et fichier CSV optionnel"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.count = 0
+        self.samples = []
+
+    def add(self, rejects):
+        if not len(rejects):
+            return
+        if self.path:
+            rejects.to_csv(self.path, sep=';', index=False, mode='w' if self.count == 0 else 'a',
+                           header=self.count == 0)
+        self.count += len(rejects)
+        self.samples.extend(rejects[['ligne', 'motif']].head(REJECT_SAMPLES - len(self.samples)).itertuples(index=False))
+
+    def print_summary(self):
+        for line, reason in self.samples:
+            print(f"  Ligne {line} rejetée : {reason}")
+        if self.count and self.path:
+            print(f"Rapport des rejets : {self.path}")
+
+
+def iter_station_chunks(csv_file_path, chunksize, report):
+    """Lit le CSV par blocs et produit les stations valides (avec empreinte) de chaque bloc"""
+    for index, chunk in enumerate(read_csv_chunks(csv_file_path, CSV_COLUMNS.values(), chunksize)):
+        if index == 0:
+            print(f"Colonnes utilisées: {chunk.columns.tolist()}")
+
+        stations, rejects = parse_station_chunk(chunk)
+        report.add(rejects)
+        yield with_content_hash(stations)
+
+
+def _rows_per_sec(rows, elapsed):
+    return rows / elapsed if elapsed > 0 else 0.0
+
+
+def import_csv(csv_file_path, chunksize=None, reject_path=None):
+    """
+    Importe les données du fichier CSV dans la base de données.
+    Le fichier est lu par blocs de `chunksize` lignes (mémoire bornée) ; chaque bloc est
+    validé de manière vectorisée puis inséré avec executemany, le tout dans une seule
+    transaction. Les lignes rejetées sont écrites dans `reject_path` (CSV) si précisé.
+    Retourne les statistiques de l'import, ou None en cas d'échec.
+    """
+    chunksize = chunksize or Config.IMPORT_CHUNK_SIZE
+    report = RejectReport(reject_path)
+    started = time.perf_counter()
+    imported_count = 0
+    conn = None
+
+    try:
+        conn = get_db_connection()
+        conn.execute('BEGIN')
+
+        for stations in iter_station_chunks(csv_file_path, chunksize, report):
+            # Insère les nouvelles stations et met à jour les existantes (même station_id)
+            conn.executemany(UPSERT_STATION_SQL, stations.itertuples(index=False, name=None))
+            imported_count += len(stations)
+
+        bump_dataset_version(conn)
+        conn.commit()
     except Exception as e:
+        if conn is not None:
+            conn.rollback()
         print(f"Erreur lors de l'import du CSV : {e}")
+        return None
+    finally:
+        if conn is not None:
+            conn.close()
+
+    elapsed = time.perf_counter() - started
+    rows_per_sec = _rows_per_sec(imported_count + report.count, elapsed)
+    print(f"Import réussi : {imported_count} stations importées, {report.count} lignes rejetées "
+          f"en {elapsed:.2f} s ({rows_per_sec:,.0f} lignes/s)")
+    report.print_summary()
+
+    return {
+        'imported': imported_count,
+        'rejected': report.count,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(rows_per_sec, 1),
+    }
+
+
+def sync_csv(csv_file_path, chunksize=None, reject_path=None, delete_missing=True):
+    """
+    Synchronisation différentielle du flux des stations, clé station_id.
+    Le flux est chargé dans une table temporaire, puis comparé à la table stations :
+    seules les stations nouvelles ou dont l'empreinte a changé sont écrites, et les
+    stations issues du flux qui n'y figurent plus sont supprimées (les stations créées
+    via l'API, sans empreinte, sont conservées). Retourne le nombre de stations
+    insérées, mises à jour, supprimées et inchangées, ou None en cas d'échec.
+    """
+    chunksize = chunksize or Config.IMPORT_CHUNK_SIZE
+    report = RejectReport(reject_path)
+    started = time.perf_counter()
+    conn = None
+
+    try:
+        conn = get_db_connection()
+        conn.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS feed_stage (
+                station_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                capacity INTEGER,
+                address TEXT,
+                content_hash INTEGER
+            )
+        ''')
+        conn.execute('DELETE FROM feed_stage')
+
+        # Charge le flux (en cas de doublon dans le flux, la dernière ligne l'emporte)
+        for stations in iter_station_chunks(csv_file_path, chunksize, report):
+            conn.executemany(
+                'INSERT OR REPLACE INTO feed_stage VALUES (?, ?, ?, ?, ?, ?, ?)',
+                stations.itertuples(index=False, name=None)
+            )
+        received = conn.execute('SELECT COUNT(*) FROM feed_stage').fetchone()[0]
+        conn.commit()
+
+        # Applique le différentiel en une seule transaction d'écriture
+        conn.execute('BEGIN IMMEDIATE')
+        updated = conn.execute('''
+            UPDATE stations SET
+                name = feed.name,
+                latitude = feed.latitude,
+                longitude = feed.longitude,
+                capacity = feed.capacity,
+                address = feed.address,
+                content_hash = feed.content_hash
+            FROM feed_stage AS feed
+            WHERE stations.station_id = feed.station_id
+              AND stations.content_hash IS NOT feed.content_hash
+        ''').rowcount
+        inserted = conn.execute('''
+            INSERT INTO stations (station_id, name, latitude, longitude, capacity, address, content_hash)
+            SELECT station_id, name, latitude, longitude, capacity, address, content_hash
+            FROM feed_stage
+            WHERE station_id NOT IN (SELECT station_id FROM stations WHERE station_id IS NOT NULL)
+        ''').rowcount
+        deleted = 0
+        # Un flux vide (téléchargement raté, fichier tronqué) ne doit pas vider la table
+        if delete_missing and received > 0:
+            deleted = conn.execute('''
+                DELETE FROM stations
+                WHERE content_hash IS NOT NULL
+                  AND station_id NOT IN (SELECT station_id FROM feed_stage)
+            ''').rowcount
+        if inserted or updated or deleted:
+            bump_dataset_version(conn)
+        conn.commit()
+        conn.execute('DELETE FROM feed_stage')
+        conn.commit()
+    except Exception as e:
+        if conn is not None:
+            conn.rollback()
+        print(f"Erreur lors de la synchronisation du flux : {e}")
+        return None
+    finally:
+        if conn is not None:
+            conn.close()
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        'inserted': inserted,
+        'updated': updated,
+        'deleted': deleted,
+        'unchanged': received - inserted - updated,
+        'rejected': report.count,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(_rows_per_sec(received + report.count, elapsed), 1),
+    }
+    print(f"Synchronisation réussie en {elapsed:.2f} s : {stats['inserted']} insérées, {stats['updated']} mises à jour, "
+          f"{stats['deleted']} supprimées, {stats['unchanged']} inchangées, {stats['rejected']} lignes rejetées")
+    report.print_summary()
+    return stats
+
+def publish_station_snapshot():
+    """Publie l'instantané partagé des stations après un import (voir snapshot.py)"""
+    if not Config.STATION_SNAPSHOT_ENABLED:
+        return
+    from snapshot import ensure_snapshot, snapshot_path
+    
+    conn = get_db_connection()
+    try:
+        ensure_snapshot(conn, snapshot_path(), Config.SPATIAL_CELL_SIZE, min_version=get_dataset_version(conn))
+    finally:
+        conn.close()
 
 if __name__ == '__main__':
-    # Initialise la base de données
-    init_db()
+    import sys
+    
+    # Usage : python database.py [init | migrate | sync <fichier.csv> | compact | rollups]
+    command = sys.argv[1] if len(sys.argv) > 1 else 'init'
     
-    # Importe le fichier CSV (adapte le nom si nécessaire)
-    import_csv('velib-pos (1).csv')
\ No newline at end of file
+    if command == 'migrate':
+        # Met à niveau le schéma d'une base existante
+        init_db()
+    elif command == 'sync':
+        # Synchronisation différentielle avec le flux (ex. toutes les minutes via cron),
+        # suivie de l'enregistrement du relevé de disponibilité
+        from availability import import_availability_csv
+        
+        init_db()
+        csv_file_path = sys.argv[2] if len(sys.argv) > 2 else 'velib-pos (1).csv'
+        sync_csv(csv_file_path)
+        import_availability_csv(csv_file_path)
+        publish_station_snapshot()
+        prune_changes()
+    elif command == 'compact':
+        # Rétention et sous-échantillonnage des relevés de disponibilité (ex. une fois par jour)
+        from availability import compact_availability
+        
+        compact_availability()
+        prune_changes()
+        optimize_search_index()
+    elif command == 'rollups':
+        # Recalcule les agrégats horaires et journaliers à partir des relevés
+        from availability import rebuild_rollups
+        
+        rebuild_rollups()
+    else:
+        # Initialise la base de données
+        init_db()
+        
+        # Importe le fichier CSV (adapte le nom si nécessaire)
+        import_csv('velib-pos (1).csv')
+        publish_station_snapshot()
\ No newline at end of file
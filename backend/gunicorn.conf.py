@@ -0,0 +1,44 @@
+import gc
+import os
+
+# Configuration Gunicorn : lue automatiquement au lancement depuis le dossier backend.
+# Par défaut, workers "gthread" : chaque worker sert de nombreuses connexions
+# (keep-alive géré hors des fils), un client lent n'immobilise plus tout le worker.
+# Pour des milliers de clients par instance : GUNICORN_WORKER_CLASS=gevent (pip install gevent).
+
+# Utilise $PORT fourni par Render (8000 en local)
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+
+# gthread : fils par worker (partagent l'index en mémoire et le pool de connexions SQLite)
+threads = int(os.getenv('GUNICORN_THREADS', '32'))
+
+# gevent : connexions simultanées par worker
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+
+timeout = 600
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Démarrage rapide : l'application (et l'index des stations) est chargée une seule fois dans
+# le processus maître, puis partagée en copie sur écriture par les workers forkés.
+# GUNICORN_PRELOAD=0 rétablit un chargement par worker (rechargement à chaud, par exemple).
+# Jamais avec gevent/eventlet : le worker ne patche la bibliothèque standard qu'après le fork,
+# et les verrous, conditions et événements créés à l'import par le maître resteraient des
+# primitives du système, bloquantes pour toute la boucle du worker (un flux SSE en attente...).
+cooperative_worker = any(name in worker_class.lower() for name in ('gevent', 'eventlet'))
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1' and not cooperative_worker
+
+
+def when_ready(server):
+    """Dans le maître, après le préchargement : prépare l'état partagé avant les forks"""
+    if not preload_app:
+        return
+    from database import get_pool
+
+    # Les connexions SQLite ne doivent pas traverser un fork : chaque worker ouvre les siennes
+    get_pool().close_all()
+    # Sort les objets préchargés du suivi du ramasse-miettes : ses passages dans les workers
+    # ne réécrivent plus leurs pages mémoire, qui restent partagées avec le maître
+    gc.freeze()
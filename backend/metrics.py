@@ -0,0 +1,224 @@
+import collections
+import itertools
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Bornes (secondes) des histogrammes de latence
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Bornes des histogrammes de taille (nombre d'opérations par transaction)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# Métriques exposées : nom -> (type Prometheus, description)
+METRICS = {
+    'velib_http_requests_total': ('counter', 'Requêtes HTTP traitées, par route, méthode et statut'),
+    'velib_http_request_duration_seconds': ('histogram', 'Durée des requêtes HTTP, par route et méthode'),
+    'velib_request_phase_seconds': ('histogram', 'Durée des phases d\'une requête (connection, query, compute, serialize...)'),
+    'velib_db_pool_wait_seconds': ('histogram', 'Attente d\'une connexion du pool SQLite'),
+    'velib_db_pool_timeouts_total': ('counter', 'Connexions du pool non obtenues dans le délai'),
+    'velib_sqlite_lock_wait_seconds': ('histogram', 'Attente du verrou d\'écriture SQLite (BEGIN IMMEDIATE, COMMIT)'),
+    'velib_sqlite_busy_errors_total': ('counter', 'Erreurs SQLite "database is locked/busy", par opération'),
+    'velib_cache_hits_total': ('counter', 'Réponses servies depuis le cache, par cache'),
+    'velib_cache_misses_total': ('counter', 'Réponses absentes du cache, par cache'),
+    'velib_cache_entries': ('gauge', 'Entrées présentes dans le cache, par cache'),
+    'velib_dataset_version': ('gauge', 'Version du jeu de données connue du worker'),
+    'velib_station_index_size': ('gauge', 'Stations présentes dans l\'index en mémoire'),
+    'velib_write_queue_depth': ('gauge', 'Écritures en attente dans la file de l\'écrivain du worker'),
+    'velib_write_queue_wait_seconds': ('histogram', 'Délai entre la soumission d\'une écriture et sa validation'),
+    'velib_write_batch_size': ('histogram', 'Écritures validées par transaction (group commit)'),
+    'velib_write_batch_failures_total': ('counter', 'Transactions d\'écriture groupées annulées en entier'),
+    'velib_change_streams': ('gauge', 'Flux SSE de changements ouverts par le worker'),
+    'velib_change_streams_rejected_total': ('counter', 'Ouvertures de flux SSE refusées (limite du worker atteinte)'),
+}
+
+
+class Histogram:
+    """Histogramme cumulatif au format Prometheus (compteurs par borne, somme, total)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Dernière case : +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+
+
+class Registry:
+    """
+    Compteurs et histogrammes étiquetés d'un processus. Avec plusieurs workers gunicorn,
+    chaque worker expose ses propres valeurs (étiquette pid ajoutée au rendu).
+    """
+
+    def __init__(self):
+        self._counters = collections.defaultdict(float)   # (nom, étiquettes) -> valeur
+        self._histograms = {}                              # (nom, étiquettes) -> Histogram
+        self._collectors = []                              # Fonctions appelées au rendu : [(nom, étiquettes, valeur)]
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def collector(self, function):
+        """Enregistre une fonction qui fournit des valeurs lues au moment du rendu (jauges, compteurs externes)"""
+        self._collectors.append(function)
+        return function
+
+    def render(self, **extra_labels):
+        """Texte au format d'exposition Prometheus (version 0.0.4)"""
+        samples = collections.defaultdict(list)
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                samples[name].append((labels, value))
+            histograms = [(name, labels, list(h.counts), h.sum, h.buckets) for (name, labels), h in self._histograms.items()]
+        for function in self._collectors:
+            for name, labels, value in function():
+                samples[name].append((tuple(sorted(labels.items())), value))
+
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            if name not in samples and not any(h[0] == name for h in histograms):
+                continue
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(samples.get(name, ())):
+                lines.append(f'{name}{format_labels(labels, extra_labels)} {value:g}')
+            for _, labels, counts, total, buckets in sorted(h for h in histograms if h[0] == name):
+                cumulative = list(itertools.accumulate(counts))
+                for bound, count in zip(list(buckets) + ['+Inf'], cumulative):
+                    bucket_labels = labels + (('le', f'{bound:g}' if bound != '+Inf' else bound),)
+                    lines.append(f'{name}_bucket{format_labels(bucket_labels, extra_labels)} {count}')
+                lines.append(f'{name}_sum{format_labels(labels, extra_labels)} {total:g}')
+                lines.append(f'{name}_count{format_labels(labels, extra_labels)} {cumulative[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels, extra_labels=None):
+    """Étiquettes Prometheus : {cle="valeur",...} (échappement des guillemets et barres obliques)"""
+    items = list(labels) + sorted((extra_labels or {}).items())
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + '}'
+
+
+registry = Registry()
+
+# Route de la requête en cours sur ce fil (greenlet sous gevent), pour étiqueter les phases
+_current = threading.local()
+
+
+def begin_request(route):
+    _current.route = route
+
+
+def end_request():
+    _current.route = None
+
+
+@contextmanager
+def phase(name):
+    """Chronomètre une phase de la requête en cours (ou hors requête : route "-")"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe('velib_request_phase_seconds', time.perf_counter() - start,
+                         route=getattr(_current, 'route', None) or '-', phase=name)
+
+
+def is_busy_error(error):
+    """Indique si une erreur SQLite provient d'un verrou (base occupée)"""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+# ============== PROFILAGE PAR ÉCHANTILLONNAGE ==============
+
+class SamplingProfiler:
+    """
+    Profileur par échantillonnage d'un seul fil : relève sa pile d'appels toutes les
+    `interval` secondes et agrège les piles au format "replié" (flamegraph.pl, speedscope).
+    Sans effet sur les autres requêtes ; à n'activer qu'à la demande.
+    """
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def collapsed(self):
+        """Piles repliées, une par ligne : "f1;f2;f3 nombre_d_échantillons" """
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class ProfileStore:
+    """Derniers profils de requêtes, consultables par identifiant"""
+
+    def __init__(self, maxsize=50):
+        self._profiles = collections.OrderedDict()
+        self._ids = itertools.count(1)
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+
+    def add(self, route, duration, profiler):
+        with self._lock:
+            profile_id = str(next(self._ids))
+            self._profiles[profile_id] = {
+                'route': route,
+                'duration': duration,
+                'samples': profiler.samples,
+                'collapsed': profiler.collapsed(),
+            }
+            while len(self._profiles) > self.maxsize:
+                self._profiles.popitem(last=False)
+            return profile_id
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+
+profiles = ProfileStore()
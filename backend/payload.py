@@ -0,0 +1,166 @@
+import gzip
+import json
+import struct
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # Dépendance optionnelle : format MessagePack indisponible
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # Dépendance optionnelle : compression brotli indisponible
+    brotli = None
+
+# Types MIME des formats de liste de stations
+JSON_MIMETYPE = 'application/json'
+COLUMNAR_MIMETYPE = 'application/vnd.velib.stations+binary'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+# En-tête du format colonnaire : magic, version, nombre de stations, nombre de chaînes, taille des chaînes
+COLUMNAR_MAGIC = b'VLB1'
+COLUMNAR_VERSION = 2
+COLUMNAR_HEADER = struct.Struct('<4sHxxIII')
+
+# Coordonnées quantifiées en entiers 32 bits (1e-6 degré, ~0,1 m)
+COORD_SCALE = 1_000_000
+# Valeur des colonnes entières absentes (capacité ou distance inconnue)
+MISSING = -1
+# Indice de chaîne d'une valeur absente (None), distinct de la chaîne vide
+NULL_STRING = 0xFFFFFFFF
+
+# Champs représentables par les formats colonnaire et MessagePack
+COLUMN_FIELDS = frozenset(('id', 'station_id', 'name', 'latitude', 'longitude', 'capacity', 'address', 'distance'))
+
+
+class UnsupportedPayload(ValueError):
+    """Liste de stations que le format demandé ne sait pas représenter sans perte"""
+
+
+def available_formats():
+    """Types MIME acceptés pour une liste de stations, par ordre de préférence du serveur"""
+    formats = [JSON_MIMETYPE, COLUMNAR_MIMETYPE]
+    if msgpack is not None:
+        formats.append(MSGPACK_MIMETYPE)
+    return formats
+
+
+def available_encodings():
+    """Compressions disponibles, de la plus efficace à la moins efficace"""
+    return (['br'] if brotli is not None else []) + ['gzip']
+
+
+def to_columns(stations):
+    """
+    Passe d'une liste de stations (dicts) à des colonnes : coordonnées en int32 quantifiés,
+    distances en mètres, et noms / codes / adresses remplacés par des indices dans une
+    table de chaînes dédupliquée (NULL_STRING pour None)
+    """
+    strings = {}
+
+    def intern(value):
+        return NULL_STRING if value is None else strings.setdefault(str(value), len(strings))
+
+    def integers(field, scale=1):
+        return [MISSING if s.get(field) is None else int(round(s[field] * scale)) for s in stations]
+
+    return {
+        'id': [s['id'] for s in stations],
+        'latitude': [int(round(s['latitude'] * COORD_SCALE)) for s in stations],
+        'longitude': [int(round(s['longitude'] * COORD_SCALE)) for s in stations],
+        'capacity': integers('capacity'),
+        'distance': integers('distance', 1000),  # En mètres
+        'station_id': [intern(s['station_id']) for s in stations],
+        'name': [intern(s['name']) for s in stations],
+        'address': [intern(s['address']) for s in stations],
+        'strings': list(strings),
+    }
+
+
+def encode_columnar(stations):
+    """
+    Format binaire colonnaire (little-endian) :
+    en-tête | id, latitude, longitude, capacity, distance en int32 | indices station_id,
+    name, address en uint32 (NULL_STRING si absent) | offsets (uint32, nombre de chaînes + 1) | chaînes UTF-8 concaténées
+    """
+    columns = to_columns(stations)
+    encoded = [value.encode('utf-8') for value in columns['strings']]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+
+    parts = [COLUMNAR_HEADER.pack(COLUMNAR_MAGIC, COLUMNAR_VERSION, len(stations), len(encoded), int(offsets[-1]))]
+    for field in ('id', 'latitude', 'longitude', 'capacity', 'distance'):
+        parts.append(np.asarray(columns[field], dtype='<i4').tobytes())
+    for field in ('station_id', 'name', 'address'):
+        parts.append(np.asarray(columns[field], dtype='<u4').tobytes())
+    parts.append(offsets.tobytes())
+    parts.extend(encoded)
+    return b''.join(parts)
+
+
+def decode_columnar(data):
+    """Décode le format colonnaire en liste de stations (dicts), pour les clients Python et les tests"""
+    magic, version, count, n_strings, strings_size = COLUMNAR_HEADER.unpack_from(data)
+    if magic != COLUMNAR_MAGIC or version != COLUMNAR_VERSION:
+        raise ValueError('Format colonnaire inconnu')
+
+    position = COLUMNAR_HEADER.size
+    columns = {}
+    for field, dtype in (('id', '<i4'), ('latitude', '<i4'), ('longitude', '<i4'), ('capacity', '<i4'),
+                         ('distance', '<i4'), ('station_id', '<u4'), ('name', '<u4'), ('address', '<u4')):
+        columns[field] = np.frombuffer(data, dtype=dtype, count=count, offset=position).tolist()
+        position += 4 * count
+    offsets = np.frombuffer(data, dtype='<u4', count=n_strings + 1, offset=position).tolist()
+    position += 4 * (n_strings + 1)
+    blob = data[position:position + strings_size]
+    strings = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(n_strings)]
+
+    def string(index):
+        return None if index == NULL_STRING else strings[index]
+
+    stations = []
+    for i in range(count):
+        station = {
+            'id': columns['id'][i],
+            'station_id': string(columns['station_id'][i]),
+            'name': string(columns['name'][i]),
+            'latitude': columns['latitude'][i] / COORD_SCALE,
+            'longitude': columns['longitude'][i] / COORD_SCALE,
+            'capacity': None if columns['capacity'][i] == MISSING else columns['capacity'][i],
+            'address': string(columns['address'][i]),
+        }
+        if columns['distance'][i] != MISSING:
+            station['distance'] = columns['distance'][i] / 1000
+        stations.append(station)
+    return stations
+
+
+def check_columns(stations):
+    """Lève UnsupportedPayload si des stations portent des champs hors des colonnes (ex. availability)"""
+    extra = set().union(*stations) - COLUMN_FIELDS if stations else set()
+    if extra:
+        raise UnsupportedPayload(f"Champs non représentables en colonnes : {', '.join(sorted(extra))}")
+
+
+def serialize(stations, mimetype, dumps=json.dumps):
+    """
+    Sérialise une liste de stations dans le format demandé. Lève UnsupportedPayload si le
+    format binaire ne peut pas la représenter : le client doit alors demander du JSON.
+    """
+    if mimetype != JSON_MIMETYPE:
+        check_columns(stations)
+    if mimetype == COLUMNAR_MIMETYPE:
+        return encode_columnar(stations)
+    if mimetype == MSGPACK_MIMETYPE:
+        return msgpack.packb(to_columns(stations))
+    return dumps(stations).encode('utf-8')
+
+
+def compress(body, encoding):
+    """Compresse un corps de réponse ('br', 'gzip' ou None pour le laisser tel quel)"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
@@ -0,0 +1,55 @@
+import re
+import numpy as np
+from spatial import haversine_vectorized
+
+# Mots de la saisie : lettres et chiffres (les traits d'union, apostrophes... séparent les mots,
+# comme le tokenizer unicode61 de l'index)
+WORD_PATTERN = re.compile(r'\w+')
+
+# Poids BM25 des colonnes (name, address) : un mot trouvé dans le nom compte davantage
+BM25_WEIGHTS = (10.0, 1.0)
+
+SEARCH_SQL = f'''
+    SELECT s.id, s.station_id, s.name, s.latitude, s.longitude, s.capacity, s.address,
+           bm25(stations_fts, {', '.join(str(w) for w in BM25_WEIGHTS)}) AS score
+    FROM stations_fts JOIN stations AS s ON s.id = stations_fts.rowid
+    WHERE stations_fts MATCH ?
+    ORDER BY score
+    LIMIT ?
+'''
+
+
+def match_expression(text):
+    """
+    Expression FTS5 d'une saisie utilisateur : chaque mot entre guillemets (aucune syntaxe
+    FTS interprétée) et en préfixe ("saint andr" -> "saint"* "andr"*), ou None si aucun mot
+    """
+    words = WORD_PATTERN.findall(text or '')
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_stations(conn, text, limit, lat=None, lon=None, candidates=500, distance_weight=2.0):
+    """
+    Stations dont le nom ou l'adresse contient des mots commençant par ceux de `text`
+    (sans accents ni casse), classées par score BM25 (plus petit = meilleur). Avec une
+    position, les `candidates` meilleures sont reclassées par score + poids * log(1 + km).
+    Retourne des couples (station, distance ou None).
+    """
+    expression = match_expression(text)
+    if expression is None:
+        return []
+
+    biased = lat is not None and lon is not None
+    rows = conn.execute(SEARCH_SQL, (expression, max(candidates, limit) if biased else limit)).fetchall()
+    if not biased:
+        return [(row, None) for row in rows]
+
+    if not rows:
+        return []
+    distances = haversine_vectorized(lat, lon, np.array([row['latitude'] for row in rows]),
+                                     np.array([row['longitude'] for row in rows]))
+    scores = np.array([row['score'] for row in rows]) + distance_weight * np.log1p(distances)
+    best = np.argsort(scores, kind='stable')[:limit]
+    return [(rows[i], float(distances[i])) for i in best]
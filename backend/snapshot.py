@@ -0,0 +1,286 @@
+import logging
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections.abc import Sequence
+from contextlib import contextmanager
+import numpy as np
+from config import Config
+from database import get_dataset_id, get_dataset_version, get_db_connection
+from spatial import group_cells
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Hors POSIX : pas de verrou entre processus, la publication reste atomique
+    fcntl = None
+
+# En-tête : magic, format, id de la base, version du jeu de données, nombre de stations,
+# nombre de cellules, taille des cellules (degrés), taille des chaînes (octets)
+SNAPSHOT_MAGIC = b'VLS1'
+SNAPSHOT_HEADER = struct.Struct('<4sHxxqqQQdQ')
+
+# Champs texte stockés dans la table de chaînes, et bit de leur drapeau "NULL"
+STRING_FIELDS = ('station_id', 'name', 'address')
+
+# Capacité inconnue (NULL en base)
+MISSING = -1
+
+
+def snapshot_path():
+    """Fichier de l'instantané partagé (par défaut à côté de la base)"""
+    return Config.STATION_SNAPSHOT_PATH or f'{Config.DATABASE_PATH}.stations'
+
+
+def _aligned(size):
+    return (size + 7) & ~7
+
+
+def _layout(count, n_cells):
+    """Sections du fichier après l'en-tête : (nom, dtype, nombre d'éléments), alignées sur 8 octets"""
+    return [
+        ('ids', '<i8', count),
+        ('latitude', '<f8', count),
+        ('longitude', '<f8', count),
+        ('capacity', '<i4', count),
+        ('nulls', '<u1', count),
+        ('string_offsets', '<u8', len(STRING_FIELDS) * count + 1),
+        ('cell_keys', '<i8', 2 * n_cells),
+        ('cell_starts', '<i8', n_cells + 1),
+        ('order', '<i8', count),
+    ]
+
+
+def write_snapshot(path, stations, version, dataset_id, cell_size):
+    """
+    Écrit un instantané (stations triées par id) dans un fichier temporaire puis le
+    renomme à la place de `path` : les lecteurs voient l'ancien ou le nouveau, jamais un mélange
+    """
+    stations = sorted(stations, key=lambda s: s['id'])
+    count = len(stations)
+    lats = np.fromiter((s['latitude'] for s in stations), dtype='<f8', count=count)
+    lons = np.fromiter((s['longitude'] for s in stations), dtype='<f8', count=count)
+    order, cell_keys, cell_starts = group_cells(lats, lons, cell_size)
+
+    nulls = np.zeros(count, dtype='<u1')
+    encoded = []
+    for bit, field in enumerate(STRING_FIELDS):
+        for i, station in enumerate(stations):
+            value = station[field]
+            if value is None:
+                nulls[i] |= 1 << bit
+                value = ''
+            encoded.append(str(value).encode('utf-8'))
+    offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+
+    arrays = {
+        'ids': np.fromiter((s['id'] for s in stations), dtype='<i8', count=count),
+        'latitude': lats,
+        'longitude': lons,
+        'capacity': np.fromiter((MISSING if s['capacity'] is None else s['capacity'] for s in stations),
+                                dtype='<i4', count=count),
+        'nulls': nulls,
+        'string_offsets': offsets,
+        'cell_keys': cell_keys.astype('<i8').ravel(),
+        'cell_starts': cell_starts.astype('<i8'),
+        'order': order.astype('<i8'),
+    }
+
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, 1, dataset_id, version, count, len(cell_keys),
+                                     cell_size, int(offsets[-1])))
+        for name, dtype, _ in _layout(count, len(cell_keys)):
+            data = np.ascontiguousarray(arrays[name], dtype=dtype).tobytes()
+            f.write(data + b'\0' * (_aligned(len(data)) - len(data)))
+        f.write(b''.join(encoded))
+    os.replace(temporary, path)
+
+
+def read_header(path):
+    """En-tête de l'instantané (dict), ou None s'il est absent ou illisible"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read(SNAPSHOT_HEADER.size)
+    except OSError:
+        return None
+    if len(data) < SNAPSHOT_HEADER.size:
+        return None
+    magic, fmt, dataset_id, version, count, n_cells, cell_size, strings_size = SNAPSHOT_HEADER.unpack(data)
+    if magic != SNAPSHOT_MAGIC or fmt != 1:
+        return None
+    return {'dataset_id': dataset_id, 'version': version, 'count': count, 'n_cells': n_cells,
+            'cell_size': cell_size, 'strings_size': strings_size}
+
+
+class SnapshotRows(Sequence):
+    """Stations d'un instantané, matérialisées en dicts à la demande (par position)"""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+        self._count = snapshot.count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(self._count))]
+        position = int(position)
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError(position)
+        return self._snapshot.station(position)
+
+
+class StationSnapshot:
+    """
+    Instantané des stations projeté en mémoire (mmap, lecture seule) : les tableaux NumPy
+    sont des vues sur le fichier, partagées par tous les processus via le cache de pages
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, self.dataset_id, self.version, self.count, n_cells, self.cell_size, strings_size = \
+            SNAPSHOT_HEADER.unpack_from(self._mmap)
+        if magic != SNAPSHOT_MAGIC or fmt != 1:
+            raise ValueError('Instantané de stations invalide')
+
+        position = SNAPSHOT_HEADER.size
+        for name, dtype, size in _layout(self.count, n_cells):
+            setattr(self, name, np.frombuffer(self._mmap, dtype=dtype, count=size, offset=position))
+            position += _aligned(np.dtype(dtype).itemsize * size)
+        self.cell_keys = self.cell_keys.reshape(-1, 2)
+        if position + strings_size > len(self._mmap):
+            raise ValueError('Instantané de stations tronqué')
+        self._strings = memoryview(self._mmap)[position:position + strings_size]
+        self.rows = SnapshotRows(self)
+
+    def _string(self, field_index, position):
+        k = field_index * self.count + position
+        start, end = int(self.string_offsets[k]), int(self.string_offsets[k + 1])
+        return bytes(self._strings[start:end]).decode('utf-8')
+
+    def station(self, position):
+        """Station (dict avec les champs de STATION_FIELDS) à la position donnée"""
+        nulls = int(self.nulls[position])
+        station_id, name, address = (
+            None if nulls & (1 << bit) else self._string(bit, position) for bit in range(len(STRING_FIELDS))
+        )
+        capacity = int(self.capacity[position])
+        return {
+            'id': int(self.ids[position]),
+            'station_id': station_id,
+            'name': name,
+            'latitude': float(self.latitude[position]),
+            'longitude': float(self.longitude[position]),
+            'capacity': None if capacity == MISSING else capacity,
+            'address': address,
+        }
+
+    def position(self, station_id):
+        """Position de la station d'id donné, ou None"""
+        position = int(np.searchsorted(self.ids, station_id))
+        if position < self.count and self.ids[position] == station_id:
+            return position
+        return None
+
+
+@contextmanager
+def _publish_lock(path):
+    """Verrou exclusif entre processus pendant la publication d'un instantané"""
+    if fcntl is None:
+        yield
+        return
+    with open(f'{path}.lock', 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def ensure_snapshot(conn, path, cell_size, min_version=None):
+    """
+    Retourne l'instantané publié s'il correspond à cette base et atteint `min_version` ;
+    sinon un seul processus relit les stations dans SQLite et publie un nouvel instantané,
+    que les autres n'ont plus qu'à projeter en mémoire
+    """
+    def usable(header, dataset_id):
+        return (header is not None and header['dataset_id'] == dataset_id
+                and (min_version is None or header['version'] >= min_version))
+
+    dataset_id = get_dataset_id(conn)
+    if usable(read_header(path), dataset_id):
+        return StationSnapshot(path)
+
+    with _publish_lock(path):
+        if usable(read_header(path), dataset_id):
+            return StationSnapshot(path)  # Publié par un autre processus pendant l'attente
+        # Version et stations lues dans un même instantané SQLite
+        conn.execute('BEGIN')
+        try:
+            version = get_dataset_version(conn)
+            stations = conn.execute(
+                'SELECT id, station_id, name, latitude, longitude, capacity, address FROM stations'
+            ).fetchall()
+        finally:
+            conn.commit()
+        write_snapshot(path, stations, version, dataset_id, cell_size)
+    return StationSnapshot(path)
+
+
+class SnapshotPublisher:
+    """
+    Republie l'instantané en tâche de fond après les écritures d'un worker : les demandes
+    reçues pendant `delay` secondes sont regroupées en une seule publication, faite sur une
+    connexion propre au fil (jamais celle de l'écrivain). `on_publish(snapshot)` est appelé
+    avec l'instantané publié.
+    """
+
+    def __init__(self, cell_size, delay=1.0, on_publish=None):
+        self.cell_size = cell_size
+        self.delay = delay
+        self.on_publish = on_publish
+        self._version = None
+        self._event = threading.Event()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def request(self, version):
+        """Demande la publication d'un instantané d'au moins cette version"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Une fois par processus : les fils ne survivent pas au fork
+                self._pid = os.getpid()
+                self._event = threading.Event()
+                self._version = None
+                threading.Thread(target=self._run, name='snapshot-publisher', daemon=True).start()
+            if version is not None and (self._version is None or version > self._version):
+                self._version = version
+            self._event.set()
+
+    def _run(self):
+        while True:
+            self._event.wait()
+            time.sleep(self.delay)
+            with self._lock:
+                self._event.clear()
+                version = self._version
+            try:
+                conn = get_db_connection()
+                try:
+                    snapshot = ensure_snapshot(conn, snapshot_path(), self.cell_size, min_version=version)
+                finally:
+                    conn.close()
+                if self.on_publish:
+                    self.on_publish(snapshot)
+            except (sqlite3.Error, OSError, ValueError) as e:  # Le fil ne doit jamais s'arrêter
+                logger.warning("Publication de l'instantané des stations : %s", e)
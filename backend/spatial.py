@@ -0,0 +1,486 @@
+import heapq
+import math
+import threading
+from collections.abc import Sequence
+import numpy as np
+
+EARTH_RADIUS_KM = 6371  # Rayon de la Terre en km
+
+# Champs d'une station conservés en mémoire (mêmes colonnes que la table stations)
+STATION_FIELDS = ('id', 'station_id', 'name', 'latitude', 'longitude', 'capacity', 'address')
+
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """Calcule la distance en km entre deux coordonnées GPS (formule de Haversine)"""
+    R = EARTH_RADIUS_KM
+
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+
+    a = math.sin(dlat/2) * math.sin(dlat/2) + math.cos(math.radians(lat1)) \
+        * math.cos(math.radians(lat2)) * math.sin(dlon/2) * math.sin(dlon/2)
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+
+    return R * c
+
+
+def haversine_vectorized(lat, lon, lats, lons):
+    """
+    Calcule en une passe NumPy les distances en km entre un point et des tableaux
+    de coordonnées (même formule que calculate_distance)
+    """
+    dlat = np.radians(lats - lat)
+    dlon = np.radians(lons - lon)
+
+    sin_dlat = np.sin(dlat / 2)
+    sin_dlon = np.sin(dlon / 2)
+    a = sin_dlat * sin_dlat + math.cos(math.radians(lat)) * np.cos(np.radians(lats)) * sin_dlon * sin_dlon
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def bounding_box(lat, lon, radius):
+    """
+    Calcule le rectangle (en degrés) qui contient le cercle de rayon `radius` km.
+    Retourne None si le cercle touche un pôle ou l'antiméridien (pas de rectangle simple).
+    """
+    angular = radius / EARTH_RADIUS_KM
+    dlat = math.degrees(angular)
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return None
+
+    ratio = math.sin(angular) / math.cos(math.radians(lat))
+    if ratio >= 1:
+        return None
+    dlon = math.degrees(math.asin(ratio))
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180 or max_lon > 180:
+        return None
+
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def group_cells(lats, lons, cell_size):
+    """
+    Regroupe les positions des stations par cellule de la grille. Retourne (order, clés des
+    cellules (n, 2), débuts des cellules dans order) ; un tri stable conserve l'ordre des ids.
+    """
+    cell_rows = np.floor(lats / cell_size).astype(np.int64)
+    cell_cols = np.floor(lons / cell_size).astype(np.int64)
+    order = np.lexsort((cell_cols, cell_rows))
+    if not len(order):
+        return order, np.empty((0, 2), dtype=np.int64), np.zeros(1, dtype=np.int64)
+    keys = np.stack((cell_rows[order], cell_cols[order]), axis=1)
+    starts = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+    starts = np.concatenate(([0], starts, [len(order)]))
+    return order, keys[starts[:-1]], starts
+
+
+class OverlayRows(Sequence):
+    """
+    Stations d'un instantané modifiées par le processus, par position : `sources` donne pour
+    chaque position une position de l'instantané (>= 0) ou une station ajoutée (-1 - rang)
+    """
+
+    def __init__(self, snapshot, sources, added):
+        self._snapshot = snapshot
+        self._sources = sources
+        self._added = added
+
+    def __len__(self):
+        return len(self._sources)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        source = int(self._sources[position])
+        return self._snapshot.station(source) if source >= 0 else self._added[-1 - source]
+
+
+class StationIndex:
+    """
+    Index spatial en mémoire des stations : grille uniforme en lat/lon.
+    Les coordonnées sont rangées dans des tableaux NumPy contigus (triés par id)
+    et chaque cellule de la grille contient les positions des stations qu'elle
+    couvre : une recherche ne calcule les distances que pour les cellules proches,
+    en une seule passe vectorisée.
+    """
+
+    # Marge (en degrés) ajoutée au rectangle pour absorber les erreurs d'arrondi
+    EPSILON = 1e-9
+
+    def __init__(self, cell_size=0.01):
+        self.cell_size = cell_size
+        self.loaded = False
+        self.version = None   # Version du jeu de données reflétée par l'index
+        self._stations = {}   # id -> dict de la station (None si l'index est adossé à un instantané)
+        self._snapshot = None
+        self._overlay = {}    # id -> station modifiée depuis l'instantané (None : supprimée)
+        self._lock = threading.RLock()
+        self._reset_arrays()
+
+    def _reset_arrays(self):
+        self._dirty = True
+        self._rows = []                              # stations rangées par id croissant
+        self._ids = np.empty(0, dtype=np.int64)
+        self._lats = np.empty(0, dtype=np.float64)
+        self._lons = np.empty(0, dtype=np.float64)
+        self._cells = {}                             # (ligne, colonne) -> positions
+        self._cell_bounds = None                     # (ligne min, ligne max, colonne min, colonne max)
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def load(self, conn, version=None):
+        """(Re)construit l'index à partir de la table stations, pour la version donnée"""
+        rows = conn.execute(
+            'SELECT id, station_id, name, latitude, longitude, capacity, address FROM stations'
+        ).fetchall()
+        stations = {row['id']: {field: row[field] for field in STATION_FIELDS} for row in rows}
+
+        with self._lock:
+            self._stations = stations
+            self._dirty = True
+            self._build_arrays()
+            self.version = version
+            self.loaded = True
+
+    def _build_arrays(self):
+        """Reconstruit les tableaux de coordonnées et la grille à partir des stations"""
+        if self._stations is None:
+            self._build_overlay_arrays()
+            return
+        rows = [self._stations[i] for i in sorted(self._stations)]
+        ids = np.fromiter((s['id'] for s in rows), dtype=np.int64, count=len(rows))
+        lats = np.fromiter((s['latitude'] for s in rows), dtype=np.float64, count=len(rows))
+        lons = np.fromiter((s['longitude'] for s in rows), dtype=np.float64, count=len(rows))
+        order, keys, starts = group_cells(lats, lons, self.cell_size)
+
+        self._snapshot = None
+        self._overlay = {}
+        self._rows = rows
+        self._ids = ids
+        self._lats = lats
+        self._lons = lons
+        self._set_grid(keys, starts, order)
+        self._dirty = False
+
+    def _build_overlay_arrays(self):
+        """
+        Reconstruit tableaux et grille d'un index adossé à un instantané, modifié par le processus :
+        les stations non modifiées restent lues dans l'instantané, sans matérialiser de dicts
+        """
+        snapshot = self._snapshot
+        changed = np.fromiter(self._overlay, dtype=np.int64, count=len(self._overlay))
+        kept = np.flatnonzero(~np.isin(snapshot.ids, changed))
+        added = [station for station in self._overlay.values() if station is not None]
+
+        ids = np.concatenate((snapshot.ids[kept], np.fromiter((s['id'] for s in added), dtype=np.int64, count=len(added))))
+        lats = np.concatenate((snapshot.latitude[kept], np.fromiter((s['latitude'] for s in added), dtype=np.float64, count=len(added))))
+        lons = np.concatenate((snapshot.longitude[kept], np.fromiter((s['longitude'] for s in added), dtype=np.float64, count=len(added))))
+        sources = np.concatenate((kept, -1 - np.arange(len(added), dtype=np.int64)))
+        by_id = np.argsort(ids, kind='stable')
+        ids, lats, lons, sources = ids[by_id], lats[by_id], lons[by_id], sources[by_id]
+        order, keys, starts = group_cells(lats, lons, self.cell_size)
+
+        self._rows = OverlayRows(snapshot, sources, added)
+        self._ids = ids
+        self._lats = lats
+        self._lons = lons
+        self._set_grid(keys, starts, order)
+        self._dirty = False
+
+    def _set_grid(self, keys, starts, order):
+        """Installe la grille : (ligne, colonne) -> positions, et l'étendue des cellules occupées"""
+        starts = starts.tolist()
+        self._cells = {(row, col): order[starts[i]:starts[i + 1]] for i, (row, col) in enumerate(keys.tolist())}
+        if len(keys):
+            self._cell_bounds = (int(keys[:, 0].min()), int(keys[:, 0].max()), int(keys[:, 1].min()), int(keys[:, 1].max()))
+        else:
+            self._cell_bounds = None
+
+    def load_snapshot(self, snapshot):
+        """
+        Adopte un instantané projeté en mémoire (voir snapshot.py) : coordonnées, grille et
+        stations sont lues directement dans le fichier partagé, sans copie par processus
+        """
+        if snapshot.cell_size == self.cell_size:
+            order, keys, starts = snapshot.order, snapshot.cell_keys, snapshot.cell_starts
+        else:
+            order, keys, starts = group_cells(snapshot.latitude, snapshot.longitude, self.cell_size)
+
+        with self._lock:
+            self._snapshot = snapshot
+            self._stations = None
+            self._overlay = {}
+            self._rows = snapshot.rows
+            self._ids = snapshot.ids
+            self._lats = snapshot.latitude
+            self._lons = snapshot.longitude
+            self._set_grid(keys, starts, order)
+            self._dirty = False
+            self.version = snapshot.version
+            self.loaded = True
+
+    def adopt_snapshot(self, snapshot):
+        """
+        Adopte un instantané s'il reflète exactement la version de l'index (les stations propres
+        au processus sont remplacées par les vues partagées). Retourne False si l'index a changé.
+        """
+        with self._lock:
+            if not self.loaded or snapshot.version != self.version:
+                return False
+            self.load_snapshot(snapshot)
+            return True
+
+    def __len__(self):
+        if self._stations is None:
+            with self._lock:
+                if self._dirty:
+                    self._build_arrays()
+                return len(self._rows)
+        return len(self._stations)
+
+    def all(self):
+        """Retourne toutes les stations de l'index, triées par id"""
+        with self._lock:
+            if self._dirty:
+                self._build_arrays()
+            return list(self._rows)
+
+    def get(self, station_id):
+        """Retourne la station d'id donné, ou None"""
+        with self._lock:
+            snapshot, stations = self._snapshot, self._stations
+            if stations is None and station_id in self._overlay:
+                return self._overlay[station_id]
+        if stations is None:
+            position = snapshot.position(station_id)
+            return None if position is None else snapshot.station(position)
+        return stations.get(station_id)
+
+    def _advance(self, version):
+        """
+        Indique si une modification produisant `version` peut être appliquée
+        incrémentalement (l'index est à la version précédente). Sinon l'index est
+        en retard et sera reconstruit au prochain contrôle de version.
+        """
+        if version is None:
+            return True
+        if self.version is not None and version == self.version + 1:
+            self.version = version
+            return True
+        return False
+
+    def apply(self, version=None, upserts=(), removals=()):
+        """
+        Applique un lot de modifications (stations ajoutées/modifiées, ids supprimés)
+        produisant une seule nouvelle version du jeu de données
+        """
+        upserts = [{field: station[field] for field in STATION_FIELDS} for station in upserts]
+        with self._lock:
+            if not self._advance(version):
+                return
+            if self._stations is None:
+                # Index adossé à un instantané : modifications gardées à part, l'instantané reste partagé
+                for station in upserts:
+                    self._overlay[station['id']] = station
+                for station_id in removals:
+                    self._overlay[station_id] = None
+            else:
+                for station in upserts:
+                    self._stations[station['id']] = station
+                for station_id in removals:
+                    self._stations.pop(station_id, None)
+            self._dirty = True
+
+    def upsert(self, station, version=None):
+        """Ajoute ou remplace une station dans l'index"""
+        self.apply(version, upserts=[station])
+
+    def remove(self, station_id, version=None):
+        """Retire une station de l'index (sans erreur si elle est absente)"""
+        self.apply(version, removals=[station_id])
+
+    def _candidate_positions(self, lat, lon, radius):
+        """
+        Retourne les positions (triées, donc dans l'ordre des ids) des stations
+        des cellules qui recoupent le cercle : toutes celles à moins de `radius` km
+        en font partie.
+        """
+        box = bounding_box(lat, lon, radius)
+        if box is None:
+            return np.arange(len(self._rows))
+        return self._positions_in_cells(*box)
+
+    def _positions_in_cells(self, min_lat, min_lon, max_lat, max_lon):
+        """Positions (triées) des stations des cellules qui recoupent le rectangle"""
+        row_min, col_min = self._cell(min_lat - self.EPSILON, min_lon - self.EPSILON)
+        row_max, col_max = self._cell(max_lat + self.EPSILON, max_lon + self.EPSILON)
+
+        groups = []
+        n_cells = (row_max - row_min + 1) * (col_max - col_min + 1)
+        if n_cells > len(self._cells):
+            # Rayon très large : plus rapide de parcourir les cellules occupées
+            for (row, col), positions in self._cells.items():
+                if row_min <= row <= row_max and col_min <= col <= col_max:
+                    groups.append(positions)
+        else:
+            for row in range(row_min, row_max + 1):
+                for col in range(col_min, col_max + 1):
+                    positions = self._cells.get((row, col))
+                    if positions is not None:
+                        groups.append(positions)
+
+        if not groups:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(groups))
+
+    def points_in_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Ids, latitudes et longitudes (tableaux triés par id) des stations du rectangle, bornes incluses"""
+        with self._lock:
+            if self._dirty:
+                self._build_arrays()
+            positions = self._positions_in_cells(min_lat, min_lon, max_lat, max_lon)
+            lats, lons = self._lats[positions], self._lons[positions]
+            inside = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+            positions = positions[inside]
+            return self._ids[positions], self._lats[positions], self._lons[positions]
+
+    def ids_in_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Ids (triés) des stations contenues dans le rectangle, bornes incluses"""
+        return self.points_in_bbox(min_lat, min_lon, max_lat, max_lon)[0]
+
+    def ids_in_radius(self, lat, lon, radius):
+        """Ids (triés) des stations à moins de `radius` km"""
+        with self._lock:
+            if self._dirty:
+                self._build_arrays()
+            positions = self._candidate_positions(lat, lon, radius)
+            distances = haversine_vectorized(lat, lon, self._lats[positions], self._lons[positions])
+            return self._ids[positions[distances <= radius]]
+
+    def query_radius(self, lat, lon, radius, limit=None):
+        """
+        Retourne les couples (distance arrondie à 10 m, station) à moins de `radius` km,
+        triés par distance arrondie puis par id (les `limit` premiers si précisé)
+        """
+        return list(self.iter_radius(lat, lon, radius, limit=limit))
+
+    def iter_radius(self, lat, lon, radius, limit=None):
+        """
+        Comme query_radius, mais produit les couples (distance, station) un à un :
+        seuls les tableaux NumPy du tri sont matérialisés, pas la liste des résultats
+        """
+        with self._lock:
+            if self._dirty:
+                self._build_arrays()
+            rows = self._rows
+            positions = self._candidate_positions(lat, lon, radius)
+            distances = haversine_vectorized(lat, lon, self._lats[positions], self._lons[positions])
+
+            mask = distances <= radius
+            positions = positions[mask]
+            distances = distances[mask]
+
+        # Clé de tri identique à l'API historique : distance arrondie à 10 m, puis ordre des ids.
+        # La distance produite est cette même valeur arrondie, pour que l'ordre et l'affichage concordent.
+        rounded = np.round(distances, 2)
+        if limit is not None and limit < len(positions):
+            # Toutes les stations à égalité avec la k-ième sont gardées : l'ordre des ids les départage
+            kth = np.partition(rounded, limit - 1)[limit - 1] if limit > 0 else -np.inf
+            keep = np.flatnonzero(rounded <= kth)
+            positions, rounded = positions[keep], rounded[keep]
+        order = np.lexsort((positions, rounded))[:limit]
+
+        for i in order:
+            yield float(rounded[i]), rows[positions[i]]
+
+    def _ring_lower_bound(self, lat, ring):
+        """
+        Distance minimale (km) entre le point et toute station située à `ring` cellules
+        ou plus de sa cellule : l'écart en latitude ou en longitude dépasse (ring - 1) cellules.
+        """
+        offset = (ring - 1) * self.cell_size
+        if offset <= 0:
+            return 0.0
+        by_lat = EARTH_RADIUS_KM * math.radians(offset)
+        max_lat = abs(lat) + offset
+        if max_lat >= 90 or offset >= 180:
+            return 0.0
+        by_lon = 2 * EARTH_RADIUS_KM * math.asin(math.cos(math.radians(max_lat)) * math.sin(math.radians(offset) / 2))
+        return min(by_lat, by_lon)
+
+    def _ring_positions(self, row, col, ring):
+        """Positions des stations des cellules situées exactement à `ring` cellules de (row, col)"""
+        if ring == 0:
+            keys = [(row, col)]
+        else:
+            keys = [(row - ring, c) for c in range(col - ring, col + ring + 1)]
+            keys += [(row + ring, c) for c in range(col - ring, col + ring + 1)]
+            keys += [(r, col - ring) for r in range(row - ring + 1, row + ring)]
+            keys += [(r, col + ring) for r in range(row - ring + 1, row + ring)]
+        return [self._cells[key] for key in keys if key in self._cells]
+
+    def nearest(self, lat, lon, k, max_distance=None, accept=None):
+        """
+        Retourne les `k` stations les plus proches (couples (distance, station) triés),
+        éventuellement limitées à `max_distance` km. Parcourt la grille par anneaux
+        successifs autour du point et garde les meilleures dans un tas borné à k :
+        la recherche s'arrête dès qu'aucun anneau restant ne peut faire mieux.
+        `accept` (tableau d'ids -> masque booléen) écarte des stations pendant le parcours.
+        """
+        if k <= 0:
+            return []
+
+        with self._lock:
+            if self._dirty:
+                self._build_arrays()
+            if self._cell_bounds is None:
+                return []
+            rows, lats, lons, ids = self._rows, self._lats, self._lons, self._ids
+
+            row, col = self._cell(lat, lon)
+            row_min, row_max, col_min, col_max = self._cell_bounds
+            last_ring = max(abs(row - row_min), abs(row - row_max), abs(col - col_min), abs(col - col_max))
+
+            heap = []  # tas max (distance négative) des k meilleures stations
+            for ring in range(last_ring + 1):
+                bound = self._ring_lower_bound(lat, ring)
+                if len(heap) == k and bound > -heap[0][0]:
+                    break
+                if max_distance is not None and bound > max_distance:
+                    break
+
+                if 8 * ring > len(self._cells):
+                    # Anneaux trop grands pour la densité de la grille : on termine en une passe
+                    # sur toutes les cellules occupées restantes
+                    groups = [positions for (r, c), positions in self._cells.items()
+                              if max(abs(r - row), abs(c - col)) >= ring]
+                else:
+                    groups = self._ring_positions(row, col, ring)
+                if not groups:
+                    continue
+
+                positions = np.concatenate(groups)
+                distances = haversine_vectorized(lat, lon, lats[positions], lons[positions])
+                if max_distance is not None:
+                    keep = distances <= max_distance
+                    positions, distances = positions[keep], distances[keep]
+                if accept is not None:
+                    keep = accept(ids[positions])
+                    positions, distances = positions[keep], distances[keep]
+
+                for distance, position in zip(distances.tolist(), positions.tolist()):
+                    item = (-distance, -position)
+                    if len(heap) < k:
+                        heapq.heappush(heap, item)
+                    elif item > heap[0]:
+                        heapq.heapreplace(heap, item)
+
+                if 8 * ring > len(self._cells):
+                    break
+
+        return [(-distance, rows[-position]) for distance, position in sorted(heap, reverse=True)]
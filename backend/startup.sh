@@ -1,10 +1,11 @@
 #!/bin/bash
 
-# Initialiser la base de données si elle n'existe pas
+# Initialiser la base de données si elle n'existe pas, sinon mettre à niveau son schéma
 if [ ! -f velib.db ]; then
     python database.py
+else
+    python database.py migrate
 fi
 
-# Lancer l'application avec Gunicorn
-# Utilise $PORT fourni par Render (au lieu de 8000 en dur)
-gunicorn --bind=0.0.0.0:$PORT --timeout 600 app:app
\ No newline at end of file
+# Lancer l'application avec Gunicorn (port, type de worker et concurrence : voir gunicorn.conf.py)
+gunicorn --config gunicorn.conf.py app:app
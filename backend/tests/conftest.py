@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Base de test isolée, remplie depuis le CSV du dépôt. La configuration est lue à l'import :
+# les variables d'environnement doivent être posées avant d'importer l'application.
+_tmp = tempfile.mkdtemp(prefix='velib-tests-')
+os.environ['DATABASE_PATH'] = os.path.join(_tmp, 'velib.db')
+os.environ['JWT_SECRET_KEY'] = 'velib-tests-jwt-secret-key-of-32-bytes'
+os.environ['DATASET_VERSION_POLL_INTERVAL'] = '0'  # Version relue en base à chaque requête
+os.environ['STATION_SNAPSHOT_PUBLISH_DELAY'] = '0'
+sys.path.insert(0, BACKEND_DIR)
+
+import database  # noqa: E402
+from availability import import_availability_csv  # noqa: E402
+
+database.init_db()
+database.import_csv(os.path.join(BACKEND_DIR, 'velib-pos (1).csv'))
+import_availability_csv(os.path.join(BACKEND_DIR, 'velib-pos (1).csv'))
+
+import app as app_module  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def api():
+    """Module de l'application (index, journal des changements, file d'écriture...)"""
+    return app_module
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+@pytest.fixture(scope='session')
+def auth():
+    """En-têtes d'un utilisateur authentifié"""
+    response = app_module.app.test_client().post('/api/login', json={'username': 'admin', 'password': 'admin123'})
+    return {'Authorization': f"Bearer {response.json['access_token']}"}
+
+
+@pytest.fixture
+def new_station(client, auth):
+    """Crée une station et retourne une fonction de création (supprimées en fin de test)"""
+    created = []
+
+    def create(**fields):
+        body = {'name': 'Station de test', 'latitude': 48.8566, 'longitude': 2.3522, 'capacity': 10, **fields}
+        response = client.post('/api/stations', json=body, headers=auth)
+        assert response.status_code == 201, response.json
+        created.append(response.json['id'])
+        return response.json['id']
+
+    yield create
+    for station_id in created:
+        client.delete(f'/api/stations/{station_id}', headers=auth)
@@ -0,0 +1,28 @@
+import pytest
+
+
+@pytest.mark.parametrize('body', [[1, 2], [], 'operations', 42, None, True])
+def test_batch_rejects_non_object_body(client, auth, body):
+    response = client.post('/api/stations/batch', json=body, headers=auth)
+    assert response.status_code == 400
+    assert 'error' in response.json
+
+
+def test_batch_rejects_invalid_body(client, auth):
+    response = client.post('/api/stations/batch', data='{', content_type='application/json', headers=auth)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('operation', [
+    {'op': 'create', 'data': {'name': 'X', 'latitude': 48.85, 'longitude': 2.35, 'station_id': True}},
+    {'op': 'create', 'data': {'name': 'X', 'latitude': 'abc', 'longitude': 2.35}},
+    {'op': 'create', 'data': [1]},
+    {'op': 'update', 'id': True, 'data': {'name': 'X', 'latitude': 48.85, 'longitude': 2.35}},
+    {'op': 'delete', 'id': '12'},
+    {'op': 'rename', 'id': 1},
+    7,
+])
+def test_batch_rejects_invalid_operations(client, auth, operation):
+    response = client.post('/api/stations/batch', json={'operations': [operation]}, headers=auth)
+    assert response.status_code == 400
+    assert response.json['results'][0]['status'] == 'error'
@@ -0,0 +1,58 @@
+from test_spatial import brute_radius
+
+
+def test_cached_radius_response_is_exact_for_every_client_of_the_cell(client, auth, api):
+    stations = api.get_station_index().all()
+    first = client.get('/api/stations', query_string={'lat': 48.856612, 'lon': 2.352213, 'radius': 0.8}, headers=auth)
+    second = client.get('/api/stations', query_string={'lat': 48.856588, 'lon': 2.352191, 'radius': 0.8}, headers=auth)
+    assert first.status_code == second.status_code == 200
+    assert first.headers['ETag'] == second.headers['ETag']
+    # Une seule réponse pour la cellule : celle du centre quantifié
+    expected = brute_radius(stations, 48.8566, 2.3522, 0.8)
+    assert [(s['distance'], s['id']) for s in first.json] == expected
+    assert second.json == first.json
+
+
+def test_nearest_is_computed_from_quantized_centre(client, auth, api):
+    first = client.get('/api/stations/nearest', query_string={'lat': 48.87004, 'lon': 2.33004, 'k': 3}, headers=auth)
+    second = client.get('/api/stations/nearest', query_string={'lat': 48.86996, 'lon': 2.32996, 'k': 3}, headers=auth)
+    expected = api.get_station_index().nearest(48.87, 2.33, 3)
+    assert [(s['id'], s['distance']) for s in first.json] == [(s['id'], round(d, 2)) for d, s in expected]
+    assert second.json == first.json
+
+
+def test_stations_etag_and_invalidation_after_write(client, auth, new_station):
+    params = {'lat': 48.8412, 'lon': 2.3003, 'radius': 0.5}
+    first = client.get('/api/stations', query_string=params, headers=auth)
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and etag
+
+    cached = client.get('/api/stations', query_string=params, headers={**auth, 'If-None-Match': etag})
+    assert cached.status_code == 304
+
+    # Une écriture change la version : nouvel ETag, et la réponse en cache n'est plus servie
+    station_id = new_station(latitude=48.8413, longitude=2.3004)
+    fresh = client.get('/api/stations', query_string=params, headers={**auth, 'If-None-Match': etag})
+    assert fresh.status_code == 200
+    assert fresh.headers['ETag'] != etag
+    assert station_id in [s['id'] for s in fresh.json]
+    assert station_id not in [s['id'] for s in first.json]
+
+
+def test_station_etag_follows_updates(client, auth, new_station):
+    station_id = new_station(name='Avant')
+    first = client.get(f'/api/stations/{station_id}', headers=auth)
+    etag = first.headers['ETag']
+    assert client.get(f'/api/stations/{station_id}', headers={**auth, 'If-None-Match': etag}).status_code == 304
+
+    body = {'name': 'Après', 'latitude': 48.8566, 'longitude': 2.3522, 'capacity': 12}
+    assert client.put(f'/api/stations/{station_id}', json=body, headers=auth).status_code == 200
+    updated = client.get(f'/api/stations/{station_id}', headers={**auth, 'If-None-Match': etag})
+    assert updated.status_code == 200 and updated.json['name'] == 'Après'
+
+
+def test_binary_format_is_refused_for_availability_payloads(client, auth):
+    params = {'lat': 48.8566, 'lon': 2.3522, 'k': 3, 'min_bikes': 0}
+    response = client.get('/api/stations/nearest', query_string=params,
+                          headers={**auth, 'Accept': 'application/vnd.velib.stations+binary'})
+    assert response.status_code == 406
@@ -0,0 +1,139 @@
+import pytest
+from changes import ChangeLog
+from database import get_db_connection
+
+
+def cursor_now(client, auth):
+    """Curseur courant du flux de changements (demande sans since : resync)"""
+    response = client.get('/api/stations/changes', headers=auth)
+    assert response.json['resync']
+    return response.json['version']
+
+
+def changes(client, auth, since):
+    return client.get('/api/stations/changes', query_string={'since': since}, headers=auth).json
+
+
+def test_changes_since_cursor(client, auth, new_station):
+    cursor = cursor_now(client, auth)
+    station_id = new_station(name='Journal')
+    delta = changes(client, auth, cursor)
+    assert not delta['resync']
+    assert [s['id'] for s in delta['upserted']] == [station_id]
+    assert delta['version'] > cursor
+
+    assert client.delete(f'/api/stations/{station_id}', headers=auth).status_code == 200
+    delta = changes(client, auth, delta['version'])
+    assert delta['deleted'] == [station_id] and delta['upserted'] == []
+
+
+def test_cursor_beyond_database_requests_resync(client, auth):
+    cursor = cursor_now(client, auth)
+    assert changes(client, auth, cursor + 1000)['resync']
+
+
+def test_cursor_ahead_of_worker_catches_up(client, auth, api, monkeypatch, new_station):
+    # Journal suivi par un fil de fond lent : un curseur venu d'un autre worker est en avance
+    monkeypatch.setattr(api.Config, 'DATASET_VERSION_POLL_INTERVAL', 3600)
+    cursor = cursor_now(client, auth)
+    conn = get_db_connection()
+    try:
+        conn.execute("INSERT INTO stations (name, latitude, longitude) VALUES ('Autre worker', 48.85, 2.35)")
+        api.bump_dataset_version(conn)
+        conn.commit()
+        ahead = conn.execute('SELECT MAX(seq) FROM station_changes').fetchone()[0]
+    finally:
+        conn.close()
+    assert api.change_log.last_seq < ahead
+
+    delta = changes(client, auth, ahead)
+    assert not delta['resync'] and delta['version'] == ahead
+    delta = changes(client, auth, cursor)
+    assert not delta['resync'] and [s['name'] for s in delta['upserted']] == ['Autre worker']
+    monkeypatch.undo()
+    client.delete(f"/api/stations/{delta['upserted'][0]['id']}", headers=auth)
+
+
+def test_old_cursor_is_replayed_from_database_until_purged(client, auth, new_station):
+    log = ChangeLog(maxlen=2)
+    conn = get_db_connection()
+    try:
+        log.tail(conn)
+        start = log.last_seq
+        ids = [new_station(name=f'Relu {i}') for i in range(4)]
+        log.tail(conn)
+        assert log.since(start) is None  # Sorti du journal en mémoire
+        replayed = log.read(conn, start)
+        assert [change.station_key for change in replayed] == ids
+
+        # Événements postérieurs au curseur purgés : il faut tout recharger
+        conn.execute('BEGIN')
+        conn.execute('DELETE FROM station_changes WHERE seq <= ?', (start + 1,))
+        assert log.read(conn, start) is None
+        assert log.read(conn, start + 1) is not None
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def test_viewport_delta(client, auth, new_station):
+    view, wider = '2.30,48.84,2.36,48.86', '2.30,48.84,2.38,48.86'
+    first = client.get('/api/stations/viewport', query_string={'bbox': view}, headers=auth).json
+    assert first['resync'] and first['left'] == []
+
+    inside = new_station(name='Dans la vue', latitude=48.85, longitude=2.35)
+    outside = new_station(name='À côté', latitude=48.85, longitude=2.37)
+    delta = client.get('/api/stations/viewport', query_string={
+        'bbox': wider, 'prev_bbox': view, 'since': first['version']}, headers=auth).json
+    assert not delta['resync']
+    assert outside in [s['id'] for s in delta['entered']]
+    assert inside in [s['id'] for s in delta['updated']]
+    assert inside not in [s['id'] for s in delta['entered']]
+
+    body = {'name': 'Partie', 'latitude': 49.5, 'longitude': 2.35}
+    assert client.put(f'/api/stations/{inside}', json=body, headers=auth).status_code == 200
+    moved = client.get('/api/stations/viewport', query_string={
+        'bbox': wider, 'prev_bbox': wider, 'since': delta['version']}, headers=auth).json
+    assert inside in moved['left'] and moved['entered'] == []
+
+
+@pytest.fixture
+def short_streams(api, monkeypatch):
+    monkeypatch.setattr(api.Config, 'CHANGE_STREAM_MAX_SECONDS', 0.3)
+    monkeypatch.setattr(api.Config, 'CHANGE_STREAM_HEARTBEAT', 0.1)
+
+
+def stream_token(client, auth):
+    response = client.post('/api/stations/changes/token', headers=auth)
+    assert response.status_code == 200
+    return response.json['token']
+
+
+def test_stream_token_is_single_use(client, auth, api, short_streams, new_station):
+    cursor = cursor_now(client, auth)
+    station_id = new_station(name='Flux')
+    token = stream_token(client, auth)
+
+    response = client.get('/api/stations/changes/stream', query_string={'token': token, 'since': cursor})
+    assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+    body = response.get_data(as_text=True)
+    response.close()
+    assert 'event: upsert' in body and f'"id": {station_id}' in body
+    assert api._open_streams == 0
+
+    reused = client.get('/api/stations/changes/stream', query_string={'token': token})
+    assert reused.status_code == 401
+
+
+def test_stream_rejects_access_tokens_and_stream_tokens_elsewhere(client, auth):
+    access_token = auth['Authorization'].split()[1]
+    assert client.get('/api/stations/changes/stream', query_string={'jwt': access_token}).status_code == 401
+    assert client.get('/api/stations/changes/stream', query_string={'token': access_token}).status_code == 401
+    token = stream_token(client, auth)
+    assert client.get('/api/stations/1', headers={'Authorization': f'Bearer {token}'}).status_code != 200
+
+
+def test_stream_cap_returns_503(client, auth, api, monkeypatch):
+    monkeypatch.setattr(api.Config, 'CHANGE_STREAM_MAX_CLIENTS', 0)
+    response = client.get('/api/stations/changes/stream', query_string={'token': stream_token(client, auth)})
+    assert response.status_code == 503 and response.headers['Retry-After']
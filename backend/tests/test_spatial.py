@@ -0,0 +1,127 @@
+import random
+import numpy as np
+import pytest
+from spatial import StationIndex, haversine_vectorized
+
+
+@pytest.fixture(scope='module')
+def stations(api):
+    return api.get_station_index().all()
+
+
+def brute_radius(stations, lat, lon, radius, limit=None):
+    """Oracle : toutes les stations, triées par distance arrondie à 10 m puis par id"""
+    lats = np.array([s['latitude'] for s in stations])
+    lons = np.array([s['longitude'] for s in stations])
+    distances = haversine_vectorized(lat, lon, lats, lons)
+    rounded = np.round(distances, 2)
+    found = sorted((float(rounded[i]), stations[i]['id']) for i in np.flatnonzero(distances <= radius))
+    return found[:limit]
+
+
+def queries(count, seed):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield rng.uniform(48.80, 48.92), rng.uniform(2.25, 2.42), rng.choice([0.3, 0.8, 1.5, 3.0])
+
+
+def test_radius_matches_brute_force(stations):
+    index = StationIndex(cell_size=0.01)
+    index.apply(None, upserts=stations)
+    for lat, lon, radius in queries(100, seed=1):
+        got = [(distance, station['id']) for distance, station in index.query_radius(lat, lon, radius)]
+        assert got == brute_radius(stations, lat, lon, radius)
+
+
+def test_radius_limit_is_prefix_of_unlimited(stations):
+    index = StationIndex(cell_size=0.01)
+    index.apply(None, upserts=stations)
+    rng = random.Random(2)
+    for lat, lon, radius in queries(300, seed=2):
+        unlimited = [(d, s['id']) for d, s in index.query_radius(lat, lon, radius)]
+        limit = rng.randint(0, 12)
+        assert [(d, s['id']) for d, s in index.query_radius(lat, lon, radius, limit=limit)] == unlimited[:limit]
+
+
+def test_radius_limit_keeps_lowest_ids_among_ties():
+    # Quatre stations à la même distance arrondie : limit=2 garde les deux plus petits ids
+    index = StationIndex(cell_size=0.01)
+    index.apply(None, upserts=[
+        {'id': i, 'station_id': str(i), 'name': str(i), 'latitude': 48.86 + offset, 'longitude': 2.35,
+         'capacity': 1, 'address': None}
+        for i, offset in ((9, 0.00900), (4, 0.00901), (7, 0.00902), (2, 0.00903), (1, 0.05))
+    ])
+    assert [s['id'] for _, s in index.query_radius(48.86, 2.35, 2.0, limit=2)] == [2, 4]
+
+
+@pytest.mark.parametrize('value', [2.675, 1.115, 0.125, 3.005])
+def test_displayed_distance_matches_sort_key(value):
+    from app import station_with_distance
+    station = {'id': 1, 'station_id': '1', 'name': 'x', 'latitude': 0, 'longitude': 0, 'capacity': 1, 'address': ''}
+    assert station_with_distance(station, value)['distance'] == float(np.round(value, 2))
+
+
+def test_radius_route_matches_brute_force(client, auth, api, stations):
+    for lat, lon, radius in queries(20, seed=3):
+        for limit in (None, 5):
+            params = {'lat': lat, 'lon': lon, 'radius': radius}
+            if limit is not None:
+                params['limit'] = limit
+            response = client.get('/api/stations', query_string=params, headers=auth)
+            assert response.status_code == 200
+            got = [(s['distance'], s['id']) for s in response.json]
+            # Réponse calculée sur le centre quantifié (clé du cache de réponses)
+            assert got == brute_radius(stations, *api.quantize_query(lat, lon, radius), limit)
+
+
+def brute_nearest(stations, lat, lon, k, max_distance=None):
+    """Oracle : les k stations les plus proches (distance exacte, puis id)"""
+    lats = np.array([s['latitude'] for s in stations])
+    lons = np.array([s['longitude'] for s in stations])
+    distances = haversine_vectorized(lat, lon, lats, lons)
+    found = sorted((float(distances[i]), stations[i]['id']) for i in range(len(stations))
+                   if max_distance is None or distances[i] <= max_distance)
+    return [station_id for _, station_id in found[:k]]
+
+
+def test_nearest_matches_brute_force(stations):
+    index = StationIndex(cell_size=0.01)
+    index.apply(None, upserts=stations)
+    rng = random.Random(4)
+    for lat, lon, _ in queries(200, seed=4):
+        k = rng.randint(1, 20)
+        max_distance = rng.choice([None, 0.2, 1.0])
+        got = [s['id'] for _, s in index.nearest(lat, lon, k, max_distance=max_distance)]
+        assert got == brute_nearest(stations, lat, lon, k, max_distance)
+
+
+def test_nearest_far_from_every_station(stations):
+    index = StationIndex(cell_size=0.01)
+    index.apply(None, upserts=stations)
+    got = [s['id'] for _, s in index.nearest(45.0, 5.0, 3)]
+    assert got == brute_nearest(stations, 45.0, 5.0, 3)
+
+
+def test_bbox_route_matches_brute_force(client, auth, stations):
+    rng = random.Random(5)
+    for _ in range(20):
+        min_lat, min_lon = rng.uniform(48.82, 48.88), rng.uniform(2.28, 2.38)
+        max_lat, max_lon = min_lat + rng.uniform(0.001, 0.04), min_lon + rng.uniform(0.001, 0.05)
+        params = {'minLat': min_lat, 'minLon': min_lon, 'maxLat': max_lat, 'maxLon': max_lon}
+        response = client.get('/api/stations/bbox', query_string=params, headers=auth)
+        assert response.status_code == 200
+        expected = sorted(s['id'] for s in stations
+                          if min_lat <= s['latitude'] <= max_lat and min_lon <= s['longitude'] <= max_lon)
+        assert [s['id'] for s in response.json] == expected
+        limited = client.get('/api/stations/bbox', query_string={**params, 'limit': 3, 'fields': 'id'}, headers=auth)
+        assert limited.json == [{'id': station_id} for station_id in expected[:3]]
+
+
+@pytest.mark.parametrize('params', [
+    {'minLat': 48.8, 'minLon': 2.3, 'maxLat': 48.9},
+    {'minLat': 'nan', 'minLon': 2.3, 'maxLat': 48.9, 'maxLon': 2.4},
+    {'minLat': 48.9, 'minLon': 2.3, 'maxLat': 48.8, 'maxLon': 2.4},
+    {'minLat': 48.8, 'minLon': 2.3, 'maxLat': 48.9, 'maxLon': 2.4, 'fields': 'id,password'},
+])
+def test_bbox_route_rejects_invalid_parameters(client, auth, params):
+    assert client.get('/api/stations/bbox', query_string=params, headers=auth).status_code == 400
@@ -0,0 +1,87 @@
+import threading
+import pytest
+from database import bump_dataset_version, get_db_connection
+from writer import WriteQueue
+
+
+def insert(name, fail=False):
+    """Opération d'écriture : insère une station, puis échoue si demandé"""
+    def operation(conn):
+        station_id = conn.execute(
+            'INSERT INTO stations (name, latitude, longitude) VALUES (?, 48.85, 2.35)', (name,)
+        ).lastrowid
+        if fail:
+            raise ValueError(name)
+        return station_id, [station_id]
+    return operation
+
+
+def names(prefix):
+    conn = get_db_connection()
+    try:
+        return sorted(row[0] for row in conn.execute('SELECT name FROM stations WHERE name LIKE ?', (prefix + '%',)))
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def cleanup():
+    prefixes = []
+    yield prefixes.append
+    conn = get_db_connection()
+    try:
+        for prefix in prefixes:
+            conn.execute('DELETE FROM stations WHERE name LIKE ?', (prefix + '%',))
+        bump_dataset_version(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_failed_operation_only_rolls_back_its_own_savepoint(cleanup):
+    cleanup('Lot ')
+    batches = []
+    queue = WriteQueue(window=0.2, max_batch=8,
+                       before_commit=lambda conn, ids: bump_dataset_version(conn),
+                       after_commit=lambda conn, ids, version: batches.append((ids, version)))
+    futures = [queue.submit(insert('Lot A')), queue.submit(insert('Lot B', fail=True)), queue.submit(insert('Lot C'))]
+
+    first, failed, last = futures
+    assert isinstance(first.result(timeout=5), int) and isinstance(last.result(timeout=5), int)
+    with pytest.raises(ValueError):
+        failed.result(timeout=5)
+    # Une seule transaction pour les trois opérations, dont seule l'opération en échec est annulée
+    assert len(batches) == 1 and batches[0][0] == [first.result(), last.result()]
+    assert names('Lot ') == ['Lot A', 'Lot C']
+
+
+def test_failed_commit_fails_the_whole_batch(cleanup):
+    cleanup('Annulé ')
+
+    def before_commit(conn, ids):
+        raise RuntimeError('validation impossible')
+
+    queue = WriteQueue(window=0.2, before_commit=before_commit)
+    futures = [queue.submit(insert('Annulé A')), queue.submit(insert('Annulé B'))]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+    assert names('Annulé ') == []
+
+
+def test_disabled_queue_runs_on_caller_thread(cleanup):
+    cleanup('Direct ')
+    queue = WriteQueue(enabled=False)
+    threads = []
+    queue.execute(lambda conn: (threads.append(threading.current_thread()), []))
+    assert threads == [threading.current_thread()]
+
+
+def test_atomic_batch_route_applies_nothing_on_error(client, auth):
+    before = names('Atomique')
+    response = client.post('/api/stations/batch', json={'operations': [
+        {'op': 'create', 'data': {'name': 'Atomique', 'latitude': 48.85, 'longitude': 2.35}},
+        {'op': 'update', 'id': 999999999, 'data': {'name': 'X', 'latitude': 48.85, 'longitude': 2.35}},
+    ]}, headers=auth)
+    assert response.status_code == 400 and response.json['applied'] is False
+    assert names('Atomique') == before
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from zones import parse_polygons, points_in_polygons
+
+SQUARE = [[2.33, 48.85], [2.36, 48.85], [2.36, 48.87], [2.33, 48.87], [2.33, 48.85]]
+
+
+def polygon(*rings):
+    return {'type': 'Polygon', 'coordinates': list(rings)}
+
+
+@pytest.mark.parametrize('body', [
+    None,
+    [1, 2],
+    {'type': 'Point', 'coordinates': [2.35, 48.86]},
+    polygon([[2.3], [2.4], [2.5], [2.3]]),
+    polygon([[2.3, 48.8], [2.4, 48.9], [2.3, 48.8]]),
+    polygon([[2.3, 48.8], [2.4, float('nan')], [2.5, 48.8], [2.3, 48.8]]),
+    polygon([[2.3, 48.8], [float('inf'), 48.9], [2.5, 48.8], [2.3, 48.8]]),
+    polygon([[2.3, 48.8], [2.4, 48.9, 1], [2.5, 48.8], [2.3, 48.8]]),
+    polygon([['a', 'b'], [2.4, 48.9], [2.5, 48.8], ['a', 'b']]),
+    {'type': 'Polygon', 'coordinates': 5},
+    {'type': 'MultiPolygon', 'coordinates': [[]]},
+])
+def test_query_rejects_malformed_geometry(client, auth, body):
+    response = client.post('/api/zones/query', json=body, headers=auth)
+    assert response.status_code == 400
+    assert 'error' in response.json
+
+
+def test_query_matches_brute_force(client, auth, api):
+    response = client.post('/api/zones/query', json=polygon(SQUARE), headers=auth)
+    assert response.status_code == 200
+    expected = sorted(s['id'] for s in api.get_station_index().all()
+                      if 2.33 < s['longitude'] < 2.36 and 48.85 < s['latitude'] < 48.87)
+    assert sorted(s['id'] for s in response.json['stations']) == expected
+    assert expected
+
+
+def test_points_in_polygons_excludes_holes():
+    outer = np.array(SQUARE)
+    hole = np.array([[2.34, 48.855], [2.35, 48.855], [2.35, 48.865], [2.34, 48.865], [2.34, 48.855]])
+    lats = np.array([48.86, 48.852, 48.86, 48.9])
+    lons = np.array([2.345, 2.355, 2.335, 2.345])
+    assert points_in_polygons(lats, lons, [[outer, hole]]).tolist() == [False, True, True, False]
+
+
+def test_parse_polygons_keeps_two_coordinates():
+    rings = parse_polygons(polygon([[x, y, 35.0] for x, y in SQUARE]))[0]
+    assert rings[0].shape == (5, 2)
@@ -0,0 +1,133 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from database import get_db_connection
+from metrics import SIZE_BUCKETS, registry
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueue:
+    """
+    File d'écriture à un seul écrivain par processus, avec validation groupée (group commit).
+    Les opérations soumises dans une même fenêtre de `window` secondes (au plus `max_batch`)
+    s'exécutent dans une seule transaction, chacune dans son SAVEPOINT : l'échec d'une
+    opération n'annule que la sienne, et chaque appelant reçoit son propre résultat.
+
+    Une opération est une fonction (conn) -> (résultat, ids des stations modifiées), qui ne
+    valide ni n'annule elle-même. `before_commit(conn, ids)` s'exécute une fois par transaction
+    juste avant la validation (version du jeu de données) et sa valeur est passée à
+    `after_commit(conn, ids, valeur)`, appelé avant de rendre les résultats (index en mémoire).
+    """
+
+    def __init__(self, window=0.002, max_batch=64, enabled=True, before_commit=None, after_commit=None):
+        self.window = window
+        self.max_batch = max_batch
+        self.enabled = enabled
+        self.before_commit = before_commit
+        self.after_commit = after_commit
+        self._queue = queue.Queue()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def depth(self):
+        """Nombre d'écritures en attente"""
+        return self._queue.qsize() if self._pid == os.getpid() else 0
+
+    def _start(self):
+        """Démarre le fil écrivain (une fois par processus : les fils ne survivent pas au fork)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='station-writer', daemon=True).start()
+
+    def submit(self, operation):
+        """Met une opération en file et retourne son Future"""
+        future = Future()
+        if not self.enabled:
+            # File désactivée : transaction propre à l'appelant, exécutée sur son fil
+            self._commit([(operation, future, time.perf_counter())])
+            return future
+        if self._pid != os.getpid():
+            self._start()
+        self._queue.put((operation, future, time.perf_counter()))
+        return future
+
+    def execute(self, operation):
+        """Exécute une opération via la file et retourne son résultat (ou lève son exception)"""
+        return self.submit(operation).result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._commit(batch)
+            except Exception as e:  # Le fil écrivain ne doit jamais s'arrêter
+                logger.exception("Écriture groupée : %s", e)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _commit(self, batch):
+        """Exécute un lot d'opérations dans une transaction, puis rend à chacun son résultat"""
+        outcomes = []
+        station_ids = []
+        conn = get_db_connection()
+        try:
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                for operation, _, _ in batch:
+                    conn.execute('SAVEPOINT write_operation')
+                    try:
+                        result, changed = operation(conn)
+                    except Exception as e:
+                        if not conn.in_transaction:
+                            raise  # Transaction annulée par SQLite : tout le lot échoue
+                        conn.execute('ROLLBACK TO write_operation')
+                        conn.execute('RELEASE write_operation')
+                        outcomes.append((False, e))
+                        continue
+                    conn.execute('RELEASE write_operation')
+                    outcomes.append((True, result))
+                    station_ids.extend(changed)
+                context = self.before_commit(conn, station_ids) if self.before_commit else None
+                conn.commit()
+            except Exception as e:
+                registry.inc('velib_write_batch_failures_total')
+                try:
+                    conn.rollback()
+                except sqlite3.Error:
+                    pass
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                return
+
+            registry.observe('velib_write_batch_size', len(batch), buckets=SIZE_BUCKETS)
+            if self.after_commit:
+                try:
+                    self.after_commit(conn, station_ids, context)
+                except Exception as e:  # Données validées : les index se resynchroniseront
+                    logger.warning("Après validation d'écritures : %s", e)
+        finally:
+            conn.close()
+
+        now = time.perf_counter()
+        for (_, future, submitted), (ok, value) in zip(batch, outcomes):
+            registry.observe('velib_write_queue_wait_seconds', now - submitted)
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
@@ -0,0 +1,156 @@
+import json
+import threading
+import numpy as np
+
+
+def parse_ring(ring):
+    """
+    Anneau GeoJSON en tableau (n, 2) de (longitude, latitude) ; lève ValueError s'il a moins de
+    4 positions, des positions de moins de 2 coordonnées ou des coordonnées non finies
+    """
+    try:
+        ring = np.asarray(ring, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError('Coordonnées de polygone invalides (nombres attendus)')
+    if ring.ndim != 2 or ring.shape[1] < 2 or len(ring) < 4:
+        raise ValueError('Anneau de polygone invalide (au moins 4 positions [longitude, latitude])')
+    ring = ring[:, :2]
+    if not np.isfinite(ring).all():
+        raise ValueError('Coordonnées de polygone non finies')
+    return ring
+
+
+def parse_polygons(geometry):
+    """
+    Polygones d'une géométrie GeoJSON (Polygon, MultiPolygon, Feature ou FeatureCollection) :
+    liste de polygones, chacun liste d'anneaux en tableaux (n, 2) de (longitude, latitude).
+    Lève ValueError si la géométrie n'est pas surfacique ou est mal formée.
+    """
+    if not isinstance(geometry, dict):
+        raise ValueError('Géométrie GeoJSON attendue')
+    kind = geometry.get('type')
+    if kind == 'FeatureCollection':
+        return [polygon for feature in geometry.get('features') or [] for polygon in parse_polygons(feature)]
+    if kind == 'Feature':
+        return parse_polygons(geometry.get('geometry'))
+    if kind == 'Polygon':
+        polygons = [geometry.get('coordinates')]
+    elif kind == 'MultiPolygon':
+        polygons = geometry.get('coordinates')
+    else:
+        raise ValueError(f'Type de géométrie non pris en charge : {kind} (Polygon ou MultiPolygon attendu)')
+
+    parsed = []
+    try:
+        for polygon in polygons:
+            rings = [parse_ring(ring) for ring in polygon]
+            if not rings:
+                raise ValueError('Polygone sans anneau')
+            parsed.append(rings)
+    except TypeError as e:
+        raise ValueError(f'Coordonnées de polygone invalides : {e}')
+    if not parsed:
+        raise ValueError('Aucun polygone')
+    return parsed
+
+
+def polygons_bbox(polygons):
+    """Rectangle englobant (min_lat, min_lon, max_lat, max_lon) des contours extérieurs"""
+    outer = np.concatenate([rings[0] for rings in polygons])
+    return float(outer[:, 1].min()), float(outer[:, 0].min()), float(outer[:, 1].max()), float(outer[:, 0].max())
+
+
+# Taille maximale d'un bloc points x arêtes (éléments) : borne la mémoire du test d'appartenance
+BLOCK_SIZE = 1 << 18
+# Nombre maximal de points traités ensemble
+POINT_CHUNK = 4096
+
+
+def ring_crossings(x, y, ring):
+    """
+    Nombre d'arêtes de l'anneau coupées par la demi-droite horizontale partant de chaque
+    point (x, y), par blocs d'au plus BLOCK_SIZE points x arêtes
+    """
+    x1, y1 = ring[:, 0], ring[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    crossings = np.zeros(len(x), dtype=np.int64)
+    step = max(1, BLOCK_SIZE // len(x))
+    px, py = x[:, None], y[:, None]
+    for start in range(0, len(x1), step):
+        edge = slice(start, start + step)
+        straddles = (y1[edge] > py) != (y2[edge] > py)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = x1[edge] + (py - y1[edge]) * (x2[edge] - x1[edge]) / (y2[edge] - y1[edge])
+        crossings += np.count_nonzero(straddles & (px < x_cross), axis=1)
+    return crossings
+
+
+def points_in_polygons(lats, lons, polygons):
+    """
+    Masque des points contenus dans au moins un des polygones. Règle pair-impair sur
+    tous les anneaux d'un polygone (les trous en sont exclus), limitée aux points du
+    rectangle englobant de chaque polygone et calculée par blocs de taille bornée.
+    """
+    inside = np.zeros(len(lats), dtype=bool)
+    for rings in polygons:
+        outer = rings[0]
+        candidates = np.flatnonzero(~inside
+                                    & (lons >= outer[:, 0].min()) & (lons <= outer[:, 0].max())
+                                    & (lats >= outer[:, 1].min()) & (lats <= outer[:, 1].max()))
+        for start in range(0, len(candidates), POINT_CHUNK):
+            chunk = candidates[start:start + POINT_CHUNK]
+            x, y = lons[chunk], lats[chunk]
+            crossings = sum(ring_crossings(x, y, ring) for ring in rings)
+            inside[chunk[crossings % 2 == 1]] = True
+    return inside
+
+
+def stations_in_polygons(index, polygons):
+    """Ids (triés) des stations de l'index situées dans les polygones"""
+    ids, lats, lons = index.points_in_bbox(*polygons_bbox(polygons))
+    return ids[points_in_polygons(lats, lons, polygons)]
+
+
+def station_totals(index, ids):
+    """Nombre de stations et capacité totale (capacités inconnues ignorées)"""
+    capacities = [(index.get(station_id) or {}).get('capacity') for station_id in ids.tolist()]
+    return {'count': len(ids), 'capacity': sum(c for c in capacities if c is not None)}
+
+
+class ZoneIndex:
+    """
+    Zones nommées (fichier GeoJSON de polygones, une entité par zone) et affectation des
+    stations à chaque zone, calculée une fois par version du jeu de données : les requêtes
+    suivantes ne font que relire les membres et agrégats de chaque zone.
+    """
+
+    def __init__(self, name_property='name'):
+        self.name_property = name_property
+        self.zones = {}     # nom -> polygones
+        self.version = None
+        self._members = {}  # nom -> ids (triés)
+        self._totals = {}   # nom -> agrégats indépendants de la disponibilité
+        self._lock = threading.Lock()
+
+    def load(self, path):
+        """Charge les zones d'un fichier GeoJSON (FeatureCollection)"""
+        with open(path, encoding='utf-8') as f:
+            collection = json.load(f)
+        zones = {}
+        for feature in collection.get('features') or []:
+            name = (feature.get('properties') or {}).get(self.name_property)
+            if name is None:
+                raise ValueError(f'Zone sans propriété "{self.name_property}"')
+            zones[str(name)] = parse_polygons(feature)
+        with self._lock:
+            self.zones = zones
+            self.version = None
+
+    def assignment(self, index):
+        """Membres et agrégats (nombre de stations, capacité) de chaque zone, pour la version de l'index"""
+        with self._lock:
+            if self.version is None or self.version != index.version:
+                members = {name: stations_in_polygons(index, polygons) for name, polygons in self.zones.items()}
+                totals = {name: station_totals(index, ids) for name, ids in members.items()}
+                self._members, self._totals, self.version = members, totals, index.version
+            return self._members, self._totals
@@ -59,6 +59,114 @@ export const getStations = async (lat, lon, radius = 2) => {
   return response.data;
 };
 
+// Récupérer les k stations les plus proches d'une position
+// filters : { min_bikes, min_mechanical, min_electric, min_docks } (dernier relevé de disponibilité)
+export const getNearestStations = async (lat, lon, k = 5, maxDistance, filters = {}) => {
+  const response = await api.get('/api/stations/nearest', {
+    params: { lat, lon, k, max_distance: maxDistance, ...filters },
+  });
+  return response.data;
+};
+
+// Récupérer les stations regroupées pour la vue de la carte et le niveau de zoom
+export const getStationClusters = async ({ minLon, minLat, maxLon, maxLat }, zoom) => {
+  const response = await api.get('/api/stations/clusters', {
+    params: { bbox: [minLon, minLat, maxLon, maxLat].join(','), zoom },
+  });
+  return response.data;
+};
+
+// Rechercher des stations par nom ou adresse (autocomplétion), les plus proches de position d'abord
+export const searchStations = async (q, { limit, position } = {}) => {
+  const params = { q, limit };
+  if (position) {
+    params.lat = position.lat;
+    params.lon = position.lon;
+  }
+  const response = await api.get('/api/stations/search', { params });
+  return response.data;
+};
+
+// Récupérer les stations visibles dans un rectangle (vue de la carte)
+export const getStationsInBbox = async (bounds, options = {}) => {
+  const response = await api.get('/api/stations/bbox', {
+    params: { ...bounds, ...options },
+  });
+  return response.data;
+};
+
+// Récupérer les changements depuis un curseur (resync: true => recharger la liste complète)
+export const getStationChanges = async (since) => {
+  const response = await api.get('/api/stations/changes', {
+    params: since === undefined ? {} : { since },
+  });
+  return response.data;
+};
+
+// S'abonner au flux des changements (Server-Sent Events) ; retourne une fonction de désabonnement
+export const subscribeToStationChanges = (handlers, since) => {
+  let source = null;
+  let closed = false;
+  let cursor = since;
+  const reconnect = () => {
+    if (!closed) {
+      setTimeout(connect, 3000);
+    }
+  };
+  const connect = async () => {
+    // Jeton d'ouverture à usage unique : EventSource ne permet pas d'envoyer l'en-tête Authorization
+    let token;
+    try {
+      ({ token } = (await api.post('/api/stations/changes/token')).data);
+    } catch (error) {
+      reconnect();
+      return;
+    }
+    if (closed) {
+      return;
+    }
+    const params = new URLSearchParams({ token });
+    if (cursor !== undefined) {
+      params.set('since', cursor);
+    }
+    source = new EventSource(`${API_URL}/api/stations/changes/stream?${params}`);
+    ['upsert', 'delete', 'availability', 'resync'].forEach((type) => {
+      source.addEventListener(type, (event) => {
+        cursor = event.lastEventId || cursor;
+        if (handlers[type]) {
+          handlers[type](JSON.parse(event.data), event.lastEventId);
+        }
+      });
+    });
+    // La reconnexion automatique réutiliserait le jeton : on rouvre avec un nouveau jeton
+    source.onerror = () => {
+      source.close();
+      reconnect();
+    };
+  };
+  connect();
+  return () => {
+    closed = true;
+    if (source) {
+      source.close();
+    }
+  };
+};
+
+// Différence entre la vue précédente et la nouvelle vue de la carte (rectangles minLon,minLat,maxLon,maxLat)
+export const getViewportDelta = async (bounds, previousBounds, since) => {
+  const bbox = ({ minLon, minLat, maxLon, maxLat }) => [minLon, minLat, maxLon, maxLat].join(',');
+  const params = { bbox: bbox(bounds) };
+  if (previousBounds) {
+    params.prev_bbox = bbox(previousBounds);
+  }
+  if (since !== undefined) {
+    params.since = since;
+  }
+  const response = await api.get('/api/stations/viewport', { params });
+  return response.data;
+};
+
 // Récupérer une station spécifique
 export const getStation = async (id) => {
   const response = await api.get(`/api/stations/${id}`);
@@ -83,6 +191,30 @@ export const deleteStation = async (id) => {
   return response.data;
 };
 
+// ============== ZONES ==============
+
+// Agrégats de toutes les zones nommées
+export const getZones = async () => {
+  const response = await api.get('/api/zones');
+  return response.data;
+};
+
+// Agrégats et stations d'une zone nommée
+export const getZone = async (name, withStations = true) => {
+  const response = await api.get(`/api/zones/${encodeURIComponent(name)}`, {
+    params: withStations ? {} : { stations: 0 },
+  });
+  return response.data;
+};
+
+// Agrégats et stations d'un polygone GeoJSON
+export const queryZone = async (geometry, withStations = true) => {
+  const response = await api.post('/api/zones/query', geometry, {
+    params: withStations ? {} : { stations: 0 },
+  });
+  return response.data;
+};
+
 // Health check
 export const checkHealth = async () => {
   const response = await axios.get(`${API_URL}/api/health`);